@@ -0,0 +1,220 @@
+"""Per-view render benchmarks of the dashboard against the offline mock.
+
+Each view is run headlessly with Streamlit's AppTest, once with empty caches
+(cold) and once more in the same session (warm, i.e. the cost of a rerun),
+at every requested data size. The mock runs in its own process so its work
+does not share the GIL with the measured run:
+
+    python ledger_bench.py --sizes 100:1000,1000:10000 -o bench.json
+    python ledger_bench.py --sizes 1000:10000 --baseline bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import requests
+from streamlit.logger import set_log_level
+
+from ledger_client import LedgerClient
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP = os.path.join(HERE, "ledger_ui.py")
+
+# Most active account of ledger_mock.generate (highest Zipf weight)
+DETAIL_ACCOUNT = "merchants:000000"
+
+# Session state preset before the first run of each view
+VIEWS = {
+    "Ledgers": {"view": "Ledgers"},
+    "Accounts": {"view": "Accounts"},
+    "Transactions": {"view": "Transactions"},
+    "Assets": {"view": "Assets"},
+    "Transaction detail": {"view": "Transactions", "view_tx_details": True,
+                           "selected_ledger": "main", "selected_tx_id": "0"},
+    "Account detail": {"view": "Accounts", "view_account_details": True,
+                       "selected_ledger": "main", "selected_account": DETAIL_ACCOUNT},
+}
+
+DEFAULT_SIZES = "100:1000,1000:10000,5000:50000"
+
+# Placeholder of a view still waiting on background work (the Assets view
+# before the first balance index); a measured run lasts until it is gone
+PENDING = ("Building the balance index",)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_mock(ledgers: int, accounts: int, transactions: int, latency: float, seed: int):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "ledger_mock.py"), "--port", str(port),
+         "--ledgers", str(ledgers), "--accounts", str(accounts), "--transactions", str(transactions),
+         "--latency", str(latency), "--seed", str(seed)],
+        stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 600
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"mock server exited with {process.returncode}")
+        try:
+            requests.get(f"{url}/_healthcheck", timeout=1)
+            return process, url
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("mock server did not start")
+
+
+def mock_stats(url: str, settle: float = 0.2):
+    # Wait for background work (e.g. page prefetches) to reach the server
+    # before reading the counters
+    stats = requests.get(f"{url}/_mock/stats", timeout=5).json()
+    while True:
+        time.sleep(settle)
+        latest = requests.get(f"{url}/_mock/stats", timeout=5).json()
+        if latest['requests'] == stats['requests']:
+            return latest
+        stats = latest
+
+
+def measure(at, url: str):
+    requests.post(f"{url}/_mock/stats/reset", timeout=5)
+    tracemalloc.start()
+    start = time.perf_counter()
+    at.run()
+    while any(text in info.value for info in at.info for text in PENDING):
+        time.sleep(0.05)
+        at.run()
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = mock_stats(url)
+    return {
+        "wall_s": round(wall, 4),
+        "requests": stats['requests'],
+        "bytes": stats['bytes_sent'],
+        "peak_mem_bytes": peak,
+        "routes": stats['routes'],
+        "exceptions": [e.value for e in at.exception],
+    }
+
+
+def new_app(state: dict, timeout: float):
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    # Cold: no shared client, cache or memoized renders left by the previous
+    # view. Clearing outside a server logs warnings, and each AppTest run
+    # restores the configured log level
+    set_log_level("error")
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    at = AppTest.from_file(APP, default_timeout=timeout)
+    for key, value in state.items():
+        at.session_state[key] = value
+    return at
+
+
+def run_size(ledgers: int, accounts: int, transactions: int, args):
+    process, url = start_mock(ledgers, accounts, transactions, args.latency, args.seed)
+    os.environ['FORMANCE_API_URL'] = url
+    os.environ.pop('LEDGER_SNAPSHOT_DIR', None)
+    try:
+        client = LedgerClient(url)
+        names = [l['name'] for page in client.iter_pages("/v2", "list_ledgers") for l in page]
+        total_accounts = sum(client.count(name, "accounts") or 0 for name in names)
+        result = {"ledgers": ledgers, "accounts": accounts, "transactions": transactions,
+                  "total_accounts": total_accounts, "views": {}}
+        # Discarded run, so module imports do not land on the first measured view
+        new_app(VIEWS["Ledgers"], args.timeout).run()
+        for view, state in VIEWS.items():
+            if args.views and view not in args.views:
+                continue
+            at = new_app(state, args.timeout)
+            cold = measure(at, url)
+            warm = measure(at, url)
+            result['views'][view] = {"cold": cold, "warm": warm}
+            if view == "Assets":
+                result['views'][view]['requests_per_account'] = round(cold['requests'] / max(total_accounts, 1), 4)
+            print(f"{accounts}:{transactions} {view:<20} cold {cold['wall_s']:8.3f}s {cold['requests']:6d} req "
+                  f"{cold['bytes'] / 1e6:8.2f} MB {cold['peak_mem_bytes'] / 1e6:8.1f} MB peak | "
+                  f"warm {warm['wall_s']:8.3f}s {warm['requests']:6d} req", file=sys.stderr)
+        return result
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict):
+    # Ratio of each cold/warm metric to the baseline run of the same size and view
+    previous = {(s['accounts'], s['transactions']): s for s in baseline.get('sizes', [])}
+    for size in results['sizes']:
+        old = previous.get((size['accounts'], size['transactions']))
+        if old is None:
+            continue
+        for view, runs in size['views'].items():
+            for run in ("cold", "warm"):
+                before = old['views'].get(view, {}).get(run)
+                if not before:
+                    continue
+                ratios = " ".join(
+                    f"{metric} x{runs[run][metric] / before[metric]:.2f}" if before[metric] else f"{metric} n/a"
+                    for metric in ("wall_s", "requests", "bytes", "peak_mem_bytes")
+                )
+                print(f"{size['accounts']}:{size['transactions']} {view:<20} {run:<4} {ratios}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard views against the offline mock")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help="Comma-separated accounts:transactions per ledger (default: %(default)s)")
+    parser.add_argument("--ledgers", type=int, default=2)
+    parser.add_argument("--views", nargs="*", choices=list(VIEWS), help="Only these views (default: all)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mock latency per request, in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=600, help="Per-run AppTest timeout, in seconds")
+    parser.add_argument("-o", "--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against")
+    args = parser.parse_args(argv)
+
+    results = {
+        "commit": git_commit(),
+        "date": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "latency": args.latency,
+        "sizes": [],
+    }
+    for size in args.sizes.split(","):
+        accounts, _, transactions = size.partition(":")
+        results['sizes'].append(run_size(args.ledgers, int(accounts), int(transactions), args))
+
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(results, out, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
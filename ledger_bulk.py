@@ -0,0 +1,145 @@
+import hashlib
+import io
+import json
+import re
+import time
+
+import pandas as pd
+
+from ledger_frames import minor_units
+
+BULK_COLUMNS = ["source", "destination", "amount", "asset", "reference", "metadata"]
+DEFAULT_BATCH_SIZE = 100
+
+# Address and asset formats accepted by the ledger
+ADDRESS_PATTERN = re.compile(r'^[a-zA-Z0-9_-]+(:[a-zA-Z0-9_-]+)*$')
+ASSET_PATTERN = re.compile(r'^[A-Z][A-Z0-9]{0,16}(_[A-Z]{1,16})?(/\d{1,6})?$')
+
+
+def read_upload(data: bytes, filename: str):
+    # CSV with a header row, or a JSON array of objects, one transaction per
+    # row; amounts are decimal strings in the asset's major unit
+    if filename.lower().endswith(".json"):
+        rows = json.loads(data)
+        frame = pd.DataFrame(rows if isinstance(rows, list) else rows.get('data', []))
+    else:
+        frame = pd.read_csv(io.BytesIO(data), dtype=str, keep_default_na=False)
+    frame = frame.reindex(columns=BULK_COLUMNS)
+    for column in ("source", "destination", "amount", "asset", "reference"):
+        frame[column] = frame[column].map(lambda v: "" if v is None or (isinstance(v, float) and pd.isna(v)) else str(v).strip())
+    return frame
+
+
+def _metadata(value):
+    if isinstance(value, dict):
+        return value
+    if value is None or (isinstance(value, float) and pd.isna(value)) or value == "":
+        return {}
+    metadata = json.loads(value)
+    if not isinstance(metadata, dict):
+        raise ValueError("metadata must be a JSON object")
+    return metadata
+
+
+def validate(frame: pd.DataFrame, known_assets=None):
+    """Build the transaction payloads locally.
+
+    Returns (payloads, errors): payloads maps row number to the transaction
+    body, errors maps row number to the reason it was rejected.
+    """
+    payloads, errors = {}, {}
+    for row, record in enumerate(frame.to_dict('records')):
+        try:
+            for side in ("source", "destination"):
+                if not record[side]:
+                    raise ValueError(f"{side} account is empty")
+                if not ADDRESS_PATTERN.match(record[side]):
+                    raise ValueError(f"invalid {side} account {record[side]!r}")
+            asset = record['asset']
+            if not ASSET_PATTERN.match(asset):
+                raise ValueError(f"invalid asset {asset!r}")
+            if known_assets is not None and asset not in known_assets:
+                raise ValueError(f"unknown asset {asset}")
+            amount = minor_units(record['amount'], asset)
+            if amount <= 0:
+                raise ValueError("amount must be positive")
+            payload = {
+                "postings": [{"source": record['source'], "destination": record['destination'],
+                              "amount": amount, "asset": asset}],
+                "metadata": _metadata(record.get('metadata')),
+            }
+            if record.get('reference'):
+                payload['reference'] = record['reference']
+            payloads[row] = payload
+        except (ValueError, TypeError) as e:
+            errors[row] = str(e)
+    return payloads, errors
+
+
+def idempotency_keys(ledger: str, payloads: dict):
+    # {row: key} from the ledger and the row's own payload, numbered among
+    # identical rows, so re-submitting a file after correcting some rows
+    # never double-posts the rows that already went through
+    keys, seen = {}, {}
+    for row in sorted(payloads):
+        body = json.dumps([ledger, payloads[row]], sort_keys=True, separators=(',', ':'))
+        digest = hashlib.sha256(body.encode()).hexdigest()[:32]
+        seen[digest] = seen.get(digest, 0) + 1
+        keys[row] = f"{digest}-{seen[digest]}"
+    return keys
+
+
+def submit(client, ledger: str, payloads: dict, keys: dict = None, batch_size: int = DEFAULT_BATCH_SIZE,
+           progress=None):
+    """Send the payloads to /{ledger}/_bulk in batches.
+
+    `keys` maps each row to its idempotency key, idempotency_keys() by default.
+
+    Returns ({row: result}, elapsed seconds); each result has a status, the
+    created transaction id or the error message.
+    """
+    keys = keys or idempotency_keys(ledger, payloads)
+    results = {}
+    rows = sorted(payloads)
+    start = time.perf_counter()
+    for offset in range(0, len(rows), batch_size):
+        batch = rows[offset:offset + batch_size]
+        elements = [{"action": "CREATE_TRANSACTION", "ik": keys[row], "data": payloads[row]}
+                    for row in batch]
+        try:
+            responses = client.bulk(ledger, elements)
+        except Exception as e:
+            for row in batch:
+                results[row] = {"status": "error", "error": str(e)}
+        else:
+            for row, response in zip(batch, responses):
+                if response.get('responseType') == 'ERROR':
+                    results[row] = {"status": "error",
+                                    "error": response.get('errorDescription') or response.get('errorCode')}
+                else:
+                    results[row] = {"status": "created", "txid": (response.get('data') or {}).get('id')}
+            for row in batch[len(responses):]:
+                results[row] = {"status": "error", "error": "no response from the bulk endpoint"}
+        if progress is not None:
+            progress(len(results), len(rows))
+    return results, time.perf_counter() - start
+
+
+def results_frame(frame: pd.DataFrame, errors: dict, results: dict):
+    report = frame[["source", "destination", "amount", "asset"]].copy()
+    report.insert(0, "row", range(1, len(report) + 1))
+    status, txid, message = [], [], []
+    for row in range(len(report)):
+        if row in errors:
+            status.append("invalid")
+            txid.append(None)
+            message.append(errors[row])
+        else:
+            result = results.get(row, {"status": "skipped"})
+            status.append(result['status'])
+            txid.append(result.get('txid'))
+            message.append(result.get('error', ""))
+    report['status'] = status
+    report['txid'] = pd.array(txid, dtype="Int64")
+    report['error'] = message
+    return report
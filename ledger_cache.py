@@ -0,0 +1,195 @@
+import contextvars
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# ttl in seconds, maximum number of entries, and whether entries are keyed by
+# ledger (first element of the key, None meaning "all ledgers")
+CachePolicy = namedtuple("CachePolicy", ["ttl", "maxsize", "per_ledger"])
+
+DEFAULT_POLICIES = {
+    "default": CachePolicy(30, 128, True),
+    "server_info": CachePolicy(60, 1, False),
+    "list_ledgers": CachePolicy(60, 1, False),
+    "ledger_info": CachePolicy(300, 64, True),
+    "account": CachePolicy(30, 1024, True),
+    # Committed transactions only change when reverted or annotated
+    "transaction": CachePolicy(600, 4096, True),
+    "counts": CachePolicy(30, 128, True),
+    "aggregate": CachePolicy(30, 64, True),
+    "balance_index": CachePolicy(60, 4, True),
+    "flows": CachePolicy(60, 32, True),
+    "pages": CachePolicy(30, 256, True),
+    # VolumeStore keeps the buckets and refreshes them on its own schedule;
+    # this only shares one read between the loads of a rerun
+    "volumes": CachePolicy(5, 256, True),
+    # How often the address search index pulls new addresses from the logs
+    "address_index": CachePolicy(30, 64, True),
+    "pit_support": CachePolicy(3600, 64, True),
+    # Past balances only change with back-dated transactions
+    "balances_at": CachePolicy(300, 1024, True),
+    "query_support": CachePolicy(3600, 64, True),
+    # How often the metadata index pulls new logs
+    "metadata_index": CachePolicy(30, 64, True),
+}
+
+
+def _nbytes(value):
+    # Size reported by columnar values, bare or as the `data` of a page
+    if isinstance(value, dict):
+        value = value.get('data')
+    return getattr(value, 'nbytes', 0)
+
+
+class _Entries:
+    def __init__(self, policy: CachePolicy):
+        self.policy = policy
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+
+class LedgerCache:
+    """TTL + LRU cache for the read helpers, with one policy per endpoint."""
+
+    def __init__(self, policies: dict = None):
+        self.policies = dict(DEFAULT_POLICIES)
+        if policies:
+            self.policies.update(policies)
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def _entries(self, endpoint: str):
+        entries = self._endpoints.get(endpoint)
+        if entries is None:
+            policy = self.policies.get(endpoint, self.policies["default"])
+            entries = self._endpoints[endpoint] = _Entries(policy)
+        return entries
+
+    def get(self, endpoint: str, key: tuple, default=None):
+        with self._lock:
+            entries = self._entries(endpoint)
+            found = entries.items.get(key)
+            if found is not None:
+                expires_at, value = found
+                if expires_at > time.monotonic():
+                    entries.items.move_to_end(key)
+                    entries.hits += 1
+                    return value
+                del entries.items[key]
+                entries.expirations += 1
+            entries.misses += 1
+            return default
+
+    def set(self, endpoint: str, key: tuple, value):
+        with self._lock:
+            entries = self._entries(endpoint)
+            if entries.policy.maxsize <= 0 or entries.policy.ttl <= 0:
+                return
+            entries.items[key] = (time.monotonic() + entries.policy.ttl, value)
+            entries.items.move_to_end(key)
+            while len(entries.items) > entries.policy.maxsize:
+                entries.items.popitem(last=False)
+                entries.evictions += 1
+
+    def contains(self, endpoint: str, key: tuple):
+        # Fresh entry present; does not touch the hit/miss counters
+        with self._lock:
+            entries = self._endpoints.get(endpoint)
+            found = entries.items.get(key) if entries else None
+            return found is not None and found[0] > time.monotonic()
+
+    def values(self, endpoint: str):
+        # Fresh values of one endpoint; does not touch the hit/miss counters
+        with self._lock:
+            entries = self._endpoints.get(endpoint)
+            now = time.monotonic()
+            return [value for expires_at, value in entries.items.values() if expires_at > now] if entries else []
+
+    def get_or_load(self, endpoint: str, key: tuple, loader):
+        # Misses call `loader`; None results and exceptions are never cached
+        missing = object()
+        value = self.get(endpoint, key, missing)
+        if value is missing:
+            value = loader()
+            if value is not None:
+                self.set(endpoint, key, value)
+        return value
+
+    def discard(self, endpoint: str, key: tuple):
+        with self._lock:
+            entries = self._endpoints.get(endpoint)
+            if entries is not None:
+                entries.items.pop(key, None)
+
+    def invalidate(self, ledger: str):
+        # Drop everything that may contain data from `ledger`, including the
+        # cross-ledger (None) entries
+        with self._lock:
+            for entries in self._endpoints.values():
+                if not entries.policy.per_ledger:
+                    continue
+                for key in [k for k in entries.items if k and k[0] in (ledger, None)]:
+                    del entries.items[key]
+
+    def clear(self):
+        with self._lock:
+            for entries in self._endpoints.values():
+                entries.items.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                endpoint: {
+                    "ttl": entries.policy.ttl,
+                    "maxsize": entries.policy.maxsize,
+                    "size": len(entries.items),
+                    "hits": entries.hits,
+                    "misses": entries.misses,
+                    "evictions": entries.evictions,
+                    "expirations": entries.expirations,
+                    "bytes": sum(_nbytes(value) for _, value in entries.items.values()),
+                }
+                for endpoint, entries in self._endpoints.items()
+            }
+
+
+class Prefetcher:
+    """Loads cache entries on background threads.
+
+    A foreground load of an entry that is still being prefetched waits for
+    it instead of requesting it a second time. Loads run in the context of
+    the submitting thread, so their requests count towards its rerun.
+    """
+
+    def __init__(self, cache: LedgerCache, max_workers: int = 2):
+        self.cache = cache
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="prefetch")
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def submit(self, endpoint: str, key: tuple, loader):
+        with self._lock:
+            if (endpoint, key) in self._pending or self.cache.contains(endpoint, key):
+                return
+            future = self._pool.submit(contextvars.copy_context().run, self.cache.get_or_load, endpoint, key, loader)
+            self._pending[(endpoint, key)] = future
+        future.add_done_callback(lambda _: self._forget(endpoint, key))
+
+    def _forget(self, endpoint: str, key: tuple):
+        with self._lock:
+            self._pending.pop((endpoint, key), None)
+
+    def get_or_load(self, endpoint: str, key: tuple, loader):
+        with self._lock:
+            future = self._pending.get((endpoint, key))
+        if future is not None:
+            try:
+                return future.result()
+            except Exception:
+                # The prefetch failed; retry in the foreground
+                pass
+        return self.cache.get_or_load(endpoint, key, loader)
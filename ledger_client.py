@@ -0,0 +1,302 @@
+import contextvars
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) timeouts in seconds, per logical endpoint
+DEFAULT_TIMEOUTS = {
+    "default": (3.05, 10),
+    "server_info": (3.05, 5),
+    "list_ledgers": (3.05, 10),
+    "ledger_info": (3.05, 10),
+    "accounts": (3.05, 30),
+    "account": (3.05, 10),
+    "transactions": (3.05, 30),
+    "transaction": (3.05, 10),
+    "create_transaction": (3.05, 30),
+    "counts": (3.05, 10),
+    "aggregate": (3.05, 30),
+    "logs": (3.05, 30),
+    "bulk": (3.05, 120),
+}
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Page size requested from cursor endpoints (the v2 API caps it at 1000)
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Worker threads used when fanning out over ledgers
+DEFAULT_WORKERS = 8
+
+
+class LedgerClient:
+    """Process-wide HTTP client for the ledger API.
+
+    Keeps a keep-alive connection pool, applies per-endpoint timeouts,
+    retries idempotent requests with backoff on 429/5xx and, when given
+    `metrics` (see ledger_metrics), records each call's latency and payload
+    size there as `http.<endpoint>`. Identical GET/HEAD requests made while
+    one is already in flight share its response.
+    """
+
+    def __init__(self, base_url: str, timeouts: dict = None, pool_size: int = 32,
+                 retries: int = 3, backoff_factor: float = 0.3, metrics=None):
+        self.base_url = base_url.rstrip('/')
+        self.metrics = metrics
+        self.timeouts = dict(DEFAULT_TIMEOUTS)
+        if timeouts:
+            self.timeouts.update(timeouts)
+
+        # POST is not in the default allowed methods, so transaction creation
+        # is never replayed behind the caller's back.
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def timeout_for(self, endpoint: str):
+        return self.timeouts.get(endpoint, self.timeouts["default"])
+
+    def request(self, method: str, path: str, endpoint: str = "default", **kwargs):
+        key = self._flight_key(method, path, kwargs)
+        if key is None:
+            return self._send(method, path, endpoint, **kwargs)
+        with self._lock:
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = Future()
+        if not leader:
+            # Wait for the request already on the wire (re-raises its error)
+            start = time.perf_counter()
+            response = flight.result()
+            if self.metrics is not None:
+                self.metrics.observe(f"coalesced.{endpoint}", time.perf_counter() - start)
+            return response
+        try:
+            response = self._send(method, path, endpoint, **kwargs)
+            flight.set_result(response)
+            return response
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    @staticmethod
+    def _flight_key(method: str, path: str, kwargs: dict):
+        # Only reads are shared; the body matters for $match queries
+        if method not in ("GET", "HEAD"):
+            return None
+        return (method, path, json.dumps(kwargs.get('params'), sort_keys=True, default=str),
+                json.dumps(kwargs.get('json'), sort_keys=True, default=str))
+
+    def _send(self, method: str, path: str, endpoint: str, **kwargs):
+        kwargs.setdefault("timeout", self.timeout_for(endpoint))
+        start = time.perf_counter()
+        size = 0
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+            size = len(response.content)
+            return response
+        finally:
+            if self.metrics is not None:
+                self.metrics.observe(f"http.{endpoint}", time.perf_counter() - start, size)
+
+    def get(self, path: str, endpoint: str = "default", **kwargs):
+        return self.request("GET", path, endpoint, **kwargs)
+
+    def post(self, path: str, endpoint: str = "default", **kwargs):
+        return self.request("POST", path, endpoint, **kwargs)
+
+    def head(self, path: str, endpoint: str = "default", **kwargs):
+        return self.request("HEAD", path, endpoint, **kwargs)
+
+    def count(self, ledger: str, resource: str, params: dict = None):
+        # HEAD on a list endpoint returns the total in the `Count` header;
+        # None means the server did not report it
+        response = self.head(f"/{ledger}/{resource}", "counts", params=params)
+        response.raise_for_status()
+        count = response.headers.get('Count')
+        return int(count) if count is not None else None
+
+    def aggregate_balances(self, ledger: str, query: dict = None, params: dict = None):
+        # Per-asset sum of balances, optionally restricted by a v2 query body
+        response = self.get(f"/{ledger}/aggregate/balances", "aggregate", params=params, json=query)
+        response.raise_for_status()
+        return response.json().get('data', {})
+
+    def fetch_page(self, path: str, endpoint: str = "default", params: dict = None,
+                   page_size: int = DEFAULT_PAGE_SIZE, cursor: str = None, query: dict = None):
+        # One page of a cursor endpoint: {'data', 'next', 'previous'}; `next`
+        # is None on the last page. `query` is a v2 filter body ($match, ...)
+        if cursor:
+            # The cursor token already encodes the filters and page size
+            params, query = {'cursor': cursor}, None
+        else:
+            params = dict(params or {})
+            params['pageSize'] = max(1, min(page_size, MAX_PAGE_SIZE))
+        response = self.get(path, endpoint, params=params, json=query)
+        response.raise_for_status()
+        body = response.json().get('cursor', {})
+        return {
+            'data': body.get('data', []),
+            'next': body.get('next') if body.get('hasMore') else None,
+            'previous': body.get('previous'),
+        }
+
+    def iter_pages(self, path: str, endpoint: str = "default", params: dict = None,
+                   page_size: int = DEFAULT_PAGE_SIZE, query: dict = None):
+        # Follow the v2 cursor; only one page is held in memory at a time
+        cursor = None
+        while True:
+            page = self.fetch_page(path, endpoint, params, page_size, cursor, query)
+            yield page['data']
+            cursor = page['next']
+            if not cursor:
+                return
+
+    def _ledger_pages(self, ledger: str, resource: str, params: dict = None,
+                      page_size: int = DEFAULT_PAGE_SIZE, query: dict = None):
+        for page in self.iter_pages(f"/{ledger}/{resource}", resource, params, page_size, query):
+            for item in page:
+                item['ledger'] = ledger
+            yield page
+
+    def account_pages(self, ledger: str, params: dict = None, page_size: int = DEFAULT_PAGE_SIZE,
+                      query: dict = None):
+        return self._ledger_pages(ledger, "accounts", params, page_size, query)
+
+    def transaction_pages(self, ledger: str, params: dict = None, page_size: int = DEFAULT_PAGE_SIZE,
+                          query: dict = None):
+        return self._ledger_pages(ledger, "transactions", params, page_size, query)
+
+    def bulk(self, ledger: str, elements: list, continue_on_failure: bool = True, atomic: bool = False):
+        # One response per element, in order
+        params = {"continueOnFailure": str(continue_on_failure).lower(), "atomic": str(atomic).lower()}
+        response = self.post(f"/{ledger}/_bulk", "bulk", params=params, json=elements)
+        # A batch with failed elements still carries the per-element results
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        if 'data' not in body:
+            response.raise_for_status()
+        return body.get('data') or []
+
+    def log_pages(self, ledger: str, params: dict = None, page_size: int = DEFAULT_PAGE_SIZE, query: dict = None):
+        # Newest first, like the other v2 list endpoints
+        return self.iter_pages(f"/{ledger}/logs", "logs", params, page_size, query)
+
+    def newest_log_id(self, ledger: str):
+        page = self.fetch_page(f"/{ledger}/logs", "logs", page_size=1)
+        return page['data'][0]['id'] if page['data'] else None
+
+    def close(self):
+        self.session.close()
+
+
+def take(pages, limit: int = None):
+    """Yield items from an iterator of pages, stopping once `limit` items were produced."""
+    if limit is not None and limit <= 0:
+        return
+    count = 0
+    for page in pages:
+        for item in page:
+            yield item
+            count += 1
+            if limit is not None and count >= limit:
+                return
+
+
+def iter_newer(pages, last_id=None):
+    """Yield the items of newest-first pages with an id above `last_id` (all
+    of them when None), a page at a time, stopping at the first page that
+    reaches an item already seen."""
+    for page in pages:
+        fresh = [item for item in page if last_id is None or item['id'] > last_id]
+        if fresh:
+            yield fresh
+        if len(fresh) < len(page):
+            return
+
+
+def fan_out_pages(pages_for, ledgers, max_workers: int = DEFAULT_WORKERS, errors: dict = None,
+                  deadline: float = None, buffer_pages: int = None):
+    """Stream `pages_for(ledger)` for every ledger concurrently.
+
+    Yields (ledger, page) in arrival order. Workers hand pages over through a
+    bounded queue, so at most a few pages per worker are held in memory. A
+    ledger that fails, or is still running after `deadline` seconds, is
+    recorded in `errors` instead of being dropped.
+    """
+    ledgers = list(ledgers)
+    if not ledgers:
+        return
+    if errors is None:
+        errors = {}
+    buffer = queue.Queue(maxsize=buffer_pages or max_workers * 2)
+    stop = threading.Event()
+    finished = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker(ledger):
+        try:
+            for page in pages_for(ledger):
+                if not put((ledger, page)):
+                    return
+        except Exception as e:
+            put((ledger, e))
+        finally:
+            put((ledger, finished))
+
+    pool = ThreadPoolExecutor(max_workers=min(max_workers, len(ledgers)))
+    pending = set(ledgers)
+    expires_at = time.monotonic() + deadline if deadline else None
+    try:
+        for ledger in ledgers:
+            # Workers inherit the caller's context (e.g. the rerun being measured)
+            pool.submit(contextvars.copy_context().run, worker, ledger)
+        while pending:
+            timeout = max(0.0, expires_at - time.monotonic()) if expires_at else None
+            try:
+                ledger, item = buffer.get(timeout=timeout)
+            except queue.Empty:
+                for ledger in pending:
+                    errors[ledger] = f"timed out after {deadline}s"
+                return
+            if item is finished:
+                pending.discard(ledger)
+            elif isinstance(item, Exception):
+                errors[ledger] = str(item)
+            else:
+                yield ledger, item
+    finally:
+        stop.set()
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,314 @@
+"""Compact columnar pages of transactions and accounts.
+
+Pages are converted as they arrive from the API, so the cache never holds
+the raw JSON dicts. Addresses, assets and ledger names are interned once
+per server process in a StringPool and stored as int32 codes; ids, posting
+offsets and timestamps are int64 arrays and amounts int64, or exact Python
+ints (an object array) when a batch has an amount beyond int64, e.g. ETH/18.
+
+Metadata is kept as JSON strings, each distinct one stored once per batch.
+A posting costs 20 bytes (three codes and an amount) plus its share of the
+transaction columns, against roughly 1 KB as parsed JSON. Measure the data
+of a ledger with:
+
+    python ledger_columns.py --ledger main --limit 100000
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from ledger_client import MAX_PAGE_SIZE, LedgerClient
+from ledger_frames import empty_postings_frame, integer_amounts
+
+
+class StringPool:
+    """Interned strings, each stored once and referred to by an int32 code.
+
+    Codes are never reused, so the pool grows with the distinct addresses
+    and assets seen by the process, not with the pages cached.
+    """
+
+    def __init__(self):
+        self._codes = {}
+        self._strings = np.empty(1024, dtype=object)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._codes)
+
+    def encode(self, values: list):
+        codes = self._codes
+        try:
+            return np.fromiter((codes[v] for v in values), dtype=np.int32, count=len(values))
+        except KeyError:
+            pass
+        with self._lock:
+            for value in values:
+                if value not in codes:
+                    self._add(value)
+        return np.fromiter((codes[v] for v in values), dtype=np.int32, count=len(values))
+
+    def _add(self, value):
+        code = len(self._codes)
+        if code == len(self._strings):
+            # Readers keep using the old array until the copy is swapped in
+            grown = np.empty(2 * code, dtype=object)
+            grown[:code] = self._strings
+            self._strings = grown
+        self._strings[code] = value
+        self._codes[value] = code
+
+    def code(self, value):
+        # Code of `value`, None if it was never interned
+        return self._codes.get(value)
+
+    def decode(self, codes):
+        return self._strings[codes]
+
+    def categorical(self, codes):
+        # Categorical of the strings behind `codes`, without hashing every row
+        uniques, inverse = np.unique(codes, return_inverse=True)
+        categories = self.decode(uniques)
+        if any(c is None for c in categories):
+            return pd.Categorical(self.decode(codes))
+        return pd.Categorical.from_codes(inverse.reshape(-1), categories=categories)
+
+    @property
+    def nbytes(self):
+        # The strings, the code array and the lookup dict
+        with self._lock:
+            strings = sum(sys.getsizeof(s) for s in self._codes)
+            return strings + self._strings.nbytes + sys.getsizeof(self._codes)
+
+
+# Shared by every batch of the process
+POOL = StringPool()
+
+
+class Metadata:
+    """Metadata of a batch, dictionary-encoded as compact JSON strings.
+
+    The dictionary belongs to the batch rather than the pool, so values that
+    are unique per transaction are freed with it.
+    """
+
+    def __init__(self, items: list):
+        codes = {"": 0}
+        self.codes = np.fromiter((
+            codes.setdefault(json.dumps(m, sort_keys=True, separators=(',', ':')) if m else "", len(codes))
+            for m in (item.get('metadata') for item in items)
+        ), dtype=np.int32, count=len(items))
+        self.values = tuple(codes)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        value = self.values[self.codes[i]]
+        return json.loads(value) if value else {}
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + sum(sys.getsizeof(v) for v in self.values) + sys.getsizeof(self.values)
+
+
+class TransactionBatch:
+    """Transactions as arrays, one row per transaction plus one per posting."""
+
+    def __init__(self, ids, timestamps, ledgers, reverted, metadata, offsets, sources, destinations, assets,
+                 amounts, pool: StringPool = POOL):
+        self.ids = ids
+        self.timestamps = timestamps
+        self.ledgers = ledgers
+        self.reverted = reverted
+        self.metadata = metadata
+        # Postings of transaction i are offsets[i]:offsets[i + 1]
+        self.offsets = offsets
+        self.sources = sources
+        self.destinations = destinations
+        self.assets = assets
+        self.amounts = amounts
+        self.pool = pool
+
+    @classmethod
+    def from_transactions(cls, transactions: list, ledger: str = None, pool: StringPool = POOL):
+        # `ledger` is used for transactions fetched without a ledger key
+        postings = [p for tx in transactions for p in tx.get('postings') or ()]
+        counts = [len(tx.get('postings') or ()) for tx in transactions]
+        timestamps = pd.to_datetime([tx.get('timestamp') for tx in transactions], utc=True, format='ISO8601',
+                                    errors='coerce')
+        return cls(
+            ids=np.array([tx['id'] for tx in transactions], dtype=np.int64),
+            timestamps=timestamps.tz_convert(None).values.astype('datetime64[ns]'),
+            ledgers=pool.encode([tx.get('ledger') or ledger for tx in transactions]),
+            reverted=np.array([bool(tx.get('reverted')) for tx in transactions], dtype=bool),
+            metadata=Metadata(transactions),
+            offsets=np.concatenate(([0], np.cumsum(counts, dtype=np.int64))),
+            sources=pool.encode([p.get('source') for p in postings]),
+            destinations=pool.encode([p.get('destination') for p in postings]),
+            assets=pool.encode([p.get('asset') for p in postings]),
+            amounts=integer_amounts([p.get('amount') for p in postings]),
+            pool=pool,
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def postings(self):
+        return len(self.amounts)
+
+    @property
+    def nbytes(self):
+        arrays = (self.ids, self.timestamps, self.ledgers, self.reverted, self.offsets, self.sources,
+                  self.destinations, self.assets, self.amounts)
+        size = sum(a.nbytes for a in arrays) + self.metadata.nbytes
+        if self.amounts.dtype == object:
+            size += sum(sys.getsizeof(a) for a in self.amounts)
+        return size
+
+    def __iter__(self):
+        # The transactions as dicts, for callers that want the API shape
+        decode = self.pool.decode
+        stamps = np.datetime_as_string(self.timestamps, unit='us')
+        for i in range(len(self)):
+            start, end = self.offsets[i], self.offsets[i + 1]
+            yield {
+                'id': int(self.ids[i]),
+                'timestamp': f"{stamps[i]}Z",
+                'ledger': decode(self.ledgers[i]),
+                'reverted': bool(self.reverted[i]),
+                'metadata': self.metadata[i],
+                'postings': [
+                    {'source': decode(self.sources[j]), 'destination': decode(self.destinations[j]),
+                     'asset': decode(self.assets[j]), 'amount': int(self.amounts[j])}
+                    for j in range(start, end)
+                ],
+            }
+
+    def postings_frame(self, account: str = None):
+        """The postings_frame() of these transactions, built from the arrays."""
+        if not self.postings:
+            return empty_postings_frame()
+        rows = np.repeat(np.arange(len(self)), np.diff(self.offsets))
+        selected = slice(None)
+        if account is not None:
+            code = self.pool.code(account)
+            if code is None:
+                return empty_postings_frame()
+            selected = np.flatnonzero((self.sources == code) | (self.destinations == code))
+            if not len(selected):
+                return empty_postings_frame()
+            rows = rows[selected]
+        amounts = self.amounts[selected]
+        return pd.DataFrame({
+            "txid": self.ids[rows],
+            "ledger": self.pool.categorical(self.ledgers[rows]),
+            "timestamp": pd.DatetimeIndex(self.timestamps[rows]).tz_localize("UTC"),
+            "source": self.pool.decode(self.sources[selected]),
+            "destination": self.pool.decode(self.destinations[selected]),
+            "asset": self.pool.categorical(self.assets[selected]),
+            "amount": pd.Series(amounts, dtype=amounts.dtype),
+        })
+
+
+class AccountBatch:
+    """Accounts as interned address and ledger codes plus their metadata."""
+
+    def __init__(self, addresses, ledgers, metadata, pool: StringPool = POOL):
+        self.addresses = addresses
+        self.ledgers = ledgers
+        self.metadata = metadata
+        self.pool = pool
+
+    @classmethod
+    def from_accounts(cls, accounts: list, ledger: str = None, pool: StringPool = POOL):
+        return cls(
+            addresses=pool.encode([a['address'] for a in accounts]),
+            ledgers=pool.encode([a.get('ledger') or ledger for a in accounts]),
+            metadata=Metadata(accounts),
+            pool=pool,
+        )
+
+    def __len__(self):
+        return len(self.addresses)
+
+    @property
+    def nbytes(self):
+        return self.addresses.nbytes + self.ledgers.nbytes + self.metadata.nbytes
+
+    def __iter__(self):
+        decode = self.pool.decode
+        for i in range(len(self)):
+            yield {'address': decode(self.addresses[i]), 'ledger': decode(self.ledgers[i]),
+                   'metadata': self.metadata[i]}
+
+    def frame(self):
+        # Address / Ledger / Metadata columns of the account tables
+        return pd.DataFrame({
+            "Address": self.pool.decode(self.addresses),
+            "Ledger": self.pool.decode(self.ledgers),
+            "Metadata": [str(self.metadata[i]) for i in range(len(self))],
+        })
+
+
+def columnar(resource: str, items: list, ledger: str = None):
+    # Batch of a page of `resource` items
+    if resource == "accounts":
+        return AccountBatch.from_accounts(items, ledger)
+    return TransactionBatch.from_transactions(items, ledger)
+
+
+def columnar_usage(values):
+    # (postings, bytes) of the transaction batches among cached values, which
+    # may be batches or {'data': batch, 'next': ...} pages
+    postings = size = 0
+    for value in values:
+        if isinstance(value, dict):
+            value = value.get('data')
+        if isinstance(value, TransactionBatch):
+            postings += value.postings
+            size += value.nbytes
+    return postings, size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memory per million postings of a ledger, as JSON and columnar")
+    parser.add_argument("--ledger", required=True)
+    parser.add_argument("--limit", type=int, default=100000, help="Transactions to read")
+    parser.add_argument("--page-size", type=int, default=MAX_PAGE_SIZE)
+    parser.add_argument("--api-url", default=os.environ.get('FORMANCE_API_URL', "http://ledger:3068"))
+    args = parser.parse_args(argv)
+
+    client = LedgerClient(args.api_url)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    pages = []
+    read = 0
+    for page in client.transaction_pages(args.ledger, page_size=args.page_size):
+        pages.append(page[:args.limit - read])
+        read += len(pages[-1])
+        if read >= args.limit:
+            break
+    raw = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    batches = [TransactionBatch.from_transactions(page, args.ledger) for page in pages]
+    postings = sum(b.postings for b in batches)
+    if not postings:
+        print(f"No postings in {args.ledger}")
+        return
+    size = sum(b.nbytes for b in batches)
+    print(f"{read} transactions, {postings} postings, {len(POOL)} interned strings ({POOL.nbytes / 1e6:.1f} MB)")
+    for label, nbytes in (("JSON dicts", raw), ("columnar", size)):
+        print(f"{label:>10}: {nbytes / 1e6:8.1f} MB, {nbytes / postings:6.0f} MB per million postings")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Streaming export of ledger transactions (one row per posting) and accounts.
+
+Pages are written as they arrive from the cursor API, so memory stays at one
+page regardless of the ledger size. Also usable headless, e.g. from cron:
+
+    python ledger_export.py --ledger main --resource transactions --format parquet -o main.parquet
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import weakref
+
+import pandas as pd
+
+from ledger_client import MAX_PAGE_SIZE, LedgerClient
+from ledger_frames import postings_frame
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson", "parquet": "application/vnd.apache.parquet"}
+RESOURCES = ("transactions", "accounts")
+
+TRANSACTION_COLUMNS = ["txid", "ledger", "timestamp", "source", "destination", "asset", "amount", "metadata"]
+ACCOUNT_COLUMNS = ["address", "ledger", "metadata"]
+
+
+def transactions_chunk(page):
+    # Postings of one page, with the transaction metadata dict
+    frame = postings_frame(page)
+    metadata = {tx['id']: tx.get('metadata') or {} for tx in page}
+    frame['metadata'] = frame['txid'].map(metadata)
+    return frame
+
+
+def accounts_chunk(page):
+    return pd.DataFrame(
+        [(acc.get('address'), acc.get('ledger'), acc.get('metadata') or {}) for acc in page],
+        columns=ACCOUNT_COLUMNS,
+    )
+
+
+def json_text(value):
+    # Metadata as JSON text, for the formats without nested values
+    return json.dumps(value) if isinstance(value, dict) else value
+
+
+class CsvWriter:
+    def __init__(self, out, columns):
+        self.out = out
+        self.columns = columns
+        self.header = True
+
+    def write(self, frame):
+        frame = frame.assign(metadata=frame['metadata'].map(json_text))
+        frame.to_csv(self.out, columns=self.columns, header=self.header, index=False)
+        self.header = False
+
+    def close(self):
+        pass
+
+
+class NdjsonWriter:
+    def __init__(self, out, columns):
+        self.out = out
+        self.columns = columns
+
+    def write(self, frame):
+        for row in frame.itertuples(index=False, name=None):
+            record = {
+                column: value.isoformat() if isinstance(value, pd.Timestamp) else value
+                for column, value in zip(self.columns, row)
+            }
+            # Amounts may exceed int64, json handles Python ints exactly
+            self.out.write(json.dumps(record, default=str).encode() + b"\n")
+
+    def close(self):
+        pass
+
+
+class ParquetWriter:
+    # One row group per page; amounts are written as decimal strings so
+    # assets such as ETH/18 keep full precision
+    def __init__(self, out, columns):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+        self.pa = pa
+        types = {"txid": pa.int64(), "timestamp": pa.timestamp("us", tz="UTC")}
+        self.schema = pa.schema([(column, types.get(column, pa.string())) for column in columns])
+        self.writer = pq.ParquetWriter(out, self.schema)
+
+    def write(self, frame):
+        frame = frame.copy()
+        for field in self.schema:
+            if field.type == self.pa.string():
+                frame[field.name] = frame[field.name].astype(object).map(
+                    lambda v: None if not isinstance(v, dict) and pd.isna(v) else str(json_text(v)))
+        self.writer.write_table(self.pa.Table.from_pandas(frame, schema=self.schema, preserve_index=False))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {"csv": CsvWriter, "ndjson": NdjsonWriter, "parquet": ParquetWriter}
+
+
+def export(client, ledger: str, resource: str, fmt: str, out, params: dict = None,
+           page_size: int = MAX_PAGE_SIZE, limit: int = None, progress=None):
+    """Write `resource` of `ledger` to the binary stream `out`; returns the number of rows."""
+    if resource == "transactions":
+        pages, to_frame, columns = client.transaction_pages(ledger, params, page_size), transactions_chunk, TRANSACTION_COLUMNS
+    elif resource == "accounts":
+        pages, to_frame, columns = client.account_pages(ledger, params, page_size), accounts_chunk, ACCOUNT_COLUMNS
+    else:
+        raise ValueError(f"Unknown resource {resource!r}")
+
+    writer = WRITERS[fmt](out, columns)
+    rows = 0
+    items = 0
+    try:
+        for page in pages:
+            if limit is not None:
+                page = page[:limit - items]
+            items += len(page)
+            frame = to_frame(page)
+            if len(frame):
+                writer.write(frame[columns])
+                rows += len(frame)
+            if progress is not None:
+                progress(items, rows)
+            if limit is not None and items >= limit:
+                break
+    finally:
+        writer.close()
+    return rows
+
+
+class ExportFile:
+    """A finished export in a temporary file.
+
+    The file is removed with the object, e.g. when the session state holding
+    it is dropped at the end of the session, or earlier by remove().
+    """
+
+    def __init__(self, fmt: str):
+        fd, self.path = tempfile.mkstemp(prefix="ledger-export-", suffix=f".{fmt}")
+        os.close(fd)
+        self.fmt = fmt
+        self.rows = 0
+        self._remove = weakref.finalize(self, _remove_file, self.path)
+
+    def open(self):
+        return open(self.path, "wb")
+
+    def read(self):
+        # Read on demand, e.g. only when the download button is clicked
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def remove(self):
+        self._remove()
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export ledger transactions or accounts")
+    parser.add_argument("--ledger", required=True)
+    parser.add_argument("--resource", choices=RESOURCES, default="transactions")
+    parser.add_argument("--format", choices=list(FORMATS), default="csv")
+    parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+    parser.add_argument("--source", help="Only transactions with this source account")
+    parser.add_argument("--destination", help="Only transactions with this destination account")
+    parser.add_argument("--page-size", type=int, default=MAX_PAGE_SIZE)
+    parser.add_argument("--limit", type=int, help="Stop after this many transactions/accounts")
+    parser.add_argument("--api-url", default=os.environ.get('FORMANCE_API_URL', "http://ledger:3068"))
+    args = parser.parse_args(argv)
+
+    params = {k: v for k, v in (("source", args.source), ("destination", args.destination)) if v}
+    client = LedgerClient(args.api_url)
+
+    def report(items, rows):
+        print(f"\r{items} {args.resource}, {rows} rows", end="", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "wb") as out:
+            rows = export(client, args.ledger, args.resource, args.format, out, params,
+                          args.page_size, args.limit, report)
+    else:
+        rows = export(client, args.ledger, args.resource, args.format, sys.stdout.buffer, params,
+                      args.page_size, args.limit, report)
+    print(f"\nExported {rows} rows", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+import base64
+import math
+from collections import Counter, deque
+from io import BytesIO
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import networkx as nx
+import plotly.graph_objects as go
+
+# Above these sizes the static renderer drops the per-edge/per-node labels
+MAX_LABELLED_EDGES = 60
+MAX_LABELLED_NODES = 80
+
+# Default budgets for the account flow explorer
+FLOW_MAX_NODES = 200
+FLOW_MAX_EDGES = 500
+FLOW_MAX_TRANSACTIONS = 20000
+
+
+def build_transaction_graph(tx):
+    # One edge per (source, destination); parallel postings are merged into
+    # a multi-line label
+    G = nx.DiGraph()
+    for posting in tx.get('postings', []):
+        src = posting.get('source')
+        dst = posting.get('destination')
+        label = f"{posting.get('asset')} {posting.get('amount')}"
+        if G.has_edge(src, dst):
+            G[src][dst]['labels'].append(label)
+        else:
+            G.add_edge(src, dst, labels=[label])
+    for _, _, data in G.edges(data=True):
+        data['label'] = "\n".join(data['labels'])
+    return G
+
+
+def layered_layout(G):
+    # Deterministic O(V + E) layout: accounts that only send sit in the first
+    # column, every other account one column after its closest sender
+    layer = {}
+    queue = deque()
+    for node in sorted(G.nodes, key=str):
+        if G.in_degree(node) == 0:
+            layer[node] = 0
+            queue.append(node)
+    if not queue and G.number_of_nodes():
+        first = min(G.nodes, key=str)
+        layer[first] = 0
+        queue.append(first)
+    while queue:
+        node = queue.popleft()
+        for succ in G.successors(node):
+            if succ not in layer:
+                layer[succ] = layer[node] + 1
+                queue.append(succ)
+    for node in G.nodes:
+        layer.setdefault(node, 0)
+
+    columns = {}
+    for node in sorted(G.nodes, key=str):
+        columns.setdefault(layer[node], []).append(node)
+    pos = {}
+    for x, nodes in columns.items():
+        for i, node in enumerate(nodes):
+            pos[node] = (float(x), -(i - (len(nodes) - 1) / 2))
+    return pos
+
+
+def _grid_size(pos):
+    # (number of columns, height of the tallest column)
+    heights = Counter(x for x, _ in pos.values())
+    return len(heights) or 1, max(heights.values(), default=1)
+
+
+def generate_transaction_graph(tx):
+    # Static PNG rendering, returned as base64 for st.image
+    G = build_transaction_graph(tx)
+    pos = layered_layout(G)
+
+    columns, rows = _grid_size(pos)
+    fig, ax = plt.subplots(figsize=(max(8, 3 * columns), max(6, 0.5 * rows)))
+    label_nodes = G.number_of_nodes() <= MAX_LABELLED_NODES
+    small = G.number_of_edges() <= MAX_LABELLED_EDGES
+    # Without arrows matplotlib draws every edge in one LineCollection instead
+    # of one patch per edge
+    nx.draw(G, pos, with_labels=label_nodes, node_color='lightblue', arrows=small,
+            node_size=1500 if label_nodes else 100, font_size=10, ax=ax)
+    if small:
+        nx.draw_networkx_edge_labels(G, pos, edge_labels=nx.get_edge_attributes(G, 'label'), ax=ax)
+
+    # Convert to base64 for display in Streamlit
+    buf = BytesIO()
+    fig.savefig(buf, format='png')
+    plt.close(fig)
+    buf.seek(0)
+    return base64.b64encode(buf.read()).decode('utf-8')
+
+
+def graph_figure(G, pos, title: str = None):
+    # Interactive rendering: all edges share one line trace and all labels
+    # one hover trace, so the figure size stays linear in the edges
+    edge_x, edge_y = [], []
+    mid_x, mid_y, mid_text, arrow_angle = [], [], [], []
+    for src, dst, data in G.edges(data=True):
+        x0, y0 = pos[src]
+        x1, y1 = pos[dst]
+        edge_x += [x0, x1, None]
+        edge_y += [y0, y1, None]
+        # Arrow head three quarters of the way along the edge
+        mid_x.append(x0 + (x1 - x0) * 0.75)
+        mid_y.append(y0 + (y1 - y0) * 0.75)
+        mid_text.append(f"{src} → {dst}<br>" + data['label'].replace("\n", "<br>"))
+        arrow_angle.append(math.degrees(math.atan2(x1 - x0, y1 - y0)))
+
+    nodes = list(G.nodes)
+    show_text = len(nodes) <= MAX_LABELLED_NODES
+    fig = go.Figure([
+        go.Scatter(x=edge_x, y=edge_y, mode='lines', hoverinfo='skip',
+                   line=dict(width=1, color='#888')),
+        go.Scatter(x=mid_x, y=mid_y, mode='markers', hovertext=mid_text, hoverinfo='text',
+                   marker=dict(symbol='arrow', size=12, angle=arrow_angle, color='#888')),
+        go.Scatter(x=[pos[n][0] for n in nodes], y=[pos[n][1] for n in nodes],
+                   mode='markers+text' if show_text else 'markers',
+                   text=nodes, textposition='top center', hovertext=nodes, hoverinfo='text',
+                   marker=dict(size=18, color='lightblue', line=dict(width=1, color='#333'))),
+    ])
+    fig.update_layout(
+        title=title,
+        showlegend=False,
+        hovermode='closest',
+        xaxis=dict(visible=False),
+        yaxis=dict(visible=False),
+        margin=dict(l=10, r=10, t=40 if title else 10, b=10),
+        height=min(2000, max(400, 40 * _grid_size(pos)[1])),
+    )
+    return fig
+
+
+def transaction_graph_figure(tx, title: str = None):
+    G = build_transaction_graph(tx)
+    return graph_figure(G, layered_layout(G), title)
+
+
+class AccountFlows:
+    """Money flows around one account, aggregated per (source, destination, asset).
+
+    Postings are folded in as pages stream in, so only the aggregated edges
+    and the ids of already folded postings are kept in memory.
+    """
+
+    def __init__(self, root: str, max_nodes: int = FLOW_MAX_NODES, max_edges: int = FLOW_MAX_EDGES):
+        self.root = root
+        self.max_nodes = max_nodes
+        self.max_edges = max_edges
+        # address -> layout column: senders to the left of the root (negative),
+        # receivers to the right, one column per hop
+        self.columns = {root: 0}
+        # (source, destination, asset) -> [amount, postings]
+        self.edges = {}
+        self.truncated = False
+        self._transactions = set()
+        self._postings = set()
+
+    @property
+    def transactions(self):
+        return len(self._transactions)
+
+    @property
+    def nodes_full(self):
+        return len(self.columns) >= self.max_nodes
+
+    @property
+    def full(self):
+        # Neither a new address nor a new edge can be added any more
+        return self.nodes_full and len(self.edges) >= self.max_edges
+
+    def add_transaction(self, tx, address: str):
+        # Fold the postings of `tx` that touch `address`; returns newly reached addresses
+        tx_id = tx.get('id')
+        self._transactions.add(tx_id)
+        reached = []
+        for i, posting in enumerate(tx.get('postings', [])):
+            src = posting.get('source')
+            dst = posting.get('destination')
+            if address not in (src, dst) or (tx_id, i) in self._postings:
+                continue
+            other = dst if src == address else src
+            if other not in self.columns:
+                if self.nodes_full:
+                    self.truncated = True
+                    continue
+                column = self.columns[address]
+                if column == 0:
+                    column = 1 if other == dst else -1
+                else:
+                    column += 1 if column > 0 else -1
+                self.columns[other] = column
+                reached.append(other)
+            key = (src, dst, posting.get('asset'))
+            edge = self.edges.get(key)
+            if edge is None:
+                if len(self.edges) >= self.max_edges:
+                    self.truncated = True
+                    continue
+                edge = self.edges[key] = [0, 0]
+            edge[0] += int(posting.get('amount', 0))
+            edge[1] += 1
+            self._postings.add((tx_id, i))
+        return reached
+
+    def to_rows(self):
+        return [
+            {"Source": src, "Destination": dst, "Asset": asset, "Amount": amount, "Postings": count}
+            for (src, dst, asset), (amount, count) in sorted(self.edges.items(), key=lambda e: -e[1][0])
+        ]
+
+    def graph(self):
+        G = nx.DiGraph()
+        for (src, dst, asset), (amount, _) in self.edges.items():
+            label = f"{asset} {amount}"
+            if G.has_edge(src, dst):
+                G[src][dst]['label'] += "\n" + label
+            else:
+                G.add_edge(src, dst, label=label)
+        return G
+
+    def layout(self, G):
+        columns = {}
+        for node in sorted(G.nodes, key=str):
+            columns.setdefault(self.columns.get(node, 0), []).append(node)
+        pos = {}
+        for x, nodes in columns.items():
+            for i, node in enumerate(nodes):
+                pos[node] = (float(x), -(i - (len(nodes) - 1) / 2))
+        return pos
+
+    def figure(self, title: str = None):
+        G = self.graph()
+        return graph_figure(G, self.layout(G), title)
+
+
+def explore_account_flows(client, ledger: str, account: str, hops: int = 2,
+                          max_nodes: int = FLOW_MAX_NODES, max_edges: int = FLOW_MAX_EDGES,
+                          max_transactions: int = FLOW_MAX_TRANSACTIONS, page_size: int = 100,
+                          skip=("world",)):
+    # Bounded BFS over postings: each hop expands the addresses reached by the
+    # previous one through paginated source/destination transaction queries.
+    # Accounts in `skip` (the world mint by default) are never expanded.
+    flows = AccountFlows(account, max_nodes, max_edges)
+    frontier = [account]
+    for _ in range(hops):
+        next_frontier = []
+        for address in frontier:
+            if address in skip and address != account:
+                continue
+            for side in ('source', 'destination'):
+                query = {"$match": {side: address}}
+                for page in client.transaction_pages(ledger, page_size=page_size, query=query):
+                    for tx in page:
+                        if flows.nodes_full:
+                            # Only edges between addresses already reached
+                            flows.add_transaction(tx, address)
+                        else:
+                            next_frontier.extend(flows.add_transaction(tx, address))
+                    if flows.transactions >= max_transactions or flows.full:
+                        flows.truncated = True
+                        return flows
+        frontier = next_frontier
+        if not frontier:
+            break
+    return flows
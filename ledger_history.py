@@ -0,0 +1,170 @@
+"""Balances as of a past date.
+
+Servers with point-in-time reads answer directly: `pit` on the account and
+accounts endpoints returns the volumes as they were at that instant. For
+the others, BalanceCheckpoints folds a ledger's postings into net deltas per
+(account, asset, day) and keeps, per (account, asset), the balance at the
+end of each day it moved: a prefix sum over its days. A balance as of a date
+is the last checkpoint on or before it, found by bisection, so a query never
+replays transactions.
+"""
+import threading
+import time
+from bisect import bisect_right
+from datetime import date, datetime, time as day_time, timezone
+
+import numpy as np
+import pandas as pd
+
+from ledger_client import MAX_PAGE_SIZE, iter_newer
+from ledger_frames import postings_frame
+from ledger_index import account_balances
+
+# Seconds between two incremental syncs of the same ledger's checkpoints
+SYNC_INTERVAL = 60
+
+# No account exists at the epoch, so a server honouring `pit` lists none
+EPOCH_PIT = "1970-01-01T00:00:00Z"
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def end_of_day(day: date):
+    # Last instant of `day` in UTC, as an RFC 3339 `pit`
+    return datetime.combine(day, day_time.max, timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def supports_pit(client, ledger: str):
+    # A server ignoring `pit` lists its current accounts instead. None while
+    # the ledger has no accounts, since the probe cannot tell then (None
+    # results are not cached)
+    if not client.fetch_page(f"/{ledger}/accounts", "accounts", page_size=1)['data']:
+        return None
+    page = client.fetch_page(f"/{ledger}/accounts", "accounts", {'pit': EPOCH_PIT}, page_size=1)
+    return not page['data']
+
+
+def account_balances_at(client, ledger: str, address: str, pit: str):
+    response = client.get(f"/{ledger}/accounts/{address}", "account", params={'pit': pit, 'expand': 'volumes'})
+    if response.status_code == 404:
+        return {}
+    response.raise_for_status()
+    return account_balances(response.json()['data'])
+
+
+class BalanceCheckpoints:
+    """End-of-day balance checkpoints of every account of one ledger."""
+
+    def __init__(self, ledger: str):
+        self.ledger = ledger
+        self.last_id = None
+        self.lock = threading.Lock()
+        # (account, asset) -> {day ordinal: net delta}, only used by sync
+        self._deltas = {}
+        # (checkpoints, assets): (account, asset) -> (sorted day ordinals,
+        # balance at the end of each), and account -> frozenset of the assets
+        # it has moved. Sync swaps in new dicts, so readers never take the
+        # lock nor see a sync half applied
+        self._state = ({}, {})
+
+    def sync(self, client, page_size: int = MAX_PAGE_SIZE):
+        # Fold the transactions committed since the last sync (listed newest
+        # first), then rebuild the checkpoints of the keys they touched. A
+        # back-dated transaction shifts every later checkpoint of its keys.
+        # The walk's deltas are merged with last_id only once it completes,
+        # so a sync that fails partway is retried from scratch, not re-added
+        with self.lock:
+            newest = self.last_id
+            staged = {}
+            for fresh in iter_newer(client.transaction_pages(self.ledger, page_size=page_size), self.last_id):
+                self._fold(postings_frame(fresh, ledger=self.ledger), staged)
+                newest = max(newest if newest is not None else -1, max(tx['id'] for tx in fresh))
+            touched = self._merge(staged)
+            if touched:
+                checkpoints, assets = (dict(state) for state in self._state)
+                for account, asset in touched:
+                    deltas = self._deltas[(account, asset)]
+                    days = sorted(deltas)
+                    balances = list(np.cumsum([deltas[day] for day in days], dtype=object))
+                    checkpoints[(account, asset)] = (days, balances)
+                    assets[account] = assets.get(account, frozenset()) | {asset}
+                self._state = (checkpoints, assets)
+            self.last_id = newest
+            return len(touched)
+
+    def _fold(self, frame: pd.DataFrame, staged: dict):
+        # Add the net deltas of a postings frame to `staged`:
+        # (account, asset) -> {day ordinal: delta}
+        if frame.empty:
+            return
+        days = frame['timestamp'].dt.tz_convert(None).values.astype('datetime64[D]').astype(np.int64) + _EPOCH_ORDINAL
+        moves = pd.concat([
+            pd.DataFrame({'account': frame['destination'], 'asset': frame['asset'].astype(str),
+                          'day': days, 'amount': frame['amount'].astype(object)}),
+            pd.DataFrame({'account': frame['source'], 'asset': frame['asset'].astype(str),
+                          'day': days, 'amount': -frame['amount'].astype(object)}),
+        ])
+        for (account, asset, day), amount in moves.groupby(['account', 'asset', 'day'])['amount'].sum().items():
+            deltas = staged.setdefault((account, asset), {})
+            deltas[day] = deltas.get(day, 0) + int(amount)
+
+    def _merge(self, staged: dict):
+        for (account, asset), days in staged.items():
+            deltas = self._deltas.setdefault((account, asset), {})
+            for day, amount in days.items():
+                deltas[day] = deltas.get(day, 0) + amount
+        return set(staged)
+
+    @staticmethod
+    def _balance(checkpoints: dict, account: str, asset: str, day: int):
+        days, balances = checkpoints.get((account, asset), ((), ()))
+        i = bisect_right(days, day)
+        return balances[i - 1] if i else 0
+
+    def balance(self, account: str, asset: str, day: date):
+        checkpoints, _ = self._state
+        return self._balance(checkpoints, account, asset, day.toordinal())
+
+    def account_balances(self, account: str, day: date):
+        checkpoints, assets = self._state
+        return {asset: self._balance(checkpoints, account, asset, day.toordinal())
+                for asset in sorted(assets.get(account, ()))}
+
+    def balances(self, day: date):
+        # (account, {asset: balance}) of every account seen by `day`
+        checkpoints, assets = self._state
+        day = day.toordinal()
+        for account in sorted(assets):
+            balances = {
+                asset: self._balance(checkpoints, account, asset, day) for asset in sorted(assets[account])
+                if checkpoints[(account, asset)][0][0] <= day
+            }
+            if balances:
+                yield account, balances
+
+
+class CheckpointStore:
+    """BalanceCheckpoints per ledger, synced incrementally."""
+
+    def __init__(self, sync_interval: float = SYNC_INTERVAL):
+        self.sync_interval = sync_interval
+        self._checkpoints = {}
+        self._synced_at = {}
+        self._lock = threading.Lock()
+
+    def synced(self, client, ledger: str, force: bool = False):
+        with self._lock:
+            checkpoints = self._checkpoints.get(ledger)
+            if checkpoints is None:
+                checkpoints = self._checkpoints[ledger] = BalanceCheckpoints(ledger)
+        now = time.monotonic()
+        if force or now - self._synced_at.get(ledger, float('-inf')) >= self.sync_interval:
+            checkpoints.sync(client)
+            self._synced_at[ledger] = time.monotonic()
+        return checkpoints
+
+    def expire(self, ledger: str = None):
+        # Pull new transactions on the next read, keeping the checkpoints
+        with self._lock:
+            for name in [ledger] if ledger else list(self._synced_at):
+                self._synced_at.pop(name, None)
@@ -0,0 +1,76 @@
+from ledger_client import DEFAULT_WORKERS, MAX_PAGE_SIZE, fan_out_pages
+
+
+def account_balances(account: dict):
+    # Balances from an account fetched with expand=volumes, falling back to the
+    # plain `balances` map when volumes were not expanded
+    volumes = account.get('volumes') or {}
+    if volumes:
+        return {
+            asset: volume['balance'] if volume.get('balance') is not None
+            else volume.get('input', 0) - volume.get('output', 0)
+            for asset, volume in volumes.items()
+        }
+    return dict(account.get('balances') or {})
+
+
+class BalanceIndex:
+    """In-memory asset -> (ledger, account, balance) index."""
+
+    def __init__(self):
+        self._by_asset = {}
+        # ledger -> accounts indexed
+        self._accounts = {}
+        self.errors = {}
+
+    @property
+    def accounts(self):
+        return sum(self._accounts.values())
+
+    def add(self, ledger: str, address: str, balances: dict):
+        self._accounts[ledger] = self._accounts.get(ledger, 0) + 1
+        for asset, balance in balances.items():
+            self._by_asset.setdefault(asset, []).append((ledger, address, balance))
+
+    def replace_ledger(self, ledger: str, other):
+        # Swap the entries of `ledger` for those of another index (None drops
+        # them), e.g. the last complete walk of a ledger that failed this time
+        for asset in list(self._by_asset):
+            kept = [entry for entry in self._by_asset[asset] if entry[0] != ledger]
+            if kept:
+                self._by_asset[asset] = kept
+            else:
+                del self._by_asset[asset]
+        self._accounts.pop(ledger, None)
+        if other is None or ledger not in other._accounts:
+            return
+        self._accounts[ledger] = other._accounts[ledger]
+        for asset, entries in other._by_asset.items():
+            entries = [entry for entry in entries if entry[0] == ledger]
+            if entries:
+                self._by_asset.setdefault(asset, []).extend(entries)
+
+    def assets(self):
+        return sorted(self._by_asset)
+
+    def holders(self, asset: str, include_zero: bool = False):
+        return [
+            {"Account": address, "Ledger": ledger, "Balance": balance}
+            for ledger, address, balance in self._by_asset.get(asset, [])
+            if include_zero or balance != 0
+        ]
+
+
+def build_balance_index(client, ledgers, max_workers: int = DEFAULT_WORKERS,
+                        page_size: int = MAX_PAGE_SIZE, params: dict = None):
+    # One bulk-paged accounts query per ledger instead of one request per
+    # account; `params` may add e.g. a `pit` for past balances
+    index = BalanceIndex()
+
+    def pages_for(ledger):
+        return client.account_pages(ledger, {'expand': 'volumes', **(params or {})}, page_size=page_size)
+
+    for ledger, page in fan_out_pages(pages_for, ledgers, max_workers, errors=index.errors):
+        for account in page:
+            index.add(ledger, account['address'], account_balances(account))
+    return index
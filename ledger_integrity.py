@@ -0,0 +1,292 @@
+"""Consistency checks of a ledger against its own history.
+
+Checks, as of one point in time (the newest transaction when the run starts):
+
+- volumes: every account's input - output equals its reported balance;
+- zero_sum: per asset, the balances of all accounts (world included) sum
+  to zero;
+- replay: the input/output of every (account, asset), replayed from the
+  postings, equals the volumes the server reports;
+- posting: every posting has valid addresses, a valid asset and a
+  non-negative integer amount.
+
+Transactions are split into time ranges streamed and aggregated by worker
+processes in parallel, while one more worker streams the accounts; the
+parent merges the partial volumes and compares them per (account, asset).
+A transaction committed during the run but back-dated to before its point in
+time is counted by the account read and not by the replay; the run is then
+started again, and flagged as a `concurrent` issue if it keeps happening.
+Runs from the Integrity view or from the command line:
+
+    python ledger_integrity.py --ledger main --workers 8 -o report.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode
+
+from ledger_bulk import ADDRESS_PATTERN, ASSET_PATTERN
+from ledger_client import MAX_PAGE_SIZE, LedgerClient, iter_newer
+
+# Worker processes, whatever the size of the machine
+MAX_WORKERS = 8
+DEFAULT_WORKERS = min(os.cpu_count() or 4, MAX_WORKERS)
+
+# Time ranges per worker, so a busy period does not leave the others idle
+SHARDS_PER_WORKER = 4
+
+# Issues kept per check; the counts are always complete
+MAX_ISSUES = 1000
+
+# Runs started again when back-dated transactions were committed meanwhile
+RETRIES = 2
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+Issue = namedtuple("Issue", ["check", "ledger", "target_type", "target", "asset", "expected", "actual"])
+
+IntegrityReport = namedtuple("IntegrityReport", [
+    "ledger", "pit", "last_id", "accounts", "transactions", "postings", "duration", "counts", "issues",
+])
+
+
+def _parse_time(value: str):
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def _format_time(value: datetime):
+    return value.astimezone(timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+
+def time_shards(start: datetime, end: datetime, count: int):
+    # `count` ranges covering everything up to `end` inclusive: the first is
+    # open below, in case the oldest transaction could not be read
+    count = max(1, count)
+    step = (end - start) / count
+    bounds = [start + step * i for i in range(1, count)]
+    clauses = []
+    lower = None
+    for upper in bounds:
+        clauses.append((lower, {"$lt": {"timestamp": _format_time(upper)}}))
+        lower = {"$gte": {"timestamp": _format_time(upper)}}
+    clauses.append((lower, {"$lte": {"timestamp": _format_time(end)}}))
+    return [{"$and": [c for c in pair if c]} for pair in clauses]
+
+
+def replay_shard(base_url: str, ledger: str, query: dict, last_id: int, page_size: int = MAX_PAGE_SIZE):
+    # Worker: {(account, asset): [input, output]} of the postings in one time
+    # range, skipping transactions committed after the run started
+    client = LedgerClient(base_url)
+    volumes = {}
+    issues = []
+    transactions = postings = 0
+    try:
+        for page in client.transaction_pages(ledger, page_size=page_size, query=query):
+            for tx in page:
+                if tx['id'] > last_id:
+                    continue
+                transactions += 1
+                for posting in tx.get('postings') or []:
+                    postings += 1
+                    source, destination, asset = posting.get('source'), posting.get('destination'), posting.get('asset')
+                    amount = posting.get('amount')
+                    problem = posting_problem(source, destination, asset, amount)
+                    if problem:
+                        issues.append(Issue("posting", ledger, "transaction", tx['id'], asset, problem, repr(posting)))
+                    # The server counted it in the volumes, so replay it too
+                    if not _is_amount(amount):
+                        continue
+                    volumes.setdefault((destination, asset), [0, 0])[0] += amount
+                    volumes.setdefault((source, asset), [0, 0])[1] += amount
+    finally:
+        client.close()
+    return volumes, issues, transactions, postings
+
+
+def posting_problem(source, destination, asset, amount):
+    for name, address in (("source", source), ("destination", destination)):
+        if not isinstance(address, str) or not ADDRESS_PATTERN.match(address):
+            return f"invalid {name} address"
+    if not isinstance(asset, str) or not ASSET_PATTERN.match(asset):
+        return "invalid asset"
+    if not _is_amount(amount) or amount < 0:
+        return "amount must be a non-negative integer"
+    return None
+
+
+def _is_amount(amount):
+    return isinstance(amount, int) and not isinstance(amount, bool)
+
+
+def account_volumes(base_url: str, ledger: str, pit: str, page_size: int = MAX_PAGE_SIZE):
+    # Worker: the reported volumes of every account as of `pit`, and the
+    # accounts whose input - output differs from their balance
+    client = LedgerClient(base_url)
+    volumes = {}
+    issues = []
+    accounts = 0
+    try:
+        for page in client.account_pages(ledger, {'expand': 'volumes', 'pit': pit}, page_size=page_size):
+            for account in page:
+                accounts += 1
+                for asset, volume in (account.get('volumes') or {}).items():
+                    incoming, outgoing = int(volume.get('input', 0)), int(volume.get('output', 0))
+                    volumes[(account['address'], asset)] = (incoming, outgoing)
+                    balance = volume.get('balance')
+                    if balance is not None and int(balance) != incoming - outgoing:
+                        issues.append(Issue("volumes", ledger, "account", account['address'], asset,
+                                            str(incoming - outgoing), str(balance)))
+    finally:
+        client.close()
+    return volumes, issues, accounts
+
+
+def backdated_since(client, ledger: str, last_id: int, end: datetime, page_size: int = MAX_PAGE_SIZE):
+    # Ids of the transactions committed after `last_id` with a timestamp up
+    # to `end`: the account read may count them while the replay skips them
+    return [
+        tx['id']
+        for fresh in iter_newer(client.transaction_pages(ledger, page_size=page_size), last_id)
+        for tx in fresh if _parse_time(tx['timestamp']) <= end
+    ]
+
+
+def check_ledger(base_url: str, ledger: str, workers: int = DEFAULT_WORKERS, shards: int = None,
+                 page_size: int = MAX_PAGE_SIZE, progress=None, retries: int = RETRIES):
+    """Run every check on `ledger`; returns an IntegrityReport."""
+    started = time.perf_counter()
+    for _ in range(retries + 1):
+        report = _check_once(base_url, ledger, workers, shards, page_size, progress)
+        if report.pit is None:
+            break
+        client = LedgerClient(base_url)
+        try:
+            backdated = backdated_since(client, ledger, report.last_id, _parse_time(report.pit), page_size)
+        finally:
+            client.close()
+        if not backdated:
+            break
+    else:
+        issues = [Issue("concurrent", ledger, "transaction", tx_id, None, f"committed after {report.pit}",
+                        "back-dated into the checked range") for tx_id in backdated[:MAX_ISSUES]]
+        report = report._replace(counts=dict(report.counts, concurrent=len(backdated)),
+                                 issues=report.issues + issues)
+    return report._replace(duration=time.perf_counter() - started)
+
+
+def _check_once(base_url: str, ledger: str, workers: int, shards: int, page_size: int, progress):
+    started = time.perf_counter()
+    client = LedgerClient(base_url)
+    try:
+        newest = client.fetch_page(f"/{ledger}/transactions", "transactions", page_size=page_size)['data']
+        oldest = client.fetch_page(f"/{ledger}/transactions", "transactions", {'reverse': 'true'},
+                                   page_size=1)['data']
+    finally:
+        client.close()
+    if not newest:
+        return IntegrityReport(ledger, None, None, 0, 0, 0, time.perf_counter() - started, {}, [])
+
+    last_id = newest[0]['id']
+    # The newest timestamp of the newest page, so one back-dated transaction
+    # committed last does not move the point in time back
+    end = max(_parse_time(tx['timestamp']) for tx in newest)
+    start = _parse_time(oldest[0]['timestamp']) if oldest else end - timedelta(days=1)
+    start = min(start, end)
+    pit = _format_time(end)
+    queries = time_shards(start, end, shards or workers * SHARDS_PER_WORKER)
+
+    replayed = {}
+    issues = []
+    transactions = postings = 0
+    # spawn: the dashboard process runs threads, which fork does not copy safely
+    with ProcessPoolExecutor(max(1, workers), mp_context=multiprocessing.get_context("spawn")) as pool:
+        reported_future = pool.submit(account_volumes, base_url, ledger, pit, page_size)
+        futures = [pool.submit(replay_shard, base_url, ledger, query, last_id, page_size) for query in queries]
+        for done, future in enumerate(futures, 1):
+            volumes, shard_issues, shard_transactions, shard_postings = future.result()
+            for key, (incoming, outgoing) in volumes.items():
+                total = replayed.setdefault(key, [0, 0])
+                total[0] += incoming
+                total[1] += outgoing
+            issues.extend(shard_issues)
+            transactions += shard_transactions
+            postings += shard_postings
+            if progress is not None:
+                progress(done, len(futures))
+        reported, account_issues, accounts = reported_future.result()
+    issues.extend(account_issues)
+
+    # Per-asset sum of the reported balances, world included
+    sums = {}
+    for (_, asset), (incoming, outgoing) in reported.items():
+        sums[asset] = sums.get(asset, 0) + incoming - outgoing
+    issues.extend(Issue("zero_sum", ledger, "asset", asset, asset, "0", str(total))
+                  for asset, total in sorted(sums.items()) if total != 0)
+
+    for key in sorted(set(replayed) | set(reported)):
+        expected = tuple(replayed.get(key, (0, 0)))
+        actual = tuple(reported.get(key, (0, 0)))
+        if expected != actual:
+            issues.append(Issue("replay", ledger, "account", key[0], key[1],
+                                f"in {expected[0]} / out {expected[1]}", f"in {actual[0]} / out {actual[1]}"))
+
+    counts = {}
+    for issue in issues:
+        counts[issue.check] = counts.get(issue.check, 0) + 1
+    kept = []
+    for check in counts:
+        kept.extend([issue for issue in issues if issue.check == check][:MAX_ISSUES])
+    return IntegrityReport(ledger, pit, last_id, accounts, transactions, postings,
+                           time.perf_counter() - started, counts, kept)
+
+
+def issue_link(app_url: str, issue: Issue):
+    # Dashboard deep link to the account or transaction behind an issue
+    if issue.target_type == "account":
+        query = {"ledger": issue.ledger, "account": issue.target}
+    elif issue.target_type == "transaction":
+        query = {"ledger": issue.ledger, "tx": issue.target}
+    else:
+        return None
+    return f"{app_url.rstrip('/')}/?{urlencode(query)}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the consistency of a ledger's balances, volumes and postings")
+    parser.add_argument("--ledger", required=True)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--shards", type=int, help="Time ranges to split the transactions into "
+                                                   "(default: 4 per worker)")
+    parser.add_argument("--page-size", type=int, default=MAX_PAGE_SIZE)
+    parser.add_argument("--app-url", default=os.environ.get('LEDGER_UI_URL', "http://localhost:8501"),
+                        help="Dashboard URL used in the issue links")
+    parser.add_argument("-o", "--output", help="Write the report as JSON to this file")
+    parser.add_argument("--api-url", default=os.environ.get('FORMANCE_API_URL', "http://ledger:3068"))
+    args = parser.parse_args(argv)
+
+    report = check_ledger(args.api_url, args.ledger, args.workers, args.shards, args.page_size,
+                          progress=lambda done, total: print(f"\r{done}/{total} shards", end="", file=sys.stderr))
+    print(file=sys.stderr)
+    print(f"{report.ledger}: {report.accounts} accounts, {report.transactions} transactions, "
+          f"{report.postings} postings as of {report.pit} in {report.duration:.1f}s")
+    for issue in report.issues:
+        print(f"[{issue.check}] {issue.target_type} {issue.target} {issue.asset or ''}: "
+              f"expected {issue.expected}, got {issue.actual}  {issue_link(args.app_url, issue) or ''}")
+    print("OK" if not report.counts else "Issues: " + ", ".join(f"{k} {v}" for k, v in sorted(report.counts.items())))
+
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(dict(report._asdict(), issues=[
+                dict(issue._asdict(), link=issue_link(args.app_url, issue)) for issue in report.issues
+            ]), out, indent=2, default=str)
+    return 1 if report.counts else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""Metadata filters on the account and transaction lists.
+
+Filters are written `key=value` (equality) or `key` (the key exists), comma
+separated. Servers that evaluate v2 query bodies get them pushed down as
+`$match` / `$exists` clauses. For the others, MetadataIndex keeps an
+inverted index of (key, value) -> ids per ledger, so a filtered list is an
+intersection of id sets rather than a scan. The index is filled by one walk
+of the accounts and transactions and then follows the logs.
+"""
+import threading
+from collections import namedtuple
+
+import requests
+
+from ledger_client import MAX_PAGE_SIZE, iter_newer
+
+# value None means "the key exists"
+MetadataFilter = namedtuple("MetadataFilter", ["key", "value"])
+
+# A key no real metadata uses: a server evaluating the query lists nothing
+PROBE_KEY = "__ledger_ui_probe__"
+
+TARGETS = {"accounts": "ACCOUNT", "transactions": "TRANSACTION"}
+
+
+def parse_filters(text: str):
+    filters = []
+    for part in (text or "").split(','):
+        key, eq, value = part.partition('=')
+        if key.strip():
+            filters.append(MetadataFilter(key.strip(), value.strip() if eq else None))
+    return tuple(filters)
+
+
+def metadata_query(filters):
+    # v2 query body for `filters`, None when there are none
+    clauses = [
+        {"$exists": {"metadata": f.key}} if f.value is None else {"$match": {f"metadata[{f.key}]": f.value}}
+        for f in filters
+    ]
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def supports_query(client, ledger: str, resource: str):
+    # Servers that ignore the body list their items; those that reject it
+    # fail. None while the ledger lists nothing at all, since the probe
+    # cannot tell then (None results are not cached)
+    if not client.fetch_page(f"/{ledger}/{resource}", resource, page_size=1)['data']:
+        return None
+    try:
+        page = client.fetch_page(f"/{ledger}/{resource}", resource, page_size=1,
+                                 query={"$exists": {"metadata": PROBE_KEY}})
+    except requests.HTTPError:
+        return False
+    return not page['data']
+
+
+class MetadataIndex:
+    """Inverted index of the account and transaction metadata of each ledger."""
+
+    def __init__(self):
+        # (ledger, target) -> id -> metadata
+        self._metadata = {}
+        # (ledger, target, key) -> value -> set of ids
+        self._postings = {}
+        # ledger -> id of the newest log applied
+        self.last_log_ids = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, ledger: str):
+        return ledger in self.last_log_ids
+
+    def set(self, ledger: str, target: str, target_id, metadata: dict):
+        # Merge like SET_METADATA: the given keys are replaced, others kept
+        if not metadata:
+            return
+        with self._lock:
+            current = self._metadata.setdefault((ledger, target), {}).setdefault(target_id, {})
+            for key, value in metadata.items():
+                self._unpost(ledger, target, target_id, key, current.get(key))
+                current[key] = str(value)
+                self._postings.setdefault((ledger, target, key), {}).setdefault(str(value), set()).add(target_id)
+
+    def delete(self, ledger: str, target: str, target_id, key: str):
+        with self._lock:
+            current = self._metadata.get((ledger, target), {}).get(target_id, {})
+            if key in current:
+                self._unpost(ledger, target, target_id, key, current.pop(key))
+
+    def _unpost(self, ledger: str, target: str, target_id, key: str, value):
+        if value is None:
+            return
+        values = self._postings.get((ledger, target, key), {})
+        ids = values.get(value)
+        if ids is not None:
+            ids.discard(target_id)
+            if not ids:
+                del values[value]
+
+    def metadata(self, ledger: str, target: str, target_id):
+        return dict(self._metadata.get((ledger, target), {}).get(target_id, {}))
+
+    def ids(self, ledger: str, target: str, filters):
+        # Ids matching every filter, smallest candidate set first
+        with self._lock:
+            sets = []
+            for f in filters:
+                values = self._postings.get((ledger, target, f.key), {})
+                if f.value is None:
+                    sets.append(set().union(*values.values()))
+                else:
+                    sets.append(values.get(f.value, set()))
+            if not sets:
+                return set()
+            sets.sort(key=len)
+            return sets[0].intersection(*sets[1:])
+
+    def apply(self, ledger: str, log: dict):
+        data = log.get('data') or {}
+        kind = log.get('type')
+        if kind in ('NEW_TRANSACTION', 'REVERTED_TRANSACTION'):
+            tx = data.get('transaction') or {}
+            if tx.get('metadata'):
+                self.set(ledger, "TRANSACTION", tx['id'], tx['metadata'])
+            for address, metadata in (data.get('accountMetadata') or {}).items():
+                self.set(ledger, "ACCOUNT", address, metadata)
+        elif kind == 'SET_METADATA':
+            self.set(ledger, data.get('targetType'), data.get('targetId'), data.get('metadata') or {})
+        elif kind == 'DELETE_METADATA':
+            self.delete(ledger, data.get('targetType'), data.get('targetId'), data.get('key'))
+
+    def refresh(self, client, ledger: str, page_size: int = MAX_PAGE_SIZE):
+        # A full walk of the accounts and transactions the first time, then
+        # the logs written since, applied oldest first. The newest log id is
+        # read before the walk so nothing written during it is missed
+        if ledger not in self:
+            newest = client.newest_log_id(ledger)
+            for page in client.account_pages(ledger, page_size=page_size):
+                for account in page:
+                    self.set(ledger, "ACCOUNT", account['address'], account.get('metadata') or {})
+            for page in client.transaction_pages(ledger, page_size=page_size):
+                for tx in page:
+                    self.set(ledger, "TRANSACTION", tx['id'], tx.get('metadata') or {})
+            self.last_log_ids[ledger] = newest
+            return self
+
+        pages = client.log_pages(ledger, page_size=page_size)
+        fresh = [log for page in iter_newer(pages, self.last_log_ids[ledger]) for log in page]
+        for log in sorted(fresh, key=lambda log: log['id']):
+            self.apply(ledger, log)
+            self.last_log_ids[ledger] = log['id']
+        return self
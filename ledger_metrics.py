@@ -0,0 +1,236 @@
+"""Latency histograms, call counts and payload sizes of the dashboard hot paths.
+
+Operations are named by kind: `http.<endpoint>` for API requests,
+`api.<helper>` for the read helpers and `render.<step>` for frame, graph
+and figure builds. Every observation lands in the process-wide Metrics and
+in the Rerun of the script run it happened in, so the sidebar can break a
+slow rerun down and Prometheus can alert on the totals.
+"""
+import contextvars
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds, Prometheus' default latency buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# The rerun of the current script run; worker threads see it when they are
+# started under contextvars.copy_context()
+_current_rerun = contextvars.ContextVar("ledger_rerun", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        # One counter per bucket plus the +Inf overflow
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.bytes = 0
+
+    def observe(self, seconds: float, size: int = 0):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+        self.bytes += size
+
+    def quantile(self, q: float):
+        # Upper bound of the bucket holding the q-quantile, as Prometheus'
+        # histogram_quantile would without interpolation
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+
+class Rerun:
+    """Operations observed during one script run."""
+
+    def __init__(self, label: str = None):
+        self.label = label
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self.elapsed = None
+        self.interrupted = False
+        # name -> [calls, seconds, bytes]
+        self.ops = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float, size: int = 0):
+        with self._lock:
+            op = self.ops.setdefault(name, [0, 0.0, 0])
+            op[0] += 1
+            op[1] += seconds
+            op[2] += size
+
+    def finish(self, interrupted: bool = False):
+        if self.elapsed is None:
+            self.elapsed = time.perf_counter() - self._start
+            self.interrupted = interrupted
+
+    def summary(self):
+        with self._lock:
+            ops = list(self.ops.items())
+        http = [op for name, op in ops if name.startswith("http.")]
+        return {
+            "Started": datetime.fromtimestamp(self.started).strftime("%H:%M:%S"),
+            "View": self.label,
+            "Total ms": None if self.elapsed is None else round(self.elapsed * 1000, 1),
+            "API ms": round(sum(op[1] for name, op in ops if name.startswith("api.")) * 1000, 1),
+            "Render ms": round(sum(op[1] for name, op in ops if name.startswith("render.")) * 1000, 1),
+            "HTTP requests": sum(op[0] for op in http),
+            "HTTP bytes": sum(op[2] for op in http),
+            "Status": "running" if self.elapsed is None else "interrupted" if self.interrupted else "done",
+        }
+
+    def rows(self):
+        with self._lock:
+            return [
+                {"Operation": name, "Calls": calls, "Total ms": round(seconds * 1000, 1), "Bytes": size}
+                for name, (calls, seconds, size) in sorted(self.ops.items(), key=lambda o: -o[1][1])
+            ]
+
+    def to_record(self):
+        # OpenTelemetry-style span record of the whole rerun with one event per operation
+        return {
+            "timestamp": datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+            "name": "streamlit.rerun",
+            "duration_ms": None if self.elapsed is None else round(self.elapsed * 1000, 3),
+            "attributes": {"view": self.label, "interrupted": self.interrupted},
+            "events": [
+                {"name": name, "attributes": {"calls": calls, "duration_ms": round(seconds * 1000, 3), "bytes": size}}
+                for name, (calls, seconds, size) in sorted(self.ops.items())
+            ],
+        }
+
+
+class Metrics:
+    """Process-wide histograms per operation, optionally logging every finished rerun."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, log_path: str = None):
+        self.buckets = buckets
+        self.log_path = log_path
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float, size: int = 0):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(self.buckets)
+            histogram.observe(seconds, size)
+        rerun = _current_rerun.get()
+        if rerun is not None:
+            rerun.add(name, seconds, size)
+
+    @contextmanager
+    def timer(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def timed(self, name: str):
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def start_rerun(self, history, label: str = None):
+        # A run cut short by st.rerun()/st.stop() never reaches finish_rerun;
+        # it is closed here, when the next run of the session starts
+        if history and history[-1].elapsed is None:
+            history[-1].finish(interrupted=True)
+            self._log(history[-1])
+        rerun = Rerun(label)
+        history.append(rerun)
+        _current_rerun.set(rerun)
+        return rerun
+
+    def finish_rerun(self, rerun: Rerun):
+        rerun.finish()
+        _current_rerun.set(None)
+        self._log(rerun)
+
+    def _log(self, rerun: Rerun):
+        if self.log_path:
+            with self._lock, open(self.log_path, "a") as out:
+                out.write(json.dumps(rerun.to_record()) + "\n")
+
+    def stats(self):
+        with self._lock:
+            return {
+                name: {
+                    "calls": h.count,
+                    "avg_ms": round(h.sum / h.count * 1000, 2),
+                    "p95_ms": round(h.quantile(0.95) * 1000, 2),
+                    "max_ms": round(h.max * 1000, 2),
+                    "bytes": h.bytes,
+                }
+                for name, h in sorted(self._histograms.items())
+            }
+
+    def prometheus(self, prefix: str = "ledger_ui"):
+        # Text exposition format
+        lines = [
+            f"# HELP {prefix}_operation_seconds Latency of API requests, read helpers and renders.",
+            f"# TYPE {prefix}_operation_seconds histogram",
+        ]
+        sizes = [
+            f"# HELP {prefix}_operation_bytes_total Response bytes received per operation.",
+            f"# TYPE {prefix}_operation_bytes_total counter",
+        ]
+        with self._lock:
+            for name, h in sorted(self._histograms.items()):
+                label = f'operation="{name}"'
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    lines.append(f'{prefix}_operation_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_operation_seconds_bucket{{{label},le="+Inf"}} {h.count}')
+                lines.append(f'{prefix}_operation_seconds_sum{{{label}}} {h.sum}')
+                lines.append(f'{prefix}_operation_seconds_count{{{label}}} {h.count}')
+                if name.startswith("http."):
+                    sizes.append(f'{prefix}_operation_bytes_total{{{label}}} {h.bytes}')
+        return "\n".join(lines + sizes) + "\n"
+
+
+def serve_metrics(metrics: Metrics, port: int, host: str = "0.0.0.0"):
+    # /metrics for Prometheus on a daemon thread next to the Streamlit server
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.rstrip('/') != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
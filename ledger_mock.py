@@ -0,0 +1,680 @@
+"""Offline stand-in for the Formance ledger v2 API.
+
+Serves synthetic ledgers from memory, with the cursor pagination, filters and
+write endpoints the back-office uses, so the UI, the export CLI and the
+benchmarks run without docker-compose and Postgres:
+
+    python ledger_mock.py --port 3068 --ledgers 2 --accounts 1000 --transactions 20000
+    FORMANCE_API_URL=http://127.0.0.1:3068 streamlit run ledger_ui.py
+
+--latency/--jitter delay every response and --error-rate answers a share of
+the requests with --error-status, both drawn from a seeded generator so runs
+are reproducible.
+"""
+import argparse
+import base64
+import copy
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+from ledger_bulk import ADDRESS_PATTERN, ASSET_PATTERN
+
+VERSION = "v2.2.0-mock"
+MAX_PAGE_SIZE = 1000
+DEFAULT_PAGE_SIZE = 15
+
+DEFAULT_ASSETS = ["USD/2", "EUR/2", "GBP/2", "JPY/0", "PHP/2", "BTC/8", "ETH/18"]
+TIERS = ["bronze", "silver", "gold"]
+REGIONS = ["eu", "us", "apac"]
+
+
+class MockError(Exception):
+    def __init__(self, status: int, code: str, message: str):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def address_matches(pattern: str, address: str):
+    # v2 address filters: empty segments are wildcards ("users::wallet"),
+    # otherwise the address must match exactly
+    parts = pattern.split(':')
+    if '' not in parts:
+        return pattern == address
+    segments = address.split(':')
+    return len(segments) == len(parts) and all(p == '' or p == s for p, s in zip(parts, segments))
+
+
+class MockLedger:
+    """One ledger: transactions, logs and per-account volumes kept in sync."""
+
+    def __init__(self, name: str, created_at: str = None):
+        self.name = name
+        self.created_at = created_at or _now()
+        self.metadata = {}
+        # address -> {'metadata', 'firstUsage'}
+        self.accounts = {"world": {"metadata": {}, "firstUsage": self.created_at}}
+        # address -> {asset: [input, output]}
+        self.volumes = {}
+        # ascending by id, ids equal to the index
+        self.transactions = []
+        self.logs = []
+        self.references = {}
+
+    # Writes
+
+    def _log(self, kind: str, data: dict, date: str):
+        self.logs.append({"id": len(self.logs), "type": kind, "data": data, "date": date})
+
+    def _touch(self, address: str, timestamp: str):
+        if address not in self.accounts:
+            self.accounts[address] = {"metadata": {}, "firstUsage": timestamp}
+
+    def balance(self, address: str, asset: str):
+        incoming, outgoing = self.volumes.get(address, {}).get(asset, (0, 0))
+        return incoming - outgoing
+
+    def _check_postings(self, postings):
+        if not postings:
+            raise MockError(400, "VALIDATION", "no postings")
+        needed = {}
+        for posting in postings:
+            amount = posting.get('amount')
+            if not isinstance(amount, int) or isinstance(amount, bool) or amount < 0:
+                raise MockError(400, "VALIDATION", f"invalid amount {amount!r}")
+            for key in ('source', 'destination'):
+                if not ADDRESS_PATTERN.match(str(posting.get(key, ''))):
+                    raise MockError(400, "VALIDATION", f"invalid {key} {posting.get(key)!r}")
+            if not ASSET_PATTERN.match(str(posting.get('asset', ''))):
+                raise MockError(400, "VALIDATION", f"invalid asset {posting.get('asset')!r}")
+            key = (posting['source'], posting['asset'])
+            needed[key] = needed.get(key, 0) + amount
+        # Only the world account may go negative
+        for (address, asset), amount in needed.items():
+            if address != "world" and self.balance(address, asset) < amount:
+                raise MockError(400, "INSUFFICIENT_FUND", f"account {address} has insufficient funds in {asset}")
+
+    def create_transaction(self, postings, metadata: dict = None, reference: str = None,
+                           timestamp: str = None, account_metadata: dict = None):
+        self._check_postings(postings)
+        if reference and reference in self.references:
+            raise MockError(400, "CONFLICT", f"reference {reference!r} already used")
+        timestamp = timestamp or _now()
+        tx = {
+            "id": len(self.transactions),
+            "timestamp": timestamp,
+            "insertedAt": timestamp,
+            "postings": [{k: p[k] for k in ('source', 'destination', 'amount', 'asset')} for p in postings],
+            "metadata": dict(metadata or {}),
+            "reverted": False,
+        }
+        if reference:
+            tx['reference'] = reference
+            self.references[reference] = tx['id']
+        for posting in tx['postings']:
+            self._touch(posting['source'], timestamp)
+            self._touch(posting['destination'], timestamp)
+            self.volumes.setdefault(posting['source'], {}).setdefault(posting['asset'], [0, 0])[1] += posting['amount']
+            self.volumes.setdefault(posting['destination'], {}).setdefault(posting['asset'], [0, 0])[0] += posting['amount']
+        for address, values in (account_metadata or {}).items():
+            self._touch(address, timestamp)
+            self.accounts[address]['metadata'].update(values)
+        self.transactions.append(tx)
+        self._log("NEW_TRANSACTION", {"transaction": tx, "accountMetadata": account_metadata or {}}, timestamp)
+        return tx
+
+    def revert_transaction(self, tx_id: int):
+        original = self.get_transaction(tx_id)
+        if original['reverted']:
+            raise MockError(400, "ALREADY_REVERT", f"transaction {tx_id} already reverted")
+        postings = [dict(p, source=p['destination'], destination=p['source']) for p in reversed(original['postings'])]
+        # Reverts bypass the funds check, like the real ledger with force=true
+        timestamp = _now()
+        tx = {"id": len(self.transactions), "timestamp": timestamp, "insertedAt": timestamp,
+              "postings": postings, "metadata": {}, "reverted": False}
+        for posting in postings:
+            self.volumes.setdefault(posting['source'], {}).setdefault(posting['asset'], [0, 0])[1] += posting['amount']
+            self.volumes.setdefault(posting['destination'], {}).setdefault(posting['asset'], [0, 0])[0] += posting['amount']
+        original['reverted'] = True
+        self.transactions.append(tx)
+        self._log("REVERTED_TRANSACTION", {"revertedTransactionID": tx_id, "transaction": tx}, timestamp)
+        return tx
+
+    def set_metadata(self, target_type: str, target_id, metadata: dict, date: str = None):
+        date = date or _now()
+        if target_type == "ACCOUNT":
+            self._touch(target_id, date)
+            self.accounts[target_id]['metadata'].update(metadata)
+        else:
+            self.get_transaction(target_id)['metadata'].update(metadata)
+        self._log("SET_METADATA", {"targetType": target_type, "targetId": target_id, "metadata": metadata}, date)
+
+    def delete_metadata(self, target_type: str, target_id, key: str):
+        if target_type == "ACCOUNT":
+            self.get_account(target_id)['metadata'].pop(key, None)
+        else:
+            self.get_transaction(target_id)['metadata'].pop(key, None)
+        self._log("DELETE_METADATA", {"targetType": target_type, "targetId": target_id, "key": key}, _now())
+
+    # Reads
+
+    def get_transaction(self, tx_id):
+        try:
+            return self.transactions[int(tx_id)]
+        except (ValueError, IndexError):
+            raise MockError(404, "NOT_FOUND", f"transaction {tx_id} not found")
+
+    def get_account(self, address: str):
+        account = self.accounts.get(address)
+        if account is None:
+            raise MockError(404, "NOT_FOUND", f"account {address} not found")
+        return account
+
+    def volumes_at(self, pit: str = None):
+        # Current volumes, or replayed up to the point in time `pit`
+        if pit is None:
+            return self.volumes
+        volumes = {}
+        for tx in self.transactions:
+            if tx['timestamp'] > pit:
+                continue
+            for posting in tx['postings']:
+                volumes.setdefault(posting['source'], {}).setdefault(posting['asset'], [0, 0])[1] += posting['amount']
+                volumes.setdefault(posting['destination'], {}).setdefault(posting['asset'], [0, 0])[0] += posting['amount']
+        return volumes
+
+    def account_view(self, address: str, expand=(), volumes: dict = None):
+        account = self.accounts[address]
+        view = {"address": address, "metadata": dict(account['metadata']), "firstUsage": account['firstUsage']}
+        if 'volumes' in expand or 'effectiveVolumes' in expand:
+            rows = (volumes if volumes is not None else self.volumes).get(address, {})
+            expanded = {asset: {"input": i, "output": o, "balance": i - o} for asset, (i, o) in rows.items()}
+            for key in ('volumes', 'effectiveVolumes'):
+                if key in expand:
+                    view[key] = expanded
+        return view
+
+
+# Query filters: the v2 list endpoints take a JSON body such as
+# {"$and": [{"$match": {"source": "users:"}}, {"$exists": {"metadata": "tier"}}]}
+
+def _field(field: str):
+    # "metadata[tier]" -> ("metadata", "tier")
+    match = re.match(r'^(\w+)\[(.+)\]$', field)
+    return (match.group(1), match.group(2)) if match else (field, None)
+
+
+def _values(item: dict, kind: str, field: str, ledger: MockLedger):
+    name, key = _field(field)
+    if name == "metadata":
+        return [item['metadata'].get(key)] if key in item['metadata'] else []
+    if kind == "transactions":
+        if name in ("source", "destination"):
+            return [p[name] for p in item['postings']]
+        if name == "account":
+            return [p[side] for p in item['postings'] for side in ('source', 'destination')]
+    elif kind == "accounts":
+        if name == "balance":
+            return [ledger.balance(item['address'], key)] if key else []
+        if name == "first_usage":
+            return [item['firstUsage']]
+    elif kind == "logs" and name == "date":
+        return [item['date']]
+    return [item[name]] if name in item else []
+
+
+def _compare(op: str, left, right):
+    try:
+        if op == "$lt":
+            return left < right
+        if op == "$lte":
+            return left <= right
+        if op == "$gt":
+            return left > right
+        return left >= right
+    except TypeError:
+        return False
+
+
+def matches(query: dict, item: dict, kind: str, ledger: MockLedger):
+    if not query:
+        return True
+    for op, arg in query.items():
+        if op == "$and":
+            ok = all(matches(q, item, kind, ledger) for q in arg)
+        elif op == "$or":
+            ok = any(matches(q, item, kind, ledger) for q in arg)
+        elif op == "$not":
+            ok = not matches(arg, item, kind, ledger)
+        elif op == "$exists":
+            ok = all(key in item.get('metadata', {}) for key in arg.values())
+        elif op == "$match":
+            ok = True
+            for field, expected in arg.items():
+                values = _values(item, kind, field, ledger)
+                if field in ("address", "source", "destination", "account"):
+                    ok = ok and any(address_matches(str(expected), v) for v in values)
+                else:
+                    ok = ok and any(v == expected or str(v) == str(expected) for v in values)
+        elif op in ("$lt", "$lte", "$gt", "$gte"):
+            ok = all(any(_compare(op, v, expected) for v in _values(item, kind, field, ledger))
+                     for field, expected in arg.items())
+        else:
+            raise MockError(400, "VALIDATION", f"unknown operator {op}")
+        if not ok:
+            return False
+    return True
+
+
+def params_query(params: dict):
+    # v1-style query string filters, folded into a v2 query body
+    clauses = [{"$match": {key: params[key]}} for key in ("address", "source", "destination", "account", "reference")
+               if params.get(key)]
+    if params.get('startTime'):
+        clauses.append({"$gte": {"timestamp": params['startTime']}})
+    if params.get('endTime'):
+        clauses.append({"$lt": {"timestamp": params['endTime']}})
+    return clauses
+
+
+def encode_cursor(state: dict):
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode()
+
+
+def decode_cursor(token: str):
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode()))
+    except ValueError:
+        raise MockError(400, "VALIDATION", "invalid cursor")
+
+
+def paginate(items, state: dict):
+    size, offset = state['pageSize'], state['offset']
+    chunk = items[offset:offset + size]
+    has_more = offset + size < len(items)
+    cursor = {"pageSize": size, "hasMore": has_more, "data": chunk}
+    if has_more:
+        cursor['next'] = encode_cursor(dict(state, offset=offset + size))
+    if offset > 0:
+        cursor['previous'] = encode_cursor(dict(state, offset=max(0, offset - size)))
+    return cursor
+
+
+class MockConfig:
+    """Latency and error injection; `error_paths` restricts errors to matching paths."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 503, error_paths: str = None, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.error_paths = re.compile(error_paths) if error_paths else None
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def delay(self):
+        with self.lock:
+            jitter = self.random.uniform(0, self.jitter) if self.jitter else 0.0
+        return self.latency + jitter
+
+    def should_fail(self, path: str):
+        if self.error_rate <= 0 or (self.error_paths and not self.error_paths.search(path)):
+            return False
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+
+class MockLedgerServer(ThreadingHTTPServer):
+    """HTTP front of a set of MockLedgers, counting requests and bytes sent."""
+
+    daemon_threads = True
+
+    def __init__(self, address, ledgers: dict, config: MockConfig = None):
+        super().__init__(address, MockHandler)
+        self.ledgers = ledgers
+        self.config = config or MockConfig()
+        self.lock = threading.RLock()
+        self.idempotency = {}
+        self.reset_stats()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, route: str, sent: int):
+        with self.lock:
+            self.requests += 1
+            self.bytes_sent += sent
+            self.routes[route] = self.routes.get(route, 0) + 1
+
+    def stats(self):
+        with self.lock:
+            return {"requests": self.requests, "bytes_sent": self.bytes_sent, "routes": dict(self.routes)}
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests = 0
+            self.bytes_sent = 0
+            self.routes = {}
+
+    def ledger(self, name: str):
+        ledger = self.ledgers.get(name)
+        if ledger is None:
+            raise MockError(404, "LEDGER_NOT_FOUND", f"ledger {name} not found")
+        return ledger
+
+
+def start_server(ledgers: dict, config: MockConfig = None, host: str = "127.0.0.1", port: int = 0):
+    # Serve on a background thread; port 0 picks a free port (see server.url)
+    server = MockLedgerServer((host, port), ledgers, config)
+    threading.Thread(target=server.serve_forever, name="ledger-mock", daemon=True).start()
+    return server
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body, route: str, headers: dict = None):
+        payload = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(payload)
+        self.server.record(route, len(payload) if self.command != "HEAD" else 0)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return None
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            raise MockError(400, "VALIDATION", "invalid JSON body")
+
+    def _dispatch(self):
+        url = urlparse(self.path)
+        parts = [unquote(p) for p in url.path.split('/') if p]
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        params['expand'] = [e for v in parse_qs(url.query).get('expand', []) for e in v.split(',')]
+        route = "other"
+        try:
+            # Read the body first so keep-alive connections stay in sync
+            body = self._body()
+            if parts[:1] == ["_mock"]:
+                return self._control(parts[1:])
+            config = self.server.config
+            delay = config.delay()
+            if delay:
+                time.sleep(delay)
+            if config.should_fail(url.path):
+                route = "injected_error"
+                raise MockError(config.error_status, "INTERNAL", "injected error")
+            route, status, payload, headers = self._route(parts, params, body)
+            self._send(status, payload, route, headers)
+        except MockError as e:
+            self._send(e.status, {"errorCode": e.code, "errorMessage": str(e)}, route)
+
+    do_GET = do_HEAD = do_POST = do_DELETE = _dispatch
+
+    def _control(self, parts):
+        # Out-of-band stats for benchmarks run against a mock in another
+        # process; neither delayed nor counted
+        if parts == ["stats"] and self.command == "GET":
+            payload = json.dumps(self.server.stats()).encode()
+        elif parts == ["stats", "reset"] and self.command == "POST":
+            self.server.reset_stats()
+            payload = b"{}"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _route(self, parts, params, body):
+        method = self.command
+        if parts == ["_", "info"]:
+            return "server_info", 200, {"server": "ledger", "version": VERSION}, None
+        if parts == ["_info"]:
+            return "server_info", 200, {"data": {"server": "ledger", "version": VERSION,
+                                                 "config": {"storage": {"driver": "postgres"}}}}, None
+        if parts == ["_healthcheck"]:
+            return "server_info", 200, {"storage-driver-up-to-date": "true"}, None
+        if parts[:1] == ["v2"]:
+            if len(parts) == 1:
+                return "list_ledgers", 200, {"cursor": self._list_ledgers(params)}, None
+            parts = parts[1:]
+        if not parts:
+            raise MockError(404, "NOT_FOUND", f"no route for {method} {self.path}")
+
+        with self.server.lock:
+            ledger = self.server.ledger(parts[0])
+            rest = parts[1:]
+            if rest == ["_info"]:
+                return "ledger_info", 200, {"data": self._ledger_info(ledger)}, None
+            if rest in (["accounts"], ["transactions"], ["logs"]) and method in ("GET", "HEAD"):
+                return self._list(ledger, rest[0], params, body)
+            if rest == ["transactions"] and method == "POST":
+                tx = self._create(ledger, body or {}, self.headers.get('Idempotency-Key'))
+                return "create_transaction", 200, {"data": tx}, None
+            if len(rest) == 2 and rest[0] == "accounts" and method == "GET":
+                ledger.get_account(rest[1])
+                view = ledger.account_view(rest[1], params['expand'], ledger.volumes_at(params.get('pit')))
+                return "account", 200, {"data": view}, None
+            if len(rest) == 2 and rest[0] == "transactions" and method == "GET":
+                return "transaction", 200, {"data": ledger.get_transaction(rest[1])}, None
+            if len(rest) == 3 and rest[0] == "transactions" and rest[2] == "revert" and method == "POST":
+                return "revert", 201, {"data": ledger.revert_transaction(rest[1])}, None
+            if len(rest) >= 3 and rest[2] == "metadata" and rest[0] in ("accounts", "transactions"):
+                target = ("ACCOUNT", rest[1]) if rest[0] == "accounts" else ("TRANSACTION", int(rest[1]))
+                if method == "POST":
+                    ledger.set_metadata(*target, body or {})
+                    return "metadata", 204, None, None
+                if method == "DELETE" and len(rest) == 4:
+                    ledger.delete_metadata(*target, rest[3])
+                    return "metadata", 204, None, None
+            if rest == ["aggregate", "balances"]:
+                return "aggregate", 200, {"data": self._aggregate(ledger, params, body)}, None
+            if rest == ["_bulk"] and method == "POST":
+                return self._bulk(ledger, params, body or [])
+        raise MockError(404, "NOT_FOUND", f"no route for {method} {self.path}")
+
+    def _list_ledgers(self, params):
+        state = self._cursor_state(params, None)
+        items = [{"name": l.name, "addedAt": l.created_at, "bucket": "_default", "metadata": l.metadata}
+                 for l in self.server.ledgers.values()]
+        return paginate(items, state)
+
+    def _ledger_info(self, ledger: MockLedger):
+        return {"name": ledger.name, "storage": {"migrations": [
+            {"version": 1, "name": "Init schema", "state": "DONE",
+             "date": ledger.created_at, "terminatedAt": ledger.created_at},
+        ]}}
+
+    def _cursor_state(self, params, body):
+        if params.get('cursor'):
+            return decode_cursor(params['cursor'])
+        size = int(params.get('pageSize') or DEFAULT_PAGE_SIZE)
+        return {"offset": 0, "pageSize": max(1, min(size, MAX_PAGE_SIZE)),
+                "params": {k: v for k, v in params.items() if k not in ('cursor', 'pageSize')},
+                "query": body or {}}
+
+    def _list(self, ledger: MockLedger, kind: str, params, body):
+        # The cursor carries the filters of the first page
+        state = self._cursor_state(params, body)
+        params, query = state['params'], state['query']
+        clauses = params_query(params) + ([query] if query else [])
+        query = {"$and": clauses} if clauses else {}
+        pit = params.get('pit')
+
+        if kind == "accounts":
+            volumes = ledger.volumes_at(pit)
+            items = (ledger.account_view(a, params.get('expand', []), volumes) for a in sorted(ledger.accounts)
+                     if pit is None or ledger.accounts[a]['firstUsage'] <= pit)
+        elif kind == "transactions":
+            items = (tx for tx in reversed(ledger.transactions) if pit is None or tx['timestamp'] <= pit)
+        else:
+            items = reversed(ledger.logs)
+        items = [item for item in items if matches(query, item, kind, ledger)]
+        if params.get('reverse') == "true":
+            items.reverse()
+
+        if self.command == "HEAD":
+            return "counts", 204, None, {"Count": str(len(items))}
+        return kind, 200, {"cursor": paginate(items, state)}, None
+
+    def _aggregate(self, ledger: MockLedger, params, body):
+        volumes = ledger.volumes_at(params.get('pit'))
+        totals = {}
+        for address, assets in volumes.items():
+            if body and not matches(body, ledger.account_view(address), "accounts", ledger):
+                continue
+            for asset, (incoming, outgoing) in assets.items():
+                totals[asset] = totals.get(asset, 0) + incoming - outgoing
+        return totals
+
+    def _create(self, ledger: MockLedger, data: dict, key: str = None):
+        if key is not None:
+            cached = self.server.idempotency.get((ledger.name, key))
+            if cached is not None:
+                return cached
+        tx = ledger.create_transaction(data.get('postings'), data.get('metadata'), data.get('reference'),
+                                       data.get('timestamp'), data.get('accountMetadata'))
+        if key is not None:
+            self.server.idempotency[(ledger.name, key)] = tx
+        return tx
+
+    def _bulk_element(self, ledger: MockLedger, element: dict):
+        action = element.get('action')
+        data = element.get('data') or {}
+        if action == "CREATE_TRANSACTION":
+            return self._create(ledger, data, element.get('ik'))
+        if action == "ADD_METADATA":
+            ledger.set_metadata(data.get('targetType'), data.get('targetId'), data.get('metadata') or {})
+            return None
+        if action == "DELETE_METADATA":
+            ledger.delete_metadata(data.get('targetType'), data.get('targetId'), data.get('key'))
+            return None
+        if action == "REVERT_TRANSACTION":
+            return ledger.revert_transaction(data.get('id'))
+        raise MockError(400, "VALIDATION", f"unknown action {action!r}")
+
+    def _bulk(self, ledger: MockLedger, params, elements):
+        continue_on_failure = params.get('continueOnFailure') == "true"
+        atomic = params.get('atomic') == "true"
+        # Atomic batches run against a copy that replaces the ledger on success
+        target = copy.deepcopy(ledger) if atomic else ledger
+        responses = []
+        failed = False
+        for element in elements:
+            try:
+                responses.append({"responseType": element.get('action'), "data": self._bulk_element(target, element)})
+            except MockError as e:
+                failed = True
+                responses.append({"responseType": "ERROR", "errorCode": e.code, "errorDescription": str(e)})
+                if not continue_on_failure:
+                    break
+        if atomic and not failed:
+            self.server.ledgers[ledger.name] = target
+        status = 400 if failed else 200
+        body = {"data": responses}
+        if failed:
+            body.update(errorCode="VALIDATION", errorMessage="some elements failed")
+        return "bulk", status, body, None
+
+
+def generate(ledgers: int = 2, accounts: int = 1000, transactions: int = 10000,
+             assets=DEFAULT_ASSETS, skew: float = 1.2, seed: int = 0, days: int = 90):
+    """Synthetic ledgers named main, ledger-1, ...
+
+    Asset and account activity follow a Zipf-like distribution with exponent
+    `skew`, so a few assets and accounts dominate as in production data.
+    Transactions mint from world or move existing funds between accounts,
+    some with a fee posting, and are spread evenly over the last `days`.
+    """
+    rng = random.Random(seed)
+    asset_weights = [1 / (rank + 1) ** skew for rank in range(len(assets))]
+    addresses = [f"users:{i:06d}:wallet" if i % 10 else f"merchants:{i:06d}" for i in range(accounts)]
+    account_weights = [1 / (rank + 1) ** skew for rank in range(accounts)]
+    start = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(days=days)
+    step = timedelta(days=days) / max(transactions, 1)
+
+    result = {}
+    for n in range(ledgers):
+        name = "main" if n == 0 else f"ledger-{n}"
+        ledger = MockLedger(name, start.strftime("%Y-%m-%dT%H:%M:%SZ"))
+        for i, address in enumerate(addresses):
+            metadata = {"tier": TIERS[i % len(TIERS)], "region": rng.choice(REGIONS)}
+            ledger.set_metadata("ACCOUNT", address, metadata, ledger.created_at)
+        asset_picks = rng.choices(assets, asset_weights, k=transactions)
+        account_picks = rng.choices(addresses, account_weights, k=2 * transactions)
+        for i in range(transactions):
+            asset = asset_picks[i]
+            precision = int(asset.partition('/')[2] or 0)
+            amount = rng.randint(1, 10 ** min(precision + 3, 12))
+            source, destination = account_picks[2 * i], account_picks[2 * i + 1]
+            if source == destination or ledger.balance(source, asset) < amount or rng.random() < 0.3:
+                source = "world"
+            postings = [{"source": source, "destination": destination, "amount": amount, "asset": asset}]
+            if source != "world" and rng.random() < 0.1:
+                fee = max(1, amount // 100)
+                postings[0]['amount'] -= fee
+                postings.append({"source": source, "destination": "platform:fees", "amount": fee, "asset": asset})
+            timestamp = (start + step * i).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+            ledger.create_transaction(postings, {"batch": str(i // 1000)}, timestamp=timestamp)
+        result[name] = ledger
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve synthetic ledgers over the Formance v2 API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3068)
+    parser.add_argument("--ledgers", type=int, default=2)
+    parser.add_argument("--accounts", type=int, default=1000)
+    parser.add_argument("--transactions", type=int, default=10000)
+    parser.add_argument("--skew", type=float, default=1.2, help="Zipf exponent of asset/account activity")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random delay, up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with an error")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--error-paths", help="Only inject errors on paths matching this regex")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    ledgers = generate(args.ledgers, args.accounts, args.transactions, skew=args.skew, seed=args.seed)
+    config = MockConfig(args.latency, args.jitter, args.error_rate, args.error_status, args.error_paths, args.seed)
+    server = MockLedgerServer((args.host, args.port), ledgers, config)
+    print(f"Generated {args.ledgers} ledgers in {time.perf_counter() - started:.1f}s, serving on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
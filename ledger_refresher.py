@@ -0,0 +1,217 @@
+"""Background refresh of the data every session shows.
+
+One thread per server process refreshes the server info, the ledger list
+and the per-ledger counts and asset totals on a schedule, and publishes the
+result as an immutable RefreshSnapshot. Reruns read the latest snapshot
+without waiting on the network, so N sessions share one refresh loop
+instead of each calling the API.
+
+The balance index walks every account of every ledger, so it has its own,
+longer interval and is only rebuilt once a view has asked for it since the
+last walk (want_balances()): an idle server does not page the ledgers.
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from ledger_client import DEFAULT_WORKERS, MAX_PAGE_SIZE, take
+from ledger_index import build_balance_index
+
+REFRESH_INTERVAL = 30
+BALANCE_REFRESH_INTERVAL = 300
+
+logger = logging.getLogger(__name__)
+
+# Published snapshots are never mutated; the mappings are read-only views.
+# `counts` maps ledger -> {"accounts": n, "transactions": n} and `errors`
+# maps a part ("ledgers", "counts:main", ...) to the last failure message;
+# `refreshed_at` maps the same parts to the time their value was fetched,
+# which stays old for a part that keeps failing. `balance_index` is None
+# until a view asks for balances.
+RefreshSnapshot = namedtuple("RefreshSnapshot", [
+    "published_at", "duration", "server_info", "ledgers", "counts", "asset_totals", "balance_index", "errors",
+    "refreshed_at",
+])
+
+
+def fetch_server_info(client):
+    # Version, storage config and health; returns (info or None, {path: error})
+    info = {}
+    errors = {}
+    bodies = {}
+    for path in ("/_/info", "/_info", "/_healthcheck"):
+        try:
+            response = client.get(path, endpoint="server_info")
+            if response.status_code == 200:
+                bodies[path] = response.json()
+        except Exception as e:
+            errors[path] = str(e)
+    info.update(bodies.get("/_info", {}).get('data', {}))
+    # /_/info wins over the version reported by /_info
+    for path, key in (("/_/info", "version"), ("/_healthcheck", "storage-driver-up-to-date")):
+        if bodies.get(path, {}).get(key):
+            info[key] = bodies[path][key]
+    return info or None, errors
+
+
+def count_resource(client, ledger: str, resource: str):
+    # HEAD Count, falling back to walking the pages
+    count = client.count(ledger, resource)
+    if count is not None:
+        return count
+    pages = client.account_pages if resource == "accounts" else client.transaction_pages
+    return sum(len(page) for page in pages(ledger, page_size=MAX_PAGE_SIZE))
+
+
+class BackgroundRefresher:
+    def __init__(self, client, interval: float = REFRESH_INTERVAL, max_workers: int = DEFAULT_WORKERS,
+                 page_size: int = MAX_PAGE_SIZE, balance_interval: float = BALANCE_REFRESH_INTERVAL):
+        self.client = client
+        self.interval = interval
+        self.balance_interval = balance_interval
+        # Set by want_balances(), cleared by each walk of the balances
+        self._balances_wanted = False
+        self._balances_at = None
+        self.max_workers = max_workers
+        self.page_size = page_size
+        self._snapshot = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ledger-refresher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def snapshot(self):
+        # Latest published snapshot, None until the first refresh completes
+        return self._snapshot
+
+    def want_balances(self):
+        # A view reads the balance index: rebuild it on the next refresh once
+        # it is older than balance_interval, right away if there is none yet
+        self._balances_wanted = True
+        if self._balances_at is None:
+            self._wake.set()
+
+    def refresh_now(self):
+        # Wake the loop early, e.g. after a write or a manual refresh; the
+        # balances are walked again if a view asks for them
+        self._balances_at = None
+        self._wake.set()
+
+    def _balances_due(self):
+        if not self._balances_wanted:
+            return False
+        return self._balances_at is None or time.monotonic() - self._balances_at >= self.balance_interval
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Background refresh failed")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def refresh(self):
+        start = time.perf_counter()
+        previous = self._snapshot
+        errors = {}
+        now = time.time()
+        refreshed_at = {}
+
+        def keep(part):
+            # Age of a part that failed: when its kept value was fetched
+            if previous is not None and part in previous.refreshed_at:
+                refreshed_at[part] = previous.refreshed_at[part]
+
+        server_info, info_errors = fetch_server_info(self.client)
+        errors.update({f"server_info:{path}": error for path, error in info_errors.items()})
+        if server_info is None and previous is not None:
+            server_info = previous.server_info
+            keep("server_info")
+        else:
+            refreshed_at["server_info"] = now
+
+        try:
+            ledgers = tuple(MappingProxyType(l) for l in take(self.client.iter_pages(
+                "/v2", endpoint="list_ledgers", page_size=self.page_size
+            )))
+            refreshed_at["ledgers"] = now
+        except Exception as e:
+            errors["ledgers"] = str(e)
+            ledgers = previous.ledgers if previous is not None else ()
+            keep("ledgers")
+        names = [l['name'] for l in ledgers]
+
+        # A part that fails keeps its previous value rather than disappearing
+        counts = {}
+        asset_totals = {}
+        for name in names:
+            try:
+                counts[name] = MappingProxyType({
+                    resource: count_resource(self.client, name, resource)
+                    for resource in ("accounts", "transactions")
+                })
+                refreshed_at[f"counts:{name}"] = now
+            except Exception as e:
+                errors[f"counts:{name}"] = str(e)
+                if previous is not None and name in previous.counts:
+                    counts[name] = previous.counts[name]
+                    keep(f"counts:{name}")
+            try:
+                asset_totals[name] = MappingProxyType(self.client.aggregate_balances(
+                    name, query={"$not": {"$match": {"address": "world"}}}
+                ) or {})
+                refreshed_at[f"asset_totals:{name}"] = now
+            except Exception as e:
+                errors[f"asset_totals:{name}"] = str(e)
+                if previous is not None and name in previous.asset_totals:
+                    asset_totals[name] = previous.asset_totals[name]
+                    keep(f"asset_totals:{name}")
+
+        balance_index = previous.balance_index if previous is not None else None
+        if self._balances_due():
+            self._balances_wanted = False
+            self._balances_at = time.monotonic()
+            balance_index = self._refresh_balances(names, balance_index, refreshed_at, keep, now)
+        elif balance_index is not None:
+            for name in names:
+                keep(f"balances:{name}")
+        if balance_index is not None:
+            errors.update({f"balances:{name}": error for name, error in balance_index.errors.items()})
+
+        snapshot = RefreshSnapshot(
+            published_at=time.time(),
+            duration=time.perf_counter() - start,
+            server_info=MappingProxyType(server_info) if server_info else None,
+            ledgers=ledgers,
+            counts=MappingProxyType(counts),
+            asset_totals=MappingProxyType(asset_totals),
+            balance_index=balance_index,
+            errors=MappingProxyType(errors),
+            refreshed_at=MappingProxyType(refreshed_at),
+        )
+        self._snapshot = snapshot
+        return snapshot
+
+    def _refresh_balances(self, names, previous, refreshed_at, keep, now):
+        # A ledger whose walk fails keeps its entries from the previous index
+        # and its error; the others are replaced by the fresh walk
+        index = build_balance_index(self.client, names, self.max_workers, self.page_size)
+        for name in names:
+            if name in index.errors:
+                index.replace_ledger(name, previous)
+                keep(f"balances:{name}")
+            else:
+                refreshed_at[f"balances:{name}"] = now
+        return index
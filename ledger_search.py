@@ -0,0 +1,241 @@
+"""Account address search over an in-memory index.
+
+The addresses of a ledger are kept sorted, so a prefix query is a bisect
+plus a slice; `users:` is a prefix too. For segment patterns such as
+`users::wallet`, where an empty segment before the last matches any one
+segment, every `:`-separated position also has its
+distinct segment values (sorted) and, per address, the code of its segment
+there. A stable argsort of (code, segment count) gives each segment value
+the sorted list of same-length addresses holding it, so a pattern only
+checks the addresses of its rarest literal segment, a chunk at a time, until
+the result limit is reached.
+
+Addresses found by a refresh go to a small sorted delta that is searched
+linearly and folded into the main arrays once it grows past DELTA_LIMIT.
+Both are replaced, never mutated, so searches run without a lock.
+"""
+import threading
+from bisect import bisect_left
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from ledger_client import MAX_PAGE_SIZE, iter_newer
+
+SEARCH_LIMIT = 100
+
+# Addresses added since the last rebuild of the main arrays
+DELTA_LIMIT = 1000
+
+# Candidates checked per vectorized step of a pattern search
+CHUNK = 4096
+
+
+def _prefix_range(array, prefix: str):
+    if not prefix:
+        return 0, len(array)
+    # Smallest string greater than every string starting with `prefix`
+    end = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return bisect_left(array, prefix), bisect_left(array, end)
+
+
+def segments_match(parts, address: str):
+    segments = address.split(':')
+    return len(segments) == len(parts) and all(p == '' or p == s for p, s in zip(parts, segments))
+
+
+def log_addresses(log: dict):
+    # Addresses a log entry creates or touches
+    data = log.get('data') or {}
+    kind = log.get('type')
+    if kind in ('NEW_TRANSACTION', 'REVERTED_TRANSACTION'):
+        for posting in (data.get('transaction') or {}).get('postings') or []:
+            yield posting['source']
+            yield posting['destination']
+        yield from (data.get('accountMetadata') or {})
+    elif kind == 'SET_METADATA' and data.get('targetType') == 'ACCOUNT':
+        yield data['targetId']
+
+
+class SegmentArrays:
+    """Immutable search arrays over a sorted list of addresses."""
+
+    def __init__(self, addresses: list):
+        self.addresses = addresses
+        width = max((a.count(':') + 1 for a in addresses), default=0)
+        lengths = []
+        columns = [[] for _ in range(width)]
+        for address in addresses:
+            segments = address.split(':')
+            lengths.append(len(segments))
+            for position, column in enumerate(columns):
+                column.append(segments[position] if position < len(segments) else '')
+        self.width = width
+        self.lengths = np.array(lengths, dtype=np.int64)
+        self.by_length = self._postings(self.lengths)
+        # Per position: the sorted distinct segments, each address' segment
+        # code, and the postings of each (code, segment count) pair
+        self.values, self.codes, self.postings = [], [], []
+        for column in columns:
+            codes, uniques = pd.factorize(np.array(column, dtype=object), sort=True)
+            self.values.append(uniques)
+            self.codes.append(codes.astype(np.int32))
+            self.postings.append(self._postings(codes.astype(np.int64) * (width + 1) + self.lengths))
+
+    @staticmethod
+    def _postings(keys):
+        # (sorted keys, address positions in key order, ascending within a key)
+        order = np.argsort(keys, kind='stable').astype(np.int32)
+        return keys[order], order
+
+    @staticmethod
+    def _lookup(postings, key: int):
+        keys, order = postings
+        start, end = np.searchsorted(keys, np.array([key, key + 1], dtype=keys.dtype))
+        return order[start:end]
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def prefix(self, prefix: str, limit: int):
+        lo, hi = _prefix_range(self.addresses, prefix)
+        return self.addresses[lo:min(hi, lo + limit)]
+
+    def pattern(self, parts, limit: int):
+        if len(parts) > self.width:
+            return []
+        # Candidates: the addresses with as many segments, narrowed to those
+        # of the rarest literal segment
+        posting = self._lookup(self.by_length, len(parts))
+        conditions = []
+        for position, part in enumerate(parts):
+            if not part:
+                continue
+            values = self.values[position]
+            code = int(values.searchsorted(part))
+            if code == len(values) or values[code] != part:
+                return []
+            conditions.append((position, code))
+            candidates = self._lookup(self.postings[position], code * (self.width + 1) + len(parts))
+            if len(candidates) < len(posting):
+                posting = candidates
+        hits = []
+        for start in range(0, len(posting), CHUNK):
+            candidates = posting[start:start + CHUNK]
+            mask = np.ones(len(candidates), dtype=bool)
+            for position, code in conditions:
+                mask &= self.codes[position][candidates] == code
+            hits.extend(candidates[mask][:limit - len(hits)].tolist())
+            if len(hits) >= limit:
+                break
+        return [self.addresses[i] for i in hits]
+
+
+# main: SegmentArrays; delta: sorted tuple of addresses not in main yet
+_Addresses = namedtuple("_Addresses", ["main", "delta"])
+
+
+class AddressIndex:
+    """Account addresses per ledger, with prefix and segment pattern search."""
+
+    def __init__(self, delta_limit: int = DELTA_LIMIT):
+        self.delta_limit = delta_limit
+        self._ledgers = {}
+        # ledger -> id of the newest log whose addresses are indexed
+        self.last_log_ids = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, ledger: str):
+        return ledger in self._ledgers
+
+    def __len__(self):
+        return sum(len(a.main) + len(a.delta) for a in self._ledgers.values())
+
+    def ledgers(self):
+        return sorted(self._ledgers)
+
+    def add(self, ledger: str, addresses):
+        # Merge a batch of addresses, ignoring those already indexed; returns
+        # the number added
+        with self._lock:
+            current = self._ledgers.get(ledger)
+            if current is None:
+                current = _Addresses(SegmentArrays([]), ())
+            new = {a for a in addresses if not self._known(current, a)}
+            if not new:
+                return 0
+            delta = sorted([*current.delta, *new])
+            if len(delta) > self.delta_limit:
+                # Timsort merges the two sorted runs in linear time
+                self._ledgers[ledger] = _Addresses(SegmentArrays(sorted([*current.main.addresses, *delta])), ())
+            else:
+                self._ledgers[ledger] = _Addresses(current.main, tuple(delta))
+            return len(new)
+
+    @staticmethod
+    def _known(current: _Addresses, address: str):
+        for array in (current.main.addresses, current.delta):
+            i = bisect_left(array, address)
+            if i < len(array) and array[i] == address:
+                return True
+        return False
+
+    def replace(self, ledger: str, addresses, last_log_id=None):
+        main = SegmentArrays(sorted(set(addresses)))
+        with self._lock:
+            self._ledgers[ledger] = _Addresses(main, ())
+            self.last_log_ids[ledger] = last_log_id
+
+    def refresh(self, client, ledger: str, page_size: int = MAX_PAGE_SIZE):
+        # A full walk of the accounts the first time, then only the addresses
+        # of the logs written since. The newest log id is read before the walk,
+        # so an account created during it is picked up again, not missed
+        last_id = self.last_log_ids.get(ledger)
+        if ledger not in self._ledgers or last_id is None:
+            newest = client.newest_log_id(ledger)
+            self.replace(ledger, (
+                account['address'] for page in client.account_pages(ledger, page_size=page_size) for account in page
+            ), newest)
+            return self
+
+        addresses = set()
+        newest = last_id
+        for fresh in iter_newer(client.log_pages(ledger, page_size=page_size), last_id):
+            for log in fresh:
+                addresses.update(log_addresses(log))
+                newest = max(newest, log['id'])
+        self.add(ledger, addresses)
+        self.last_log_ids[ledger] = newest
+        return self
+
+    def refresh_from_snapshot(self, snapshot):
+        # Rebuild from a local LedgerSnapshot when it has applied new logs
+        last_id, _ = snapshot.sync_state()
+        if snapshot.ledger not in self._ledgers or self.last_log_ids.get(snapshot.ledger) != last_id:
+            self.replace(snapshot.ledger, (account['address'] for account in snapshot.accounts()), last_id)
+        return self
+
+    def search(self, pattern: str, ledgers=None, limit: int = SEARCH_LIMIT):
+        # [(ledger, address)] in address order, at most `limit`; a pattern with
+        # an empty segment before the last matches segment-wise, anything
+        # else (`users:` included) is a prefix. Blank patterns match nothing
+        pattern = pattern.strip()
+        if not pattern:
+            return []
+        parts = pattern.split(':')
+        segments = '' in parts[:-1]
+        results = []
+        for ledger in ledgers if ledgers is not None else self.ledgers():
+            current = self._ledgers.get(ledger)
+            if current is None:
+                continue
+            if segments:
+                found = current.main.pattern(parts, limit)
+                found += [a for a in current.delta if segments_match(parts, a)]
+            else:
+                found = current.main.prefix(pattern, limit)
+                lo, hi = _prefix_range(current.delta, pattern)
+                found += current.delta[lo:hi]
+            results.extend((ledger, address) for address in found)
+        return sorted(results, key=lambda r: (r[1], r[0]))[:limit]
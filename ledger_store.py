@@ -0,0 +1,312 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+
+from ledger_client import iter_newer
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_state (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    last_log_id INTEGER,
+    synced_at REAL
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT,
+    reference TEXT,
+    metadata TEXT NOT NULL DEFAULT '{}',
+    reverted INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS postings (
+    tx_id INTEGER NOT NULL,
+    idx INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    asset TEXT NOT NULL,
+    amount TEXT NOT NULL,
+    timestamp TEXT,
+    PRIMARY KEY (tx_id, idx)
+);
+CREATE TABLE IF NOT EXISTS accounts (
+    address TEXT PRIMARY KEY,
+    metadata TEXT NOT NULL DEFAULT '{}',
+    first_usage TEXT
+);
+CREATE TABLE IF NOT EXISTS volumes (
+    address TEXT NOT NULL,
+    asset TEXT NOT NULL,
+    input TEXT NOT NULL,
+    output TEXT NOT NULL,
+    PRIMARY KEY (address, asset)
+);
+CREATE INDEX IF NOT EXISTS postings_source ON postings (source, tx_id);
+CREATE INDEX IF NOT EXISTS postings_destination ON postings (destination, tx_id);
+CREATE INDEX IF NOT EXISTS postings_asset ON postings (asset);
+CREATE INDEX IF NOT EXISTS postings_timestamp ON postings (timestamp);
+CREATE INDEX IF NOT EXISTS transactions_timestamp ON transactions (timestamp);
+CREATE INDEX IF NOT EXISTS volumes_asset ON volumes (asset);
+"""
+
+# Logs are staged here while paging newest-first, then applied oldest-first
+STAGING = "CREATE TEMP TABLE IF NOT EXISTS staged_logs (id INTEGER PRIMARY KEY, log TEXT NOT NULL)"
+
+# Seconds between two log syncs of the same ledger
+SYNC_INTERVAL = 10
+
+
+def metadata_where(filters):
+    # WHERE clauses and arguments matching the JSON metadata column
+    where, args = [], []
+    for f in filters:
+        path = "$." + json.dumps(f.key)
+        if f.value is None:
+            where.append("json_type(metadata, ?) IS NOT NULL")
+            args.append(path)
+        else:
+            where.append("CAST(json_extract(metadata, ?) AS TEXT) = ?")
+            args += [path, f.value]
+    return where, args
+
+
+class LedgerSnapshot:
+    """SQLite read replica of one ledger, filled from its logs.
+
+    Amounts are stored as decimal strings so big-integer assets stay exact.
+    """
+
+    def __init__(self, path: str, ledger: str):
+        self.path = path
+        self.ledger = ledger
+        self.lock = threading.Lock()
+        with self.connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def connect(self):
+        with closing(sqlite3.connect(self.path, timeout=30)) as db:
+            db.row_factory = sqlite3.Row
+            with db:
+                yield db
+
+    def sync_state(self):
+        with self.connect() as db:
+            row = db.execute("SELECT last_log_id, synced_at FROM sync_state WHERE id = 0").fetchone()
+        return (row['last_log_id'], row['synced_at']) if row else (None, None)
+
+    # Sync
+
+    def sync(self, client, page_size: int = 1000):
+        # Stage the log delta newest-first, stopping at the last applied log,
+        # then apply it oldest-first in one transaction
+        with self.lock, self.connect() as db:
+            row = db.execute("SELECT last_log_id FROM sync_state WHERE id = 0").fetchone()
+            last_id = row['last_log_id'] if row else None
+            db.execute(STAGING)
+            db.execute("DELETE FROM staged_logs")
+            for fresh in iter_newer(client.log_pages(self.ledger, page_size=page_size), last_id):
+                db.executemany("INSERT OR IGNORE INTO staged_logs (id, log) VALUES (?, ?)",
+                               [(log['id'], json.dumps(log)) for log in fresh])
+
+            applied = 0
+            deltas = {}
+            for staged in db.execute("SELECT id, log FROM staged_logs ORDER BY id"):
+                self._apply(db, json.loads(staged['log']), deltas)
+                last_id = staged['id']
+                applied += 1
+            self._write_volumes(db, deltas)
+            db.execute("DELETE FROM staged_logs")
+            db.execute("INSERT INTO sync_state (id, last_log_id, synced_at) VALUES (0, ?, ?) "
+                       "ON CONFLICT (id) DO UPDATE SET last_log_id = excluded.last_log_id, "
+                       "synced_at = excluded.synced_at", (last_id, time.time()))
+            return applied
+
+    def _apply(self, db, log: dict, deltas: dict):
+        data = log.get('data') or {}
+        kind = log.get('type')
+        if kind == 'NEW_TRANSACTION':
+            self._insert_transaction(db, data.get('transaction') or {}, deltas)
+            for address, metadata in (data.get('accountMetadata') or {}).items():
+                self._merge_metadata(db, 'ACCOUNT', address, metadata)
+        elif kind == 'REVERTED_TRANSACTION':
+            db.execute("UPDATE transactions SET reverted = 1 WHERE id = ?", (data.get('revertedTransactionID'),))
+            self._insert_transaction(db, data.get('transaction') or {}, deltas)
+        elif kind == 'SET_METADATA':
+            self._merge_metadata(db, data.get('targetType'), data.get('targetId'), data.get('metadata') or {})
+        elif kind == 'DELETE_METADATA':
+            self._delete_metadata(db, data.get('targetType'), data.get('targetId'), data.get('key'))
+
+    def _insert_transaction(self, db, tx: dict, deltas: dict):
+        if tx.get('id') is None:
+            return
+        timestamp = tx.get('timestamp')
+        db.execute("INSERT OR IGNORE INTO transactions (id, timestamp, reference, metadata) VALUES (?, ?, ?, ?)",
+                   (tx['id'], timestamp, tx.get('reference'), json.dumps(tx.get('metadata') or {})))
+        rows = []
+        for i, posting in enumerate(tx.get('postings') or []):
+            amount = int(posting['amount'])
+            rows.append((tx['id'], i, posting['source'], posting['destination'], posting['asset'],
+                         str(amount), timestamp))
+            for address, column in ((posting['source'], 1), (posting['destination'], 0)):
+                delta = deltas.setdefault((address, posting['asset']), [0, 0])
+                delta[column] += amount
+                db.execute("INSERT OR IGNORE INTO accounts (address, first_usage) VALUES (?, ?)",
+                           (address, timestamp))
+        db.executemany("INSERT OR IGNORE INTO postings VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def _write_volumes(self, db, deltas: dict):
+        # Read-modify-write in Python: SQLite integers stop at 2**63
+        for (address, asset), (incoming, outgoing) in deltas.items():
+            row = db.execute("SELECT input, output FROM volumes WHERE address = ? AND asset = ?",
+                             (address, asset)).fetchone()
+            if row:
+                incoming += int(row['input'])
+                outgoing += int(row['output'])
+            db.execute("INSERT OR REPLACE INTO volumes (address, asset, input, output) VALUES (?, ?, ?, ?)",
+                       (address, asset, str(incoming), str(outgoing)))
+
+    def _target(self, target_type: str):
+        if target_type == 'ACCOUNT':
+            return "accounts", "address"
+        if target_type == 'TRANSACTION':
+            return "transactions", "id"
+        return None, None
+
+    def _merge_metadata(self, db, target_type: str, target_id, metadata: dict):
+        table, key = self._target(target_type)
+        if table is None:
+            return
+        if table == "accounts":
+            db.execute("INSERT OR IGNORE INTO accounts (address) VALUES (?)", (target_id,))
+        row = db.execute(f"SELECT metadata FROM {table} WHERE {key} = ?", (target_id,)).fetchone()
+        if row:
+            merged = dict(json.loads(row['metadata']), **metadata)
+            db.execute(f"UPDATE {table} SET metadata = ? WHERE {key} = ?", (json.dumps(merged), target_id))
+
+    def _delete_metadata(self, db, target_type: str, target_id, name: str):
+        table, key = self._target(target_type)
+        if table is None:
+            return
+        row = db.execute(f"SELECT metadata FROM {table} WHERE {key} = ?", (target_id,)).fetchone()
+        if row:
+            metadata = json.loads(row['metadata'])
+            metadata.pop(name, None)
+            db.execute(f"UPDATE {table} SET metadata = ? WHERE {key} = ?", (json.dumps(metadata), target_id))
+
+    # Queries, shaped like the API payloads
+
+    def count_accounts(self):
+        with self.connect() as db:
+            return db.execute("SELECT COUNT(*) FROM accounts").fetchone()[0]
+
+    def count_transactions(self):
+        with self.connect() as db:
+            return db.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+
+    def accounts(self, limit: int = None, offset: int = 0, filters=()):
+        # `filters` are metadata filters (key, value), value None for "the key exists"
+        where, args = metadata_where(filters)
+        sql = "SELECT address, metadata FROM accounts"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY address LIMIT ? OFFSET ?"
+        with self.connect() as db:
+            rows = db.execute(sql, args + [-1 if limit is None else limit, offset]).fetchall()
+        return [{"address": r['address'], "metadata": json.loads(r['metadata']), "ledger": self.ledger}
+                for r in rows]
+
+    def account(self, address: str):
+        with self.connect() as db:
+            row = db.execute("SELECT address, metadata FROM accounts WHERE address = ?", (address,)).fetchone()
+            if row is None:
+                return None
+            volumes = db.execute("SELECT asset, input, output FROM volumes WHERE address = ?",
+                                 (address,)).fetchall()
+        account = {"address": row['address'], "metadata": json.loads(row['metadata']),
+                   "volumes": {}, "balances": {}}
+        for v in volumes:
+            incoming, outgoing = int(v['input']), int(v['output'])
+            account['volumes'][v['asset']] = {"input": incoming, "output": outgoing, "balance": incoming - outgoing}
+            account['balances'][v['asset']] = incoming - outgoing
+        return account
+
+    def balances(self):
+        # (address, asset, balance) for every account
+        with self.connect() as db:
+            for row in db.execute("SELECT address, asset, input, output FROM volumes ORDER BY address"):
+                yield row['address'], row['asset'], int(row['input']) - int(row['output'])
+
+    def transactions(self, source: str = None, destination: str = None, limit: int = None, offset: int = 0,
+                     filters=()):
+        where, args = metadata_where(filters)
+        if source:
+            where.append("id IN (SELECT tx_id FROM postings WHERE source = ?)")
+            args.append(source)
+        if destination:
+            where.append("id IN (SELECT tx_id FROM postings WHERE destination = ?)")
+            args.append(destination)
+        sql = "SELECT id, timestamp, reference, metadata, reverted FROM transactions"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id DESC LIMIT ? OFFSET ?"
+        args += [-1 if limit is None else limit, offset]
+        with self.connect() as db:
+            rows = db.execute(sql, args).fetchall()
+            return self._with_postings(db, rows)
+
+    def transaction(self, tx_id):
+        with self.connect() as db:
+            rows = db.execute("SELECT id, timestamp, reference, metadata, reverted FROM transactions WHERE id = ?",
+                              (int(tx_id),)).fetchall()
+            txs = self._with_postings(db, rows)
+        return txs[0] if txs else None
+
+    def _with_postings(self, db, rows):
+        txs = {}
+        for r in rows:
+            txs[r['id']] = {"id": r['id'], "timestamp": r['timestamp'], "reference": r['reference'],
+                            "metadata": json.loads(r['metadata']), "reverted": bool(r['reverted']),
+                            "postings": [], "ledger": self.ledger}
+        ids = list(txs)
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for p in db.execute(f"SELECT tx_id, source, destination, asset, amount FROM postings "
+                                f"WHERE tx_id IN ({placeholders}) ORDER BY tx_id, idx", chunk):
+                txs[p['tx_id']]['postings'].append({"source": p['source'], "destination": p['destination'],
+                                                    "asset": p['asset'], "amount": int(p['amount'])})
+        return list(txs.values())
+
+
+class SnapshotStore:
+    """One LedgerSnapshot file per ledger under `directory`."""
+
+    def __init__(self, directory: str, sync_interval: float = SYNC_INTERVAL):
+        self.directory = directory
+        self.sync_interval = sync_interval
+        self._snapshots = {}
+        self._synced_at = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def snapshot(self, ledger: str):
+        with self._lock:
+            snapshot = self._snapshots.get(ledger)
+            if snapshot is None:
+                filename = re.sub(r'[^A-Za-z0-9_.-]', '_', ledger) + ".sqlite"
+                snapshot = self._snapshots[ledger] = LedgerSnapshot(os.path.join(self.directory, filename), ledger)
+            return snapshot
+
+    def synced(self, client, ledger: str, force: bool = False):
+        # Snapshot of `ledger`, pulling the log delta at most every sync_interval
+        snapshot = self.snapshot(ledger)
+        now = time.monotonic()
+        if force or now - self._synced_at.get(ledger, float('-inf')) >= self.sync_interval:
+            snapshot.sync(client)
+            self._synced_at[ledger] = time.monotonic()
+        return snapshot
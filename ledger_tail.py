@@ -0,0 +1,111 @@
+"""Live tail of the transactions written to a ledger.
+
+A LogTail follows the ledger logs from the newest id it has seen: each poll
+asks only for the logs after it (`$gt` on the id, checked again locally for
+servers that ignore the filter) and appends the new transactions to a
+bounded ring buffer. The poll interval adapts to the ingest rate: it is
+halved while polls bring new logs, down to MIN_INTERVAL, and grows by half
+on every idle poll, up to MAX_INTERVAL.
+"""
+import time
+from collections import deque
+
+import requests
+
+from ledger_client import MAX_PAGE_SIZE, iter_newer
+
+# Transactions kept in the ring buffer
+TAIL_SIZE = 1000
+
+# Bounds of the adaptive poll interval, in seconds
+MIN_INTERVAL = 1.0
+MAX_INTERVAL = 15.0
+
+# Seconds of polls the throughput is averaged over
+RATE_WINDOW = 60.0
+
+
+class LogTail:
+    """The newest transactions of one ledger, followed through its logs."""
+
+    def __init__(self, ledger: str, capacity: int = TAIL_SIZE, min_interval: float = MIN_INTERVAL,
+                 max_interval: float = MAX_INTERVAL):
+        self.ledger = ledger
+        self.rows = deque(maxlen=capacity)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.last_id = None
+        # Newest transaction id loaded when the tail was opened
+        self._seen_tx = -1
+        self.next_poll = 0.0
+        self.polls = 0
+        # Whether the server takes the `$gt` id filter on the logs
+        self.filter_ids = True
+        # (monotonic time, transactions) of each poll within RATE_WINDOW
+        self._samples = deque()
+
+    def due(self):
+        return time.monotonic() >= self.next_poll
+
+    def poll(self, client, page_size: int = MAX_PAGE_SIZE):
+        # Append the transactions logged since the last poll, oldest first;
+        # returns how many. The first poll marks the newest log and fills the
+        # buffer with the newest transactions; those the logs replay are skipped
+        now = time.monotonic()
+        if self.last_id is None:
+            newest = client.newest_log_id(self.ledger)
+            page = client.fetch_page(f"/{self.ledger}/transactions", "transactions",
+                                     page_size=min(self.rows.maxlen, page_size))
+            self.rows.extend(dict(tx, ledger=self.ledger) for tx in reversed(page['data']))
+            self._seen_tx = max((tx['id'] for tx in page['data']), default=-1)
+            self.last_id = -1 if newest is None else newest
+            self._schedule(now, 0)
+            return 0
+
+        try:
+            fresh = self._fresh_logs(client, page_size)
+        except requests.HTTPError as e:
+            if not self.filter_ids or e.response is None or e.response.status_code != 400:
+                raise
+            # The server rejects the id filter: page from the newest log instead
+            self.filter_ids = False
+            fresh = self._fresh_logs(client, page_size)
+        added = 0
+        for log in sorted(fresh, key=lambda log: log['id']):
+            if log.get('type') in ('NEW_TRANSACTION', 'REVERTED_TRANSACTION'):
+                tx = (log.get('data') or {}).get('transaction')
+                if tx and (log['type'] == 'REVERTED_TRANSACTION' or tx['id'] > self._seen_tx):
+                    self.rows.append(dict(tx, ledger=self.ledger))
+                    added += 1
+            self.last_id = log['id']
+        self._schedule(now, added)
+        return added
+
+    def _fresh_logs(self, client, page_size: int):
+        query = {"$gt": {"id": self.last_id}} if self.filter_ids else None
+        pages = client.log_pages(self.ledger, page_size=page_size, query=query)
+        return [log for page in iter_newer(pages, self.last_id) for log in page]
+
+    def _schedule(self, now: float, added: int):
+        self.polls += 1
+        if added:
+            self.interval = max(self.min_interval, self.interval / 2)
+        else:
+            self.interval = min(self.max_interval, self.interval * 1.5)
+        self.next_poll = now + self.interval
+        self._samples.append((now, added))
+        while self._samples and now - self._samples[0][0] > RATE_WINDOW:
+            self._samples.popleft()
+
+    def throughput(self):
+        # Transactions per second over the polls of the last RATE_WINDOW
+        if len(self._samples) < 2:
+            return 0.0
+        elapsed = self._samples[-1][0] - self._samples[0][0]
+        # The first sample's transactions arrived before the window began
+        added = sum(n for _, n in list(self._samples)[1:])
+        return added / elapsed if elapsed > 0 else 0.0
+
+    def newest_first(self):
+        return list(reversed(self.rows))
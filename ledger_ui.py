@@ -1,17 +1,64 @@
 import streamlit as st
-import requests
 import pandas as pd
 import plotly.express as px
-import networkx as nx
-import matplotlib.pyplot as plt
-from io import BytesIO
-import base64
+from collections import deque
 from datetime import datetime, timedelta
+from itertools import groupby
+import json
 import os
+import time
+
+from ledger_cache import LedgerCache, Prefetcher
+from ledger_client import LedgerClient, take
+from ledger_columns import POOL, columnar, columnar_usage
+from ledger_bulk import DEFAULT_BATCH_SIZE, read_upload, results_frame, submit, validate
+from ledger_export import FORMATS, ExportFile, export
+from ledger_frames import format_postings, minor_units, postings_frame
+from ledger_graph import (
+    FLOW_MAX_EDGES,
+    FLOW_MAX_NODES,
+    explore_account_flows,
+    generate_transaction_graph,
+    transaction_graph_figure,
+)
+from ledger_history import CheckpointStore, account_balances_at, end_of_day, supports_pit
+from ledger_index import BalanceIndex, build_balance_index
+from ledger_integrity import MAX_WORKERS as INTEGRITY_MAX_WORKERS, check_ledger, issue_link
+from ledger_metadata import TARGETS, MetadataIndex, metadata_query, parse_filters, supports_query
+from ledger_metrics import Metrics, serve_metrics
+from ledger_search import SEARCH_LIMIT, AddressIndex
+from ledger_refresher import BackgroundRefresher, count_resource, fetch_server_info as fetch_server_info_from
+from ledger_store import SnapshotStore
+from ledger_tail import MIN_INTERVAL, LogTail
+from ledger_volumes import BUCKETS, VolumeStore, bucket_volumes
 
 # Define the default API endpoint
 BASE_URL = os.environ.get('FORMANCE_API_URL', "http://ledger:3068")
 
+# Cursor page size and the maximum number of rows loaded into a table
+PAGE_SIZE = int(os.environ.get('LEDGER_PAGE_SIZE', 100))
+
+# Worker threads used when fanning out over ledgers
+FETCH_WORKERS = int(os.environ.get('LEDGER_FETCH_WORKERS', 8))
+
+# Worker processes of one integrity run
+INTEGRITY_WORKERS = min(int(os.environ.get('LEDGER_INTEGRITY_WORKERS', 4)), INTEGRITY_MAX_WORKERS)
+
+# Directory of the optional local snapshot (read replica synced from the logs)
+SNAPSHOT_DIR = os.environ.get('LEDGER_SNAPSHOT_DIR')
+
+# Seconds between background refreshes of the ledger list, server info,
+# counts and asset totals shared by all sessions (0 disables), and between
+# rebuilds of the balance index while the Assets view is in use
+BACKGROUND_REFRESH = float(os.environ.get('LEDGER_REFRESH_INTERVAL', 30))
+BALANCE_REFRESH = float(os.environ.get('LEDGER_BALANCE_REFRESH_INTERVAL', 300))
+
+# Reruns kept in the Performance panel, Prometheus /metrics port and the
+# JSON-lines file receiving one OpenTelemetry-style record per rerun
+PERF_HISTORY = int(os.environ.get('LEDGER_PERF_HISTORY', 20))
+METRICS_PORT = int(os.environ.get('LEDGER_METRICS_PORT', 0))
+METRICS_LOG = os.environ.get('LEDGER_METRICS_LOG')
+
 # UI Setup
 st.set_page_config(
     page_title="Formance Ledger Management v2",
@@ -23,178 +70,579 @@ st.title("Formance Ledger Management v2")
 
 CURRENT_TIME = datetime.now().strftime("%Y-%m-%d %I:%M:%S %p")
 
+# Hot-path metrics, one registry per server process
+@st.cache_resource
+def get_metrics():
+    metrics = Metrics(log_path=METRICS_LOG)
+    if METRICS_PORT:
+        serve_metrics(metrics, METRICS_PORT)
+    return metrics
+
+def instrumented(name: str):
+    return get_metrics().timed(f"api.{name}")
+
+def render_timer(name: str):
+    return get_metrics().timer(f"render.{name}")
+
+# Everything observed from here on is attributed to this rerun
+current_rerun = get_metrics().start_rerun(
+    st.session_state.setdefault('perf_reruns', deque(maxlen=PERF_HISTORY)),
+    st.session_state.get('view', "Ledgers"),
+)
+
+# Shared pooled HTTP client, one per server process
+@st.cache_resource
+def get_client():
+    return LedgerClient(BASE_URL, metrics=get_metrics())
+
+# Shared TTL/LRU cache for the read helpers, one per server process
+@st.cache_resource
+def get_cache():
+    return LedgerCache()
+
+def cached(endpoint: str, key: tuple, loader):
+    # A load already started by load_view() or a prefetch is awaited, not repeated
+    return get_prefetcher().get_or_load(endpoint, key, loader)
+
+# Background loader for the next page of the paged tables and the loads a
+# view starts up front
+@st.cache_resource
+def get_prefetcher():
+    return Prefetcher(get_cache(), max_workers=FETCH_WORKERS)
+
+def load_view(*loads):
+    # Start the independent (endpoint, key, loader) loads of a view together;
+    # each panel then waits only for its own data as the script reaches it
+    if use_snapshot():
+        return
+    prefetcher = get_prefetcher()
+    for endpoint, key, loader in loads:
+        prefetcher.submit(endpoint, key, loader)
+
+# Background refresher publishing the shared summary data, one per server process
+@st.cache_resource
+def get_refresher():
+    return BackgroundRefresher(get_client(), BACKGROUND_REFRESH, FETCH_WORKERS,
+                               balance_interval=BALANCE_REFRESH).start()
+
+def published():
+    # Latest background snapshot, or None to fetch inline (refresher disabled,
+    # first refresh still running, or reading from the local snapshot)
+    if BACKGROUND_REFRESH <= 0 or use_snapshot():
+        return None
+    return get_refresher().snapshot()
+
+REFRESH_PARTS = (("ledgers", "Ledgers"), ("counts", "counts"), ("asset_totals", "asset totals"),
+                 ("balances", "balances"))
+
+def show_refresh_age():
+    # Age of each part of the shared data; a part of several ledgers is as
+    # old as its oldest ledger, which stays old while that ledger fails
+    snapshot = published()
+    if snapshot is None:
+        return
+    now = time.time()
+    ages = []
+    for part, label in REFRESH_PARTS:
+        times = [t for key, t in snapshot.refreshed_at.items() if key.partition(":")[0] == part]
+        if times:
+            ages.append(f"{label} {now - min(times):.0f}s")
+    st.caption(f"{', '.join(ages)} ago (refreshed every {BACKGROUND_REFRESH:.0f}s, "
+               f"balances every {BALANCE_REFRESH:.0f}s while in use)")
+    failed = sorted(part for part in snapshot.errors if not part.startswith("server_info:"))
+    if failed:
+        st.caption(f"Showing the last good data for: {', '.join(failed)}")
+
+def refresh_shared_data():
+    # After a write or a manual refresh
+    if BACKGROUND_REFRESH > 0:
+        get_refresher().refresh_now()
+
+# Local snapshot store, one per server process
+@st.cache_resource
+def get_snapshot_store():
+    return SnapshotStore(SNAPSHOT_DIR)
+
+def use_snapshot():
+    return bool(SNAPSHOT_DIR) and st.session_state.get('data_source') == "Local snapshot"
+
+def query_snapshots(ledger: str, query):
+    # Run `query(snapshot)` against the synced snapshot of one ledger, or of
+    # every ledger when none is given; only the log delta is pulled from the API
+    ledgers = [ledger] if ledger else [l['name'] for l in list_ledgers() or []]
+    rows = []
+    for name in ledgers:
+        rows.extend(query(get_snapshot_store().synced(get_client(), name)))
+    return rows
+
 # Helper functions
+@instrumented("server_info")
 def get_server_info():
-    combined_info = {}
-    version_info = None
-    health_status = None
-    
+    snapshot = published()
+    if snapshot is not None:
+        return snapshot.server_info
+    return cached("server_info", (None,), fetch_server_info)
+
+def fetch_server_info():
+    info, errors = fetch_server_info_from(get_client())
+    for path, error in errors.items():
+        st.error(f"Error fetching {path}: {error}")
+    return info
+
+@instrumented("list_ledgers")
+def list_ledgers():
+    snapshot = published()
+    if snapshot is not None and "ledgers" not in snapshot.errors:
+        return list(snapshot.ledgers)
     try:
-        response1 = requests.get(f"{BASE_URL}/_/info")
-        if response1.status_code == 200:
-            version_info = response1.json().get("version")
+        return cached("list_ledgers", (None,), lambda: list(
+            take(get_client().iter_pages("/v2", endpoint="list_ledgers", page_size=PAGE_SIZE))
+        ))
     except Exception as e:
-        st.error(f"Error fetching /_/info: {str(e)}")
-    
+        st.error(f"Error listing ledgers: {str(e)}")
+        return None
+
+@instrumented("ledger_info")
+def get_ledger_info(ledger: str):
     try:
-        response2 = requests.get(f"{BASE_URL}/_info")
-        if response2.status_code == 200:
-            combined_info.update(response2.json().get('data', {}))
+        return cached(*ledger_info_load(ledger))
     except Exception as e:
-        st.error(f"Error fetching /_info: {str(e)}")
-    
+        st.error(f"Error fetching ledger info: {str(e)}")
+        return None
+
+def report_ledger_errors(errors: dict, what: str):
+    for name, error in errors.items():
+        st.warning(f"Could not load {what} from ledger {name}: {error}")
+
+@instrumented("count_accounts")
+def count_accounts(ledger: str):
+    snapshot = published()
+    if snapshot is not None and ledger in snapshot.counts:
+        return snapshot.counts[ledger]["accounts"]
+    if use_snapshot():
+        return sum(query_snapshots(ledger, lambda snapshot: [snapshot.count_accounts()]))
     try:
-        response3 = requests.get(f"{BASE_URL}/_healthcheck")
-        if response3.status_code == 200:
-            health_status = response3.json().get("storage-driver-up-to-date")
+        return cached(*count_load(ledger, "accounts"))
     except Exception as e:
-        st.error(f"Error fetching /_healthcheck: {str(e)}")
-    
-    if version_info:
-        combined_info["version"] = version_info
-    if health_status:
-        combined_info["storage-driver-up-to-date"] = health_status
-    
-    return combined_info if combined_info else None
+        st.error(f"Error counting accounts: {str(e)}")
+        return None
 
-def list_ledgers():
+@instrumented("count_transactions")
+def count_transactions(ledger: str):
+    snapshot = published()
+    if snapshot is not None and ledger in snapshot.counts:
+        return snapshot.counts[ledger]["transactions"]
+    if use_snapshot():
+        return sum(query_snapshots(ledger, lambda snapshot: [snapshot.count_transactions()]))
     try:
-        response = requests.get(f"{BASE_URL}/v2")
-        if response.status_code == 200:
-            return response.json()['cursor']['data']
-        return []
+        return cached(*count_load(ledger, "transactions"))
     except Exception as e:
-        st.error(f"Error listing ledgers: {str(e)}")
+        st.error(f"Error counting transactions: {str(e)}")
         return None
 
-def get_ledger_info(ledger: str):
+@instrumented("asset_totals")
+def get_asset_totals(ledger: str):
+    # Sum of balances per asset held outside `world`, i.e. the amount issued
+    snapshot = published()
+    if snapshot is not None and ledger in snapshot.asset_totals:
+        return snapshot.asset_totals[ledger]
     try:
-        response = requests.get(f"{BASE_URL}/{ledger}/_info")
-        return response.json()['data'] if response.status_code == 200 else None
+        return cached(*asset_totals_load(ledger))
     except Exception as e:
-        st.error(f"Error fetching ledger info: {str(e)}")
+        st.error(f"Error aggregating balances: {str(e)}")
         return None
 
-def get_accounts(ledger: str = None):
-    if ledger:
-        try:
-            response = requests.get(f"{BASE_URL}/{ledger}/accounts")
-            if response.status_code == 200:
-                accounts = response.json().get('cursor', {}).get('data', [])
-                for acc in accounts:
-                    acc['ledger'] = ledger
-                return accounts
-            return []
-        except Exception as e:
-            st.error(f"Error fetching accounts: {str(e)}")
-            return []
-    else:
-        # Get accounts from all ledgers
-        all_accounts = []
-        ledgers = list_ledgers()
-        for l in ledgers:
-            try:
-                response = requests.get(f"{BASE_URL}/{l['name']}/accounts")
-                if response.status_code == 200:
-                    accounts = response.json().get('cursor', {}).get('data', [])
-                    for acc in accounts:
-                        acc['ledger'] = l['name']
-                    all_accounts.extend(accounts)
-            except Exception:
-                pass
-        return all_accounts
-
-def get_transactions(ledger: str = None, source: str = None, destination: str = None):
-    params = {}
-    if source and source.strip():
-        params['source'] = source
-    if destination and destination.strip():
-        params['destination'] = destination
-    
-    if ledger:
-        try:
-            url = f"{BASE_URL}/{ledger}/transactions"
-            response = requests.get(url, params=params)
-            if response.status_code == 200:
-                transactions = response.json().get('cursor', {}).get('data', [])
-                for tx in transactions:
-                    tx['ledger'] = ledger
-                return transactions
-            return []
-        except Exception as e:
-            st.error(f"Error fetching transactions: {str(e)}")
-            return []
-    else:
-        # Get transactions from all ledgers
-        all_transactions = []
-        ledgers = list_ledgers()
-        for l in ledgers:
-            try:
-                url = f"{BASE_URL}/{l['name']}/transactions"
-                response = requests.get(url, params=params)
-                if response.status_code == 200:
-                    transactions = response.json().get('cursor', {}).get('data', [])
-                    for tx in transactions:
-                        tx['ledger'] = l['name']
-                    all_transactions.extend(transactions)
-            except Exception:
-                pass
-        return all_transactions
+def fetch_data(path: str, endpoint: str, client: LedgerClient = None):
+    # Single-object endpoints wrap their payload in `data`
+    response = (client or get_client()).get(path, endpoint=endpoint)
+    return response.json()['data'] if response.status_code == 200 else None
+
+# Loads behind the read helpers as (endpoint, key, loader), so a view can
+# start them together with load_view(). The client is resolved here, on the
+# script thread, as the loader may run on a worker
+def ledger_info_load(ledger: str):
+    client = get_client()
+    return "ledger_info", (ledger,), lambda: fetch_data(f"/{ledger}/_info", "ledger_info", client)
+
+def count_load(ledger: str, resource: str):
+    # Server-side count, falling back to walking the pages on servers
+    # without the Count header
+    client = get_client()
+    return "counts", (ledger, resource), lambda: count_resource(client, ledger, resource)
+
+def asset_totals_load(ledger: str):
+    client = get_client()
+    return "aggregate", (ledger, "issued"), lambda: client.aggregate_balances(
+        ledger, query={"$not": {"$match": {"address": "world"}}}
+    )
+
+def transaction_load(ledger: str, tx_id: str):
+    client = get_client()
+    return "transaction", (ledger, str(tx_id)), lambda: fetch_data(
+        f"/{ledger}/transactions/{tx_id}", "transaction", client
+    )
+
+def account_load(ledger: str, address: str):
+    client = get_client()
+    return "account", (ledger, address), lambda: fetch_data(f"/{ledger}/accounts/{address}", "account", client)
+
+def page_load(resource: str, ledger: str, params: dict, page_size: int, cursor: str = None, query: dict = None):
+    client = get_client()
+    key = (ledger, resource, tuple(sorted(params.items())), json.dumps(query, sort_keys=True), page_size, cursor)
+
+    def load():
+        # Converted on arrival, so the cache holds columns rather than JSON dicts
+        page = client.fetch_page(f"/{ledger}/{resource}", resource, params, page_size, cursor, query)
+        return {'data': columnar(resource, page['data'], ledger), 'next': page['next']}
+
+    return "pages", key, load
 
+def volume_load(ledger: str, account: str):
+    client, store = get_client(), get_volume_store()
+    return "volumes", (ledger, account), lambda: store.get(client, ledger, account, page_size=PAGE_SIZE)
+
+@instrumented("transaction")
 def get_transaction(ledger: str, tx_id: str):
     try:
-        response = requests.get(f"{BASE_URL}/{ledger}/transactions/{tx_id}")
-        return response.json()['data'] if response.status_code == 200 else None
+        if use_snapshot():
+            return get_snapshot_store().synced(get_client(), ledger).transaction(tx_id)
+        return cached(*transaction_load(ledger, tx_id))
     except Exception as e:
         st.error(f"Error fetching transaction: {str(e)}")
         return None
 
+@instrumented("account")
 def get_account(ledger: str, address: str):
     try:
-        response = requests.get(f"{BASE_URL}/{ledger}/accounts/{address}")
-        return response.json()['data'] if response.status_code == 200 else None
+        if use_snapshot():
+            return get_snapshot_store().synced(get_client(), ledger).account(address)
+        return cached(*account_load(ledger, address))
     except Exception as e:
         st.error(f"Error fetching account: {str(e)}")
         return None
 
-def generate_transaction_graph(tx):
-    # Create a graph visualization for transaction
-    G = nx.DiGraph()
-    
-    for posting in tx.get('postings', []):
-        src = posting.get('source')
-        dst = posting.get('destination')
-        amount = posting.get('amount')
-        asset = posting.get('asset')
-        
-        G.add_node(src)
-        G.add_node(dst)
-        G.add_edge(src, dst, label=f"{asset} {amount}")
-    
-    pos = nx.spring_layout(G)
-    fig, ax = plt.subplots(figsize=(8, 6))
-    nx.draw(G, pos, with_labels=True, node_color='lightblue', 
-            node_size=1500, font_size=10, ax=ax)
-    nx.draw_networkx_edge_labels(G, pos, 
-                              edge_labels=nx.get_edge_attributes(G, 'label'))
-    
-    # Convert to base64 for display in Streamlit
-    buf = BytesIO()
-    plt.savefig(buf, format='png')
-    plt.close(fig)
-    buf.seek(0)
-    return base64.b64encode(buf.read()).decode('utf-8')
-
-def get_all_assets():
-    all_assets = set()
-    for ledger in list_ledgers():
-        accounts = get_accounts(ledger['name'])
-        for account in accounts:
-            if account is not None:
-                acc = get_account(ledger['name'], account['address'])
-                if acc is not None:
-                    all_assets.update(acc.get('balances', {}).keys())
-    return list(all_assets)
+# Paged tables fetch only the visible page; cursor tokens are kept per table in
+# session_state so Previous/Next never re-walk the ledger
+PAGE_SIZES = [25, 50, 100, 250, 1000]
+
+@instrumented("page")
+def get_page(resource: str, ledger: str, params: dict, page_size: int, cursor: str = None, filters=()):
+    # {'data', 'next'} for one page of `resource` as a columnar batch,
+    # optionally restricted by metadata filters; the following page is
+    # prefetched so Next is usually served from the cache
+    if filters and not pushes_down_metadata(ledger, resource):
+        return metadata_index_page(resource, ledger, params, filters, page_size, cursor)
+    if use_snapshot():
+        # Snapshot pages use the row offset as their cursor
+        offset = int(cursor or 0)
+        snapshot = get_snapshot_store().synced(get_client(), ledger)
+        if resource == "accounts":
+            rows = snapshot.accounts(page_size + 1, offset, filters)
+        else:
+            rows = snapshot.transactions(params.get('source'), params.get('destination'), page_size + 1, offset,
+                                         filters)
+        return {'data': columnar(resource, rows[:page_size], ledger),
+                'next': str(offset + page_size) if len(rows) > page_size else None}
+
+    query = metadata_query(filters)
+    page = cached(*page_load(resource, ledger, params, page_size, cursor, query))
+    if page['next']:
+        get_prefetcher().submit(*page_load(resource, ledger, params, page_size, page['next'], query))
+    return page
+
+# Metadata filters are pushed down as a v2 query where the server evaluates
+# it, to SQLite when reading the local snapshot, and served from a local
+# inverted index elsewhere
+@st.cache_resource
+def get_metadata_index():
+    return MetadataIndex()
+
+def pushes_down_metadata(ledger: str, resource: str):
+    if use_snapshot():
+        return True
+    client = get_client()
+    return cached("query_support", (ledger, resource), lambda: supports_query(client, ledger, resource))
+
+def synced_metadata_index(ledger: str):
+    index, client = get_metadata_index(), get_client()
+    load = ("metadata_index", (ledger,), lambda: index.refresh(client, ledger))
+    if ledger in index:
+        # Filter on what is indexed while the new logs are pulled
+        get_prefetcher().submit(*load)
+    else:
+        with st.spinner(f"Indexing the metadata of {ledger}..."):
+            cached(*load)
+    return index
+
+def metadata_index_page(resource: str, ledger: str, params: dict, filters, page_size: int, cursor: str = None):
+    # Index pages use the offset into the matching ids as their cursor
+    index = synced_metadata_index(ledger)
+    target = TARGETS[resource]
+    ids = sorted(index.ids(ledger, target, filters), reverse=resource == "transactions")
+    offset = int(cursor or 0)
+    chunk = ids[offset:offset + page_size]
+    next_cursor = str(offset + page_size) if offset + page_size < len(ids) else None
+    if resource == "accounts":
+        rows = [{'address': address, 'metadata': index.metadata(ledger, target, address)} for address in chunk]
+        return {'data': columnar(resource, rows, ledger), 'next': next_cursor}
+
+    # Transactions are fetched by id, concurrently; source/destination
+    # filters apply to the fetched page
+    load_view(*(transaction_load(ledger, tx_id) for tx_id in chunk))
+    rows = []
+    for tx_id in chunk:
+        tx = get_transaction(ledger, tx_id)
+        postings = (tx or {}).get('postings') or []
+        if tx and all(any(p[side] == params[side] for p in postings) for side in ("source", "destination")
+                      if params.get(side)):
+            rows.append(tx)
+    return {'data': columnar(resource, rows, ledger), 'next': next_cursor}
+
+def pager(name: str, key: tuple):
+    # Cursor stack of one paged table, reset when its ledger, filters or page size change
+    state = st.session_state.get(name)
+    if state is None or state['key'] != key:
+        state = st.session_state[name] = {'key': key, 'cursors': [None], 'index': 0}
+    return state
+
+def page_size_control(name: str):
+    default = PAGE_SIZES.index(PAGE_SIZE) if PAGE_SIZE in PAGE_SIZES else 2
+    return st.selectbox("Rows per page", PAGE_SIZES, index=default, key=f"{name}_size")
+
+def pager_controls(name: str, state: dict, next_cursor: str, rows: int):
+    col1, col2, col3 = st.columns([1, 4, 1])
+    with col1:
+        if st.button("◀ Previous", key=f"{name}_prev", disabled=state['index'] == 0):
+            state['index'] -= 1
+            st.rerun()
+    with col2:
+        st.caption(f"Page {state['index'] + 1} · {rows} rows")
+    with col3:
+        if st.button("Next ▶", key=f"{name}_next", disabled=not next_cursor):
+            del state['cursors'][state['index'] + 1:]
+            state['cursors'].append(next_cursor)
+            state['index'] += 1
+            st.rerun()
+
+# Live mode of the Transactions view: the fragment reruns on its own every
+# MIN_INTERVAL, but only polls the logs when the tail's adaptive interval is up
+def tail_matches(tx: dict, params: dict, filters):
+    postings = tx.get('postings') or []
+    metadata = tx.get('metadata') or {}
+    return (all(any(p[side] == params[side] for p in postings) for side in ("source", "destination")
+                if params.get(side))
+            and all(f.key in metadata and (f.value is None or str(metadata[f.key]) == f.value) for f in filters))
+
+@st.fragment(run_every=MIN_INTERVAL)
+def live_transactions(ledger: str, params: dict, filters):
+    tail = st.session_state.get('tx_tail')
+    if tail is None or tail.ledger != ledger:
+        tail = st.session_state['tx_tail'] = LogTail(ledger)
+    if tail.due():
+        try:
+            tail.poll(get_client())
+        except Exception as e:
+            st.error(f"Error polling the logs of {ledger}: {str(e)}")
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Transactions/s", f"{tail.throughput():.1f}")
+    col2.metric("Buffered", f"{len(tail.rows)} / {tail.rows.maxlen}")
+    col3.metric("Poll interval", f"{tail.interval:.1f}s")
+
+    rows = [tx for tx in tail.newest_first() if tail_matches(tx, params, filters)]
+    if rows:
+        st.dataframe(format_postings(postings_frame(rows)), hide_index=True, use_container_width=True)
+    else:
+        st.info("Waiting for new transactions...")
+
+# Committed transactions are immutable, so renders are memoized per (ledger, tx id);
+# the underscore keeps Streamlit from hashing the transaction itself
+@st.cache_data(max_entries=256, show_spinner=False)
+def render_transaction_graph_png(ledger: str, tx_id: str, _tx):
+    return generate_transaction_graph(_tx)
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def render_transaction_graph_figure(ledger: str, tx_id: str, _tx):
+    return transaction_graph_figure(_tx)
+
+# Incrementally refreshed per-account volume buckets, one store per server process
+@st.cache_resource
+def get_volume_store():
+    return VolumeStore()
+
+@instrumented("volume_buckets")
+def get_volume_buckets(ledger: str, account: str, bucket: str):
+    try:
+        return bucket_volumes(cached(*volume_load(ledger, account)), bucket)
+    except Exception as e:
+        st.error(f"Error fetching transaction volume: {str(e)}")
+        return None
+
+# Account address search index, one per server process and data source
+@st.cache_resource
+def get_address_index(source: str):
+    return AddressIndex()
+
+@instrumented("address_search")
+def search_addresses(ledger: str, pattern: str):
+    try:
+        if use_snapshot():
+            index = get_address_index("snapshot").refresh_from_snapshot(
+                get_snapshot_store().synced(get_client(), ledger)
+            )
+        else:
+            index, client = get_address_index("api"), get_client()
+            load = ("address_index", (ledger,), lambda: index.refresh(client, ledger))
+            if ledger in index:
+                # Search what is indexed while the new addresses are pulled
+                get_prefetcher().submit(*load)
+            else:
+                cached(*load)
+        return index.search(pattern, [ledger])
+    except Exception as e:
+        st.error(f"Error searching accounts: {str(e)}")
+        return []
+
+@instrumented("account_flows")
+def get_account_flows(ledger: str, account: str, hops: int, max_nodes: int, max_edges: int):
+    try:
+        return cached("flows", (ledger, account, hops, max_nodes, max_edges), lambda: explore_account_flows(
+            get_client(), ledger, account, hops, max_nodes, max_edges, page_size=PAGE_SIZE
+        ))
+    except Exception as e:
+        st.error(f"Error exploring account flows: {str(e)}")
+        return None
+
+def get_snapshot_balance_index():
+    index = BalanceIndex()
+    try:
+        for ledger in [l['name'] for l in list_ledgers() or []]:
+            rows = get_snapshot_store().synced(get_client(), ledger).balances()
+            for address, balances in groupby(rows, key=lambda row: row[0]):
+                index.add(ledger, address, {asset: balance for _, asset, balance in balances})
+    except Exception as e:
+        st.error(f"Error reading balances from the snapshot: {str(e)}")
+    return index
+
+# Shown until the background refresher publishes its first balance index;
+# the fragment polls the snapshot and reruns the page once it is there
+BALANCE_POLL_INTERVAL = 1
+
+@st.fragment(run_every=BALANCE_POLL_INTERVAL)
+def await_balance_index():
+    snapshot = get_refresher().snapshot()
+    if snapshot is not None and snapshot.balance_index is not None:
+        st.rerun()
+    st.info("Building the balance index... the view updates once every ledger has been walked")
+
+@instrumented("balance_index")
+def get_balance_index():
+    if use_snapshot():
+        return get_snapshot_balance_index()
+
+    snapshot = published()
+    if snapshot is not None:
+        get_refresher().want_balances()
+        if snapshot.balance_index is None:
+            await_balance_index()
+            return None
+        report_ledger_errors(snapshot.balance_index.errors, "balances")
+        return snapshot.balance_index
+
+    ledgers = [l['name'] for l in list_ledgers() or []]
+    key = (None, tuple(ledgers))
+    index = cached("balance_index", key, lambda: build_balance_index(
+        get_client(), ledgers, max_workers=FETCH_WORKERS
+    ))
+    if index.errors:
+        get_cache().discard("balance_index", key)
+        report_ledger_errors(index.errors, "balances")
+    return index
+
+# Balances as of a past date: `pit` reads where the server supports them,
+# local end-of-day checkpoints elsewhere
+@st.cache_resource
+def get_checkpoint_store():
+    return CheckpointStore()
+
+def get_pit_support(ledger: str):
+    client = get_client()
+    return cached("pit_support", (ledger,), lambda: supports_pit(client, ledger))
+
+def get_checkpoints(ledger: str):
+    with st.spinner(f"Indexing the balance history of {ledger}..."):
+        return get_checkpoint_store().synced(get_client(), ledger)
+
+@instrumented("balances_as_of")
+def get_account_balances_as_of(ledger: str, address: str, day):
+    try:
+        if get_pit_support(ledger):
+            client, pit = get_client(), end_of_day(day)
+            return cached("balances_at", (ledger, address, pit),
+                          lambda: account_balances_at(client, ledger, address, pit))
+        return get_checkpoints(ledger).account_balances(address, day)
+    except Exception as e:
+        st.error(f"Error fetching past balances: {str(e)}")
+        return None
+
+@instrumented("balance_index_as_of")
+def get_balance_index_as_of(day):
+    # Holders at the end of `day`; ledgers without `pit` are read from their checkpoints
+    ledgers = [l['name'] for l in list_ledgers() or []]
+    pit = end_of_day(day)
+    try:
+        pit_ledgers = [ledger for ledger in ledgers if get_pit_support(ledger)]
+
+        def load():
+            index = build_balance_index(get_client(), pit_ledgers, max_workers=FETCH_WORKERS, params={'pit': pit})
+            for ledger in ledgers:
+                if ledger not in pit_ledgers:
+                    for address, balances in get_checkpoints(ledger).balances(day):
+                        index.add(ledger, address, balances)
+            return index
+
+        key = (None, tuple(ledgers), pit)
+        index = cached("balance_index", key, load)
+    except Exception as e:
+        st.error(f"Error fetching past balances: {str(e)}")
+        return BalanceIndex()
+    if index.errors:
+        get_cache().discard("balance_index", key)
+        report_ledger_errors(index.errors, "balances")
+    return index
+
+def export_panel(resource: str, ledger: str, params: dict = None):
+    # Streams the cursor pages to a temporary file, then offers it for download
+    with st.expander(f"Export {resource}"):
+        if not ledger:
+            st.info("Select a ledger to export")
+            return
+        fmt = st.selectbox("Format", list(FORMATS), key=f"export_format_{resource}")
+        state_key = f"export_file_{resource}"
+        if st.button("Prepare export", key=f"export_prepare_{resource}"):
+            previous = st.session_state.pop(state_key, None)
+            if previous:
+                previous[0].remove()
+            progress = st.empty()
+            # The ExportFile lives in the session state, so the temporary
+            # file is deleted when the session ends
+            prepared = ExportFile(fmt)
+            try:
+                with prepared.open() as out:
+                    prepared.rows = export(get_client(), ledger, resource, fmt, out, params,
+                                           progress=lambda items, rows: progress.caption(f"Exported {rows} rows..."))
+                st.session_state[state_key] = (prepared, ledger)
+            except Exception as e:
+                prepared.remove()
+                st.error(f"Export failed: {str(e)}")
+            progress.empty()
+
+        if state_key in st.session_state:
+            prepared, export_ledger = st.session_state[state_key]
+            # The file is only read when the button is clicked, not on every rerun
+            st.download_button(f"Download {prepared.rows} rows ({prepared.fmt})", prepared.read,
+                               file_name=f"{export_ledger}-{resource}.{prepared.fmt}",
+                               mime=FORMATS[prepared.fmt], key=f"export_download_{resource}", on_click="ignore")
 
 # Server info sidebar
 server_info = get_server_info()
@@ -209,10 +657,49 @@ with st.sidebar:
         st.write(f"**Storage Driver**: {storage_info.get('driver', 'N/A')}")
         st.write(f"**Storage Driver Status**: {server_info.get('storage-driver-up-to-date', 'N/A')}")
     
+    if SNAPSHOT_DIR:
+        st.radio("Data source", ["Live API", "Local snapshot"], key="data_source",
+                 help="Read from the local replica synced from the ledger logs")
+    
+    if st.button("Refresh data", help="Clear cached API responses and reload"):
+        get_cache().clear()
+        get_volume_store().expire()
+        get_checkpoint_store().expire()
+        refresh_shared_data()
+        st.rerun()
+    
+    with st.expander("Cache statistics"):
+        cache_stats = get_cache().stats()
+        if cache_stats:
+            st.dataframe(pd.DataFrame.from_dict(cache_stats, orient='index'), use_container_width=True)
+            cached_postings, cached_bytes = columnar_usage(
+                get_cache().values("pages")
+            )
+            if cached_postings:
+                st.caption(f"{cached_postings} cached postings in {cached_bytes / 1e6:.1f} MB "
+                           f"({cached_bytes / cached_postings:.0f} MB per million postings); "
+                           f"{len(POOL)} interned addresses and assets")
+        else:
+            st.write("No cached endpoints yet")
+    
     st.markdown("---")
 
+# Deep links (?ledger=main&account=users:001 or ?ledger=main&tx=42), as in
+# the integrity reports, open the account or transaction details
+link_ledger = st.query_params.get("ledger")
+if link_ledger and st.query_params.get("account"):
+    st.session_state.update(view="Accounts", temp_filter=link_ledger, account_ledger_filter=link_ledger,
+                            selected_ledger=link_ledger, selected_account=st.query_params["account"],
+                            view_account_details=True)
+    st.query_params.clear()
+elif link_ledger and st.query_params.get("tx"):
+    st.session_state.update(view="Transactions", transaction_ledger_filter=link_ledger,
+                            selected_ledger=link_ledger, selected_tx_id=st.query_params["tx"],
+                            view_tx_details=True)
+    st.query_params.clear()
+
 # Main navigation
-view = st.sidebar.radio("Views", ["Ledgers", "Accounts", "Transactions", "Assets"])
+view = st.sidebar.radio("Views", ["Ledgers", "Accounts", "Transactions", "Assets", "Integrity"], key="view")
 
 # State management
 if 'selected_ledger' not in st.session_state:
@@ -229,6 +716,8 @@ if 'source_filter' not in st.session_state:
     st.session_state['source_filter'] = ""
 if 'destination_filter' not in st.session_state:
     st.session_state['destination_filter'] = ""
+if 'tx_metadata_filter' not in st.session_state:
+    st.session_state['tx_metadata_filter'] = ""
 if 'account_ledger_filter' not in st.session_state:
     st.session_state['account_ledger_filter'] = None
 
@@ -247,6 +736,7 @@ def update_filter():
 if view == "Ledgers":
     reset_view_states()
     st.header("Ledgers Overview")
+    show_refresh_age()
     
     # Show list of ledgers
     ledgers = list_ledgers()
@@ -265,19 +755,30 @@ if view == "Ledgers":
         
         # Show summary for selected ledger
         ledger = st.session_state['selected_ledger']
+        # Counts, totals and migrations do not depend on each other
+        loads = [ledger_info_load(ledger)]
+        if published() is None:
+            loads += [count_load(ledger, "accounts"), count_load(ledger, "transactions"), asset_totals_load(ledger)]
+        load_view(*loads)
         st.subheader(f"Summary for {ledger}")
         
         col1, col2 = st.columns(2)
         
         # Count accounts and transactions
-        accounts = get_accounts(ledger)
-        transactions = get_transactions(ledger)
-        
         with col1:
-            st.metric("Total Accounts", len(accounts))
+            st.metric("Total Accounts", count_accounts(ledger))
         
         with col2:
-            st.metric("Total Transactions", len(transactions))
+            st.metric("Total Transactions", count_transactions(ledger))
+        
+        asset_totals = get_asset_totals(ledger)
+        if asset_totals:
+            st.write("**Per-asset totals (excluding world)**")
+            st.dataframe(
+                pd.DataFrame([{"Asset": asset, "Total": total} for asset, total in sorted(asset_totals.items())]),
+                hide_index=True,
+                use_container_width=True
+            )
         
         # Show migration history
         st.subheader("Migration History")
@@ -324,6 +825,7 @@ if view == "Ledgers":
 # 2. Transactions View
 elif view == "Transactions":
     st.header("Transactions")
+    show_refresh_age()
     
     # Filters for transactions
     col1, col2, col3 = st.columns(3)
@@ -346,13 +848,21 @@ elif view == "Transactions":
     
     with col3:
         destination_filter = st.text_input("Destination Account", value=st.session_state['destination_filter'])
+
+    metadata_filter = st.text_input("Metadata filter", value=st.session_state['tx_metadata_filter'],
+                                    placeholder="batch=3, invoice",
+                                    help="Comma-separated key=value (equal) or key (exists) conditions")
     
     # Apply filters button
     if st.button("Apply Filters"):
         st.session_state['selected_ledger'] = filter_ledger
         st.session_state['source_filter'] = source_filter
         st.session_state['destination_filter'] = destination_filter
+        st.session_state['tx_metadata_filter'] = metadata_filter
         st.rerun()
+
+    live = st.toggle("Live", key="tx_live",
+                     help="Follow new transactions through the ledger logs instead of paging the list")
     
     
     # Show transaction detail or list
@@ -375,70 +885,75 @@ elif view == "Transactions":
             # Postings
             st.write("### Postings")
             if tx.get('postings'):
-                postings_data = []
-                tx_id = tx.get('id')
-                for posting in tx['postings']:
-                    postings_data.append({
-                        "Txid": str(tx_id).zfill(7),
-                        "Value": f"{posting.get('asset')} {posting.get('amount')}",
-                        "Source": posting.get('source'),
-                        "Destination": posting.get('destination'),
-                        "Ledger": st.session_state['selected_ledger'],
-                        "Date": tx.get('timestamp')
-                    })
-                
-                st.dataframe(pd.DataFrame(postings_data), hide_index=True, use_container_width=True)
+                postings_df = postings_frame([tx], ledger=st.session_state['selected_ledger'])
+                st.dataframe(format_postings(postings_df), hide_index=True, use_container_width=True)
             
             # Graph
             st.write("### Graph")
-            graph_data = generate_transaction_graph(tx)
-            st.image(f"data:image/png;base64,{graph_data}")
+            graph_renderer = st.radio("Renderer", ["Interactive", "Static image"], horizontal=True,
+                                      key="tx_graph_renderer", label_visibility="collapsed")
+            tx_key = (st.session_state['selected_ledger'], str(tx.get('id')))
+            if graph_renderer == "Interactive":
+                with render_timer("transaction_graph_figure"):
+                    graph_fig = render_transaction_graph_figure(*tx_key, tx)
+                st.plotly_chart(graph_fig, use_container_width=True)
+            else:
+                with render_timer("transaction_graph_png"):
+                    graph_data = render_transaction_graph_png(*tx_key, tx)
+                st.image(f"data:image/png;base64,{graph_data}")
             
             # Metadata
             st.write("### Metadata")
             st.json(tx.get('metadata', {}))
+    elif live:
+        # Live tail of the selected ledger, with the applied filters
+        live_params = {k: v for k, v in (("source", st.session_state['source_filter']),
+                                         ("destination", st.session_state['destination_filter'])) if v}
+        live_transactions(st.session_state['selected_ledger'], live_params,
+                          parse_filters(st.session_state['tx_metadata_filter']))
     else:
         # Transaction List View
-        transactions = get_transactions(
-            st.session_state['selected_ledger'],
-            st.session_state['source_filter'],
-            st.session_state['destination_filter']
-        )
+        export_params = {k: v for k, v in (("source", st.session_state['source_filter']),
+                                           ("destination", st.session_state['destination_filter'])) if v}
+        export_panel("transactions", st.session_state['selected_ledger'], export_params)
+        
+        tx_filters = parse_filters(st.session_state['tx_metadata_filter'])
+        page_size = page_size_control("tx_pager")
+        state = pager("tx_pager", (st.session_state['selected_ledger'], tuple(sorted(export_params.items())),
+                                   tx_filters, page_size))
+        try:
+            page = get_page("transactions", st.session_state['selected_ledger'], export_params,
+                            page_size, state['cursors'][state['index']], tx_filters)
+        except Exception as e:
+            st.error(f"Error fetching transactions: {str(e)}")
+            page = {'data': [], 'next': None}
+        transactions = page['data']
         
         if transactions:
-            tx_data = []
-            for tx in transactions:
-                for posting in tx.get('postings', []):
-                    tx_data.append({
-                        "Txid": str(tx.get('id')).zfill(7),
-                        "Value": f"{posting.get('asset')} {posting.get('amount')}",
-                        "Source": posting.get('source'),
-                        "Destination": posting.get('destination'),
-                        "Ledger": tx.get('ledger'),
-                        "Date": tx.get('timestamp')
-                    })
-            
-            df = pd.DataFrame(tx_data)
+            with render_timer("postings_frame"):
+                df = postings_frame(transactions)
             
             # Display dataframe with selection
-            event = st.dataframe(df, hide_index=True, use_container_width=True,on_select='rerun',selection_mode='single-row')
+            event = st.dataframe(format_postings(df), hide_index=True, use_container_width=True,on_select='rerun',selection_mode='single-row')
 
             if event and len(event.selection['rows']):
                 selected_row = event.selection['rows'][0]
-                tx_id = df.iloc[selected_row]["Txid"]
-                ledger = df.iloc[selected_row]["Ledger"]
+                tx_id = df.iloc[selected_row]["txid"]
+                ledger = df.iloc[selected_row]["ledger"]
 
                 # Set selected transaction and show details
-                st.session_state['selected_tx_id'] = tx_id.lstrip('0')
+                st.session_state['selected_tx_id'] = str(tx_id)
                 st.session_state['selected_ledger'] = ledger
                 st.session_state['view_tx_details'] = True
                 st.rerun()
+            pager_controls("tx_pager", state, page['next'], len(transactions))
         else:
             st.info("No transactions found with the selected filters")
 
 # 3. Accounts View
 elif view == "Accounts":
     st.header("Accounts")
+    show_refresh_age()
     
     # Filter by ledger
     ledgers = list_ledgers()
@@ -450,10 +965,33 @@ elif view == "Accounts":
     else:
         st.warning("No ledgers available.")
 
+    account_search = None
+    account_filters = ()
+    if not st.session_state['view_account_details']:
+        col1, col2 = st.columns(2)
+        with col1:
+            account_search = st.text_input(
+                "Search addresses", key="account_search", placeholder="users:00 or users::wallet",
+                help="An address prefix, or a pattern where an empty segment matches any one segment"
+            )
+        with col2:
+            account_filters = parse_filters(st.text_input(
+                "Metadata filter", key="account_metadata_filter", placeholder="tier=gold, region",
+                help="Comma-separated key=value (equal) or key (exists) conditions"
+            ))
 
     if st.session_state['view_account_details'] and st.session_state['selected_account']:
         # Account Detail View
         if st.session_state['selected_ledger']: #Check if there is selected ledger
+            # The account, its volume buckets and its transactions page load concurrently
+            tx_state = pager("account_tx_pager", (st.session_state['selected_ledger'], st.session_state['selected_account']))
+            tx_params = {'source': st.session_state['selected_account']}
+            load_view(
+                account_load(st.session_state['selected_ledger'], st.session_state['selected_account']),
+                volume_load(st.session_state['selected_ledger'], st.session_state['selected_account']),
+                page_load("transactions", st.session_state['selected_ledger'], tx_params, PAGE_SIZE,
+                          tx_state['cursors'][tx_state['index']]),
+            )
             account = get_account(st.session_state['selected_ledger'], st.session_state['selected_account'])
             if account:
                 # Breadcrumb navigation
@@ -470,60 +1008,47 @@ elif view == "Accounts":
                 # Activity visualization
                 st.write("### Transactions volume")
 
-                # Helper function to process transaction data
-                def get_transaction_volume_data(ledger, account):
-                    txs = get_transactions(ledger, source=account)
-                    volume_data = []
-
-                    for tx in txs:
-                        # Check if account is involved in any postings
-                        involved = any(
-                            posting['source'] == account or posting['destination'] == account
-                            for posting in tx.get('postings', [])
-                        )
-                        
-                        if involved:
-                            date = pd.to_datetime(tx['timestamp']).strftime('%b %d, %Y')
-                            for posting in tx['postings']:
-                                if posting['source'] == account or posting['destination'] == account:
-                                    volume_data.append({
-                                        'date': date,
-                                        'asset': posting['asset'],
-                                        'amount': abs(float(posting['amount']))
-                                    })
-
-                    return pd.DataFrame(volume_data)
+                volume_bucket = st.radio("Bucket", list(BUCKETS), horizontal=True, key="volume_bucket")
 
                 # Get and plot data
                 if st.session_state['selected_ledger'] and st.session_state['selected_account']:
-                    activity_df = get_transaction_volume_data(
+                    activity_df = get_volume_buckets(
                         st.session_state['selected_ledger'],
-                        st.session_state['selected_account']
+                        st.session_state['selected_account'],
+                        volume_bucket
                     )
                     
-                    if not activity_df.empty:
-                        # Group by date and asset
-                        grouped_df = activity_df.groupby(['date', 'asset'])['amount'].sum().reset_index()
+                    if activity_df is not None and not activity_df.empty:
+                        # Outgoing volume is drawn below the axis
+                        activity_df['volume'] = [
+                            float(value) if direction == 'incoming' else -float(value)
+                            for value, direction in zip(activity_df['value'], activity_df['direction'])
+                        ]
+                        activity_df['exact'] = activity_df['value'].astype(str)
                         
                         # Create stacked bar chart
-                        fig = px.bar(
-                            grouped_df,
-                            x='date',
-                            y='amount',
-                            color='asset',
-                            title=f"Transaction Volume for {st.session_state['selected_account']}",
-                            labels={'date': 'Date', 'amount': 'Volume', 'asset': 'Asset'},
-                            barmode='stack'
-                        )
-                        fig.update_layout(
-                            xaxis_title="Date",
-                            yaxis_title="Total Volume",
-                            hovermode='x unified',
-                            xaxis=dict(
-                                tickangle=45,
-                                tickformat='%b %d, %Y'
+                        with render_timer("volume_figure"):
+                            fig = px.bar(
+                                activity_df,
+                                x='period',
+                                y='volume',
+                                color='asset',
+                                pattern_shape='direction',
+                                hover_data={'exact': True, 'volume': False},
+                                title=f"Transaction Volume for {st.session_state['selected_account']}",
+                                labels={'period': 'Date', 'volume': 'Volume', 'asset': 'Asset',
+                                        'direction': 'Direction', 'exact': 'Amount'},
+                                barmode='relative'
+                            )
+                            fig.update_layout(
+                                xaxis_title="Date",
+                                yaxis_title="Total Volume",
+                                hovermode='x unified',
+                                xaxis=dict(
+                                    tickangle=45,
+                                    tickformat='%b %d, %Y'
+                                )
                             )
-                        )
                         st.plotly_chart(fig, use_container_width=True)
                     else:
                         st.info("No transaction volume data available")
@@ -535,8 +1060,14 @@ elif view == "Accounts":
 
             with col1:
                 st.write("### Balances")
+                as_of = st.date_input("Balance as of", value=None, key="account_as_of",
+                                      help="Balances at the end of this day (UTC); leave empty for current balances")
+                current = account.get('balances', {})
+                if as_of:
+                    current = get_account_balances_as_of(st.session_state['selected_ledger'],
+                                                         st.session_state['selected_account'], as_of) or {}
                 balances = []
-                for asset, balance in account.get('balances', {}).items():
+                for asset, balance in current.items():
                     balances.append({"Asset": asset, "Balance": balance})
 
                 st.dataframe(pd.DataFrame(balances) if balances else pd.DataFrame({"Asset": [], "Balance": []}),
@@ -557,52 +1088,89 @@ elif view == "Accounts":
                 st.dataframe(pd.DataFrame(volumes) if volumes else pd.DataFrame({"Asset": [], "Received": [], "Sent": []}),
                              hide_index=True, use_container_width=True)
 
+            # Money flows around this account
+            st.write("### Flow explorer")
+            if st.checkbox("Trace money flows from this account", key="flow_explorer_enabled"):
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    flow_hops = st.slider("Hops", 1, 4, 2, key="flow_hops")
+                with col2:
+                    flow_max_nodes = st.number_input("Max accounts", 10, 2000, FLOW_MAX_NODES, step=10,
+                                                     key="flow_max_nodes")
+                with col3:
+                    flow_max_edges = st.number_input("Max edges", 10, 5000, FLOW_MAX_EDGES, step=10,
+                                                     key="flow_max_edges")
+
+                flows = get_account_flows(st.session_state['selected_ledger'], st.session_state['selected_account'],
+                                          flow_hops, int(flow_max_nodes), int(flow_max_edges))
+                if flows and flows.edges:
+                    st.caption(f"{len(flows.columns)} accounts, {len(flows.edges)} edges "
+                               f"from {flows.transactions} transactions")
+                    if flows.truncated:
+                        st.warning("Budget reached: the flow graph is truncated")
+                    with render_timer("flow_figure"):
+                        flow_fig = flows.figure()
+                    st.plotly_chart(flow_fig, use_container_width=True)
+                    st.dataframe(pd.DataFrame(flows.to_rows()), hide_index=True, use_container_width=True)
+                elif flows is not None:
+                    st.info("No flows found for this account")
+
             # Transactions for this account
             st.write("### Transactions")
-            acc_txs = get_transactions(
-                st.session_state['selected_ledger'],
-                source=st.session_state['selected_account']
-            )
+            try:
+                page = get_page("transactions", st.session_state['selected_ledger'], tx_params, PAGE_SIZE,
+                                tx_state['cursors'][tx_state['index']])
+            except Exception as e:
+                st.error(f"Error fetching transactions: {str(e)}")
+                page = {'data': [], 'next': None}
+            acc_txs = page['data']
 
             if acc_txs:
-                tx_data = []
-                for tx in acc_txs:
-                    for posting in tx.get('postings', []):
-                        if posting.get('source') == st.session_state['selected_account'] or posting.get('destination') == st.session_state['selected_account']:
-                            tx_data.append({
-                                "Txid": str(tx.get('id')).zfill(7),
-                                "Value": f"{posting.get('asset')} {posting.get('amount')}",
-                                "Source": posting.get('source'),
-                                "Destination": posting.get('destination'),
-                                "Ledger": tx.get('ledger'),
-                                "Date": tx.get('timestamp')
-                            })
-
-                df = pd.DataFrame(tx_data)
+                with render_timer("postings_frame"):
+                    df = format_postings(postings_frame(acc_txs, account=st.session_state['selected_account']))
 
                 # Display transactions table
                 # event = st.dataframe(df, hide_index=True, use_container_width=True,on_select='rerun',selection_mode='single-row')
                 st.dataframe(df, hide_index=True, use_container_width=True)
+                pager_controls("account_tx_pager", tx_state, page['next'], len(acc_txs))
             else:
                 st.info("No transactions found for this account")
 
             # Metadata
             st.write("### Metadata")
             st.json(account.get('metadata', {}))
+    elif st.session_state['selected_ledger'] and account_search.strip():
+        # Address search results
+        matches = search_addresses(st.session_state['selected_ledger'], account_search.strip())
+        if matches:
+            st.caption(f"First {SEARCH_LIMIT} matches" if len(matches) >= SEARCH_LIMIT else f"{len(matches)} matches")
+            df = pd.DataFrame([{"Address": address, "Ledger": ledger} for ledger, address in matches])
+            event = st.dataframe(df, hide_index=True, use_container_width=True, on_select='rerun',
+                                 selection_mode='single-row', key="account_search_results")
+            if event and len(event.selection['rows']):
+                selected_row = event.selection['rows'][0]
+                st.session_state['selected_account'] = df.iloc[selected_row]["Address"]
+                st.session_state['selected_ledger'] = df.iloc[selected_row]["Ledger"]
+                st.session_state['view_account_details'] = True
+                st.rerun()
+        else:
+            st.info("No accounts match this search")
     else:
         # Account List View
-        accounts = get_accounts(st.session_state['selected_ledger'])
+        export_panel("accounts", st.session_state['selected_ledger'])
 
-        if accounts:
-            account_data = []
-            for acc in accounts:
-                account_data.append({
-                    "Address": acc.get('address'),
-                    "Ledger": acc.get('ledger'),
-                    "Metadata": str(acc.get('metadata', {}))
-                })
+        page_size = page_size_control("account_pager")
+        state = pager("account_pager", (st.session_state['selected_ledger'], account_filters, page_size))
+        try:
+            page = get_page("accounts", st.session_state['selected_ledger'], {},
+                            page_size, state['cursors'][state['index']], account_filters)
+        except Exception as e:
+            st.error(f"Error fetching accounts: {str(e)}")
+            page = {'data': [], 'next': None}
+        accounts = page['data']
 
-            df = pd.DataFrame(account_data)
+        if accounts:
+            df = accounts.frame()
 
             # Display accounts table
             event = st.dataframe(df, hide_index=True, use_container_width=True,on_select='rerun',selection_mode='single-row')
@@ -617,69 +1185,115 @@ elif view == "Accounts":
                 st.session_state['selected_ledger'] = ledger
                 st.session_state['view_account_details'] = True
                 st.rerun()
+            pager_controls("account_pager", state, page['next'], len(accounts))
         else:
             st.info("No accounts found with the selected filter")
 
 elif view == "Assets":
     st.header("Asset Management")
+    show_refresh_age()
     
-    # List all unique assets across all ledgers
-    all_assets = set()
-    for ledger in list_ledgers():
-        accounts = get_accounts(ledger['name'])
-        for account in accounts:
-            if account is not None:
-                acc = get_account(ledger['name'], account['address'])
-                if acc is not None:
-                    all_assets.update(acc.get('balances', {}).keys())
+    as_of = st.date_input("Balance as of", value=None, key="assets_as_of",
+                          help="Holders at the end of this day (UTC); leave empty for current balances")
+
+    # One bulk pass over every ledger serves both the asset list and the holders
+    if as_of:
+        balance_index = get_balance_index_as_of(as_of)
+        st.caption(f"Balances at the end of {as_of:%Y-%m-%d} (UTC)")
+    else:
+        # None while the first balance index is still being built
+        balance_index = get_balance_index()
+
+    if balance_index is not None:
+        all_assets = balance_index.assets()
     
-    # Display asset list
-    st.subheader("All Assets")
-    asset_df = pd.DataFrame({"Asset": list(all_assets)})
-    st.dataframe(asset_df, hide_index=True, use_container_width=True)
+        # Display asset list
+        st.subheader("All Assets")
+        asset_df = pd.DataFrame({"Asset": all_assets})
+        st.dataframe(asset_df, hide_index=True, use_container_width=True)
     
-    # Asset details section
-    st.subheader("Asset Details")
-    selected_asset = st.selectbox("Select an asset", list(all_assets), key="asset_selector")
+        # Asset details section
+        st.subheader("Asset Details")
+        selected_asset = st.selectbox("Select an asset", all_assets, key="asset_selector")
     
-    if selected_asset:
-        holding_accounts = []
-        for ledger in list_ledgers():
-            accounts = get_accounts(ledger['name'])
-            for account in accounts:
-                acc_details = get_account(ledger['name'], account['address'])
-                if acc_details:
-                    balance = acc_details.get('balances', {}).get(selected_asset, 0)
-                    if balance != 0:  # Include all non-zero balances
-                        holding_accounts.append({
-                            "Account": account['address'],
-                            "Ledger": ledger['name'],
-                            "Balance": balance
-                        })
+        if selected_asset:
+            holding_accounts = balance_index.holders(selected_asset)
         
-        # Show accounts holding this asset
-        st.write("### Accounts Holding This Asset")
-        if holding_accounts:
-            df = pd.DataFrame(holding_accounts)
-            st.dataframe(df, hide_index=True, use_container_width=True)
-        else:
-            st.info("No accounts currently hold this asset.")
+            # Show accounts holding this asset
+            st.write("### Accounts Holding This Asset")
+            if holding_accounts:
+                df = pd.DataFrame(holding_accounts)
+                st.dataframe(df, hide_index=True, use_container_width=True)
+            else:
+                st.info("No accounts currently hold this asset.")
+
+# 5. Integrity View
+elif view == "Integrity":
+    reset_view_states()
+    st.header("Integrity")
+    st.caption("Checks that every account's input - output equals its balance, that each asset's balances "
+               "sum to zero and that replaying the postings gives the reported volumes")
+
+    ledgers = list_ledgers()
+    if ledgers:
+        integrity_ledger = st.selectbox("Select a ledger:", [l['name'] for l in ledgers], key="integrity_ledger")
+        if st.button("Run checks", key="integrity_run"):
+            progress = st.progress(0.0, text="Streaming accounts and transactions")
+            try:
+                st.session_state['integrity_report'] = check_ledger(
+                    BASE_URL, integrity_ledger, workers=INTEGRITY_WORKERS,
+                    progress=lambda done, total: progress.progress(done / total, text=f"{done}/{total} time ranges")
+                )
+            except Exception as e:
+                st.error(f"Error checking {integrity_ledger}: {str(e)}")
+            progress.empty()
+
+        report = st.session_state.get('integrity_report')
+        if report is not None and report.ledger == integrity_ledger:
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Accounts", report.accounts)
+            col2.metric("Transactions", report.transactions)
+            col3.metric("Postings", report.postings)
+            col4.metric("Issues", sum(report.counts.values()))
+            if report.pit:
+                st.caption(f"As of {report.pit} (transaction {report.last_id}), checked in {report.duration:.1f}s")
+            if report.counts:
+                st.warning(", ".join(f"{count} {check}" for check, count in sorted(report.counts.items())))
+                issues_df = pd.DataFrame([{
+                    "Check": issue.check,
+                    "Target": f"{issue.target_type} {issue.target}",
+                    "Asset": issue.asset,
+                    "Expected": issue.expected,
+                    "Actual": issue.actual,
+                    "Link": issue_link("", issue),
+                } for issue in report.issues])
+                st.dataframe(issues_df, hide_index=True, use_container_width=True,
+                             column_config={"Link": st.column_config.LinkColumn("Link", display_text="Open")})
+            else:
+                st.success("No issues found")
+    else:
+        st.warning("No ledgers available.")
 
 # Transaction form in sidebar
 SHOW_TRANSACTION_FORM = os.environ.get('SHOW_TRANSACTION_FORM', 'false').lower() == 'true'
+
+# Add PHP to the list of common assets
+COMMON_ASSETS = ["USD/2", "EUR/2", "JPY/0", "GBP/2", "PHP/2", "BTC/8", "ETH/18"]
+
 with st.sidebar:
     st.markdown("---")
     if SHOW_TRANSACTION_FORM:
+        form_mode = st.radio("Create", ["Single transaction", "Bulk upload"], horizontal=True,
+                             key="transaction_form_mode")
+    if SHOW_TRANSACTION_FORM and form_mode == "Single transaction":
         with st.form("transaction_form"):
             st.subheader("Create Transaction")
-            form_ledger = st.selectbox("Ledger", [l['name'] for l in list_ledgers()], key="transaction_form_ledger")
+            form_ledger = st.selectbox("Ledger", [l['name'] for l in list_ledgers() or []], key="transaction_form_ledger")
             src = st.text_input("Source Account")
             dst = st.text_input("Destination Account")
-            amount = st.number_input("Amount", min_value=0.01)
+            amount = st.text_input("Amount", value="0.01", help="In the asset's major unit, e.g. 12.34 USD")
             
-            # Add PHP to the list of common assets
-            common_assets = ["USD/2", "EUR/2", "JPY/0", "GBP/2", "PHP/2", "BTC/8", "ETH/18"]
-            asset_choice = st.selectbox("Asset", options=common_assets + ["Custom"], key="transaction_form_asset")
+            asset_choice = st.selectbox("Asset", options=COMMON_ASSETS + ["Custom"], key="transaction_form_asset")
             
             if asset_choice == "Custom":
                 asset = st.text_input("Custom Asset (e.g., GOLD/3)")
@@ -687,33 +1301,102 @@ with st.sidebar:
                 asset = asset_choice
             
             if st.form_submit_button("Submit"):
-                payload = {
-                    "postings": [{
-                        "source": src,
-                        "destination": dst,
-                        "amount": int(amount * 100),
-                        "asset": asset
-                    }],
-                    "metadata": {
-                        "created_via": "Streamlit UI"
-                    }
-                }
-                
                 try:
-                    response = requests.post(
-                        f"{BASE_URL}/{form_ledger}/transactions",
+                    payload = {
+                        "postings": [{
+                            "source": src,
+                            "destination": dst,
+                            "amount": minor_units(amount, asset),
+                            "asset": asset
+                        }],
+                        "metadata": {
+                            "created_via": "Streamlit UI"
+                        }
+                    }
+                    
+                    response = get_client().post(
+                        f"/{form_ledger}/transactions",
+                        endpoint="create_transaction",
                         json=payload
                     )
                     
                     if response.status_code == 200:
+                        get_cache().invalidate(form_ledger)
+                        get_checkpoint_store().expire(form_ledger)
+                        refresh_shared_data()
                         st.success("Transaction created successfully!")
                     else:
                         error = response.json()
                         st.error(f"Error: {error.get('errorMessage', 'Unknown error')}")
+                except ValueError as e:
+                    st.error(f"Invalid amount: {str(e)}")
                 except Exception as e:
                     st.error(f"API Error: {str(e)}")
+    elif SHOW_TRANSACTION_FORM:
+        st.subheader("Bulk Transactions")
+        st.caption("CSV or JSON with source, destination, amount (major units), asset "
+                   "and optional reference and metadata (JSON) columns")
+        bulk_ledger = st.selectbox("Ledger", [l['name'] for l in list_ledgers() or []], key="bulk_ledger")
+        upload = st.file_uploader("Postings file", type=["csv", "json"], key="bulk_upload")
+        batch_size = st.number_input("Batch size", 1, 1000, DEFAULT_BATCH_SIZE, key="bulk_batch_size")
+        known_only = st.checkbox("Only known assets", value=True, key="bulk_known_assets",
+                                 help="Reject assets that are neither common nor already in the ledger")
+        
+        if upload is not None:
+            data = upload.getvalue()
+            try:
+                bulk_frame = read_upload(data, upload.name)
+            except Exception as e:
+                st.error(f"Could not read {upload.name}: {str(e)}")
+                bulk_frame = None
+            
+            if bulk_frame is not None:
+                known_assets = None
+                if known_only:
+                    known_assets = set(COMMON_ASSETS) | set(get_asset_totals(bulk_ledger) or {})
+                payloads, errors = validate(bulk_frame, known_assets)
+                st.write(f"{len(payloads)} valid rows, {len(errors)} invalid")
+                
+                if payloads and st.button(f"Submit {len(payloads)} transactions", key="bulk_submit"):
+                    progress = st.progress(0.0)
+                    results, elapsed = submit(
+                        get_client(), bulk_ledger, payloads, batch_size=int(batch_size),
+                        progress=lambda done, total: progress.progress(done / total)
+                    )
+                    get_cache().invalidate(bulk_ledger)
+                    get_checkpoint_store().expire(bulk_ledger)
+                    refresh_shared_data()
+                    created = sum(1 for r in results.values() if r['status'] == 'created')
+                    st.success(f"{created}/{len(payloads)} created in {elapsed:.1f}s "
+                               f"({len(payloads) / elapsed if elapsed else 0:.0f} tx/s)")
+                    st.session_state['bulk_report'] = results_frame(bulk_frame, errors, results)
+                elif errors:
+                    st.session_state['bulk_report'] = results_frame(bulk_frame, errors, {})
+        
+        report = st.session_state.get('bulk_report')
+        if report is not None:
+            st.dataframe(report[report['status'] != 'created'], hide_index=True, use_container_width=True)
+            st.download_button("Download report", report.to_csv(index=False), file_name="bulk-report.csv",
+                               mime="text/csv", key="bulk_report_download")
     else:
         st.info("Transaction creation via UI is disabled in this environment.")
-        
+
+# Close this rerun before rendering its breakdown
+get_metrics().finish_rerun(current_rerun)
+with st.sidebar.expander("Performance"):
+    st.write(f"**Last {PERF_HISTORY} reruns**")
+    st.dataframe(pd.DataFrame([run.summary() for run in reversed(st.session_state['perf_reruns'])]),
+                 hide_index=True, use_container_width=True)
+    st.write("**This rerun**")
+    rerun_rows = current_rerun.rows()
+    if rerun_rows:
+        st.dataframe(pd.DataFrame(rerun_rows), hide_index=True, use_container_width=True)
+    else:
+        st.write("No instrumented calls")
+    st.write("**Since server start**")
+    st.dataframe(pd.DataFrame.from_dict(get_metrics().stats(), orient='index'), use_container_width=True)
+    st.download_button("Prometheus metrics", get_metrics().prometheus(), file_name="ledger_ui.prom",
+                       mime="text/plain", key="perf_prometheus")
+
 st.sidebar.markdown("---")
 st.sidebar.info("Formance Ledger Dashboard v2.0")
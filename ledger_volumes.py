@@ -0,0 +1,143 @@
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from ledger_client import iter_newer
+from ledger_frames import postings_frame, scale_amount
+
+# Resampling rules; weeks start on Monday
+BUCKETS = {
+    "Day": dict(freq="D"),
+    "Week": dict(freq="W-MON", label="left", closed="left"),
+    "Month": dict(freq="MS"),
+}
+
+# How long a refreshed account is considered current, and how many accounts
+# the store keeps
+REFRESH_INTERVAL = 15
+MAX_ACCOUNTS = 256
+
+
+class AccountVolume:
+    """Daily incoming/outgoing totals of one account, per asset.
+
+    Amounts are exact integers in the asset's minor units. `last_ids` holds
+    the newest transaction id folded in for each side, so a refresh only
+    reads transactions committed since. A refresh folds its totals and moves
+    `last_ids` together, once every page has been read, so one that fails
+    partway leaves both untouched and the retry does not count twice.
+    """
+
+    def __init__(self):
+        # (day, asset) -> [incoming, outgoing]
+        self.daily = {}
+        self.last_ids = {'source': None, 'destination': None}
+        self.refreshed_at = 0.0
+        self.lock = threading.Lock()
+        self._fold_lock = threading.Lock()
+
+    @staticmethod
+    def totals(frame: pd.DataFrame, into: dict):
+        # Add the (day, asset) totals of a postings frame to `into`
+        if frame.empty:
+            return into
+        days = frame['timestamp'].dt.tz_convert(None).dt.floor('D')
+        totals = frame.assign(day=days).groupby(['day', 'asset'], observed=True)['amount'].sum()
+        for key, amount in totals.items():
+            into[key] = into.get(key, 0) + int(amount)
+        return into
+
+    def merge(self, sides: dict):
+        # sides: side -> (newest id, {(day, asset): amount})
+        with self._fold_lock:
+            for side, (newest, totals) in sides.items():
+                column = 1 if side == 'source' else 0
+                for key, amount in totals.items():
+                    self.daily.setdefault(key, [0, 0])[column] += amount
+                self.last_ids[side] = newest
+
+    def frame(self):
+        with self._fold_lock:
+            rows = [(day, asset, incoming, outgoing) for (day, asset), (incoming, outgoing) in self.daily.items()]
+        return pd.DataFrame(rows, columns=['day', 'asset', 'incoming', 'outgoing'])
+
+
+def _refresh_side(client, ledger: str, account: str, side: str, last_id, page_size: int):
+    # (newest id, totals) of the new postings with the account on `side`:
+    # outgoing volume as source, incoming as destination
+    newest, totals = last_id, {}
+    pages = client.transaction_pages(ledger, page_size=page_size, query={"$match": {side: account}})
+    for fresh in iter_newer(pages, last_id):
+        newest = max(newest if newest is not None else -1, max(tx['id'] for tx in fresh))
+        frame = postings_frame(fresh, ledger=ledger)
+        AccountVolume.totals(frame[frame[side] == account], totals)
+    return newest, totals
+
+
+class VolumeStore:
+    """Per-account daily volume buckets, refreshed incrementally."""
+
+    def __init__(self, max_accounts: int = MAX_ACCOUNTS, refresh_interval: float = REFRESH_INTERVAL):
+        self.max_accounts = max_accounts
+        self.refresh_interval = refresh_interval
+        self._volumes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _volume(self, key):
+        with self._lock:
+            volume = self._volumes.get(key)
+            if volume is None:
+                volume = self._volumes[key] = AccountVolume()
+            self._volumes.move_to_end(key)
+            while len(self._volumes) > self.max_accounts:
+                self._volumes.popitem(last=False)
+            return volume
+
+    def get(self, client, ledger: str, account: str, page_size: int = 100, force: bool = False):
+        volume = self._volume((ledger, account))
+        with volume.lock:
+            if force or time.monotonic() - volume.refreshed_at >= self.refresh_interval:
+                # Both sides are fetched concurrently, then merged together
+                with ThreadPoolExecutor(max_workers=2) as pool:
+                    futures = {
+                        side: pool.submit(contextvars.copy_context().run, _refresh_side,
+                                          client, ledger, account, side, volume.last_ids[side], page_size)
+                        for side in ('source', 'destination')
+                    }
+                    sides = {side: future.result() for side, future in futures.items()}
+                volume.merge(sides)
+                volume.refreshed_at = time.monotonic()
+            return volume.frame()
+
+    def expire(self):
+        # Force the next read of every account to fetch its new transactions,
+        # keeping the buckets already computed
+        with self._lock:
+            for volume in self._volumes.values():
+                volume.refreshed_at = 0.0
+
+    def clear(self):
+        with self._lock:
+            self._volumes.clear()
+
+
+def bucket_volumes(daily: pd.DataFrame, bucket: str = "Day"):
+    # Resample the daily totals into day/week/month buckets and add exact
+    # scaled values for display
+    if daily.empty:
+        return pd.DataFrame(columns=['period', 'asset', 'direction', 'amount', 'value'])
+    grouped = (
+        daily.groupby([pd.Grouper(key='day', **BUCKETS[bucket]), 'asset'])[['incoming', 'outgoing']]
+        .sum()
+        .reset_index()
+        .rename(columns={'day': 'period'})
+    )
+    long = grouped.melt(id_vars=['period', 'asset'], value_vars=['incoming', 'outgoing'],
+                        var_name='direction', value_name='amount')
+    long = long[long['amount'] != 0].reset_index(drop=True)
+    long['value'] = [scale_amount(amount, asset) for amount, asset in zip(long['amount'], long['asset'])]
+    return long
@@ -0,0 +1,70 @@
+import itertools
+import os
+import sys
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ledger_client import LedgerClient  # noqa: E402
+from ledger_mock import generate, start_server  # noqa: E402
+
+
+class FlakyClient(LedgerClient):
+    """LedgerClient whose page fetch number `fail_at` raises, once."""
+
+    def __init__(self, base_url: str):
+        super().__init__(base_url)
+        self.fail_at = None
+        self._pages = itertools.count(1)
+
+    def fail_after(self, pages: int):
+        # Let `pages` more pages through, then fail the next one
+        self._pages = itertools.count(1)
+        self.fail_at = pages + 1
+
+    def fetch_page(self, *args, **kwargs):
+        if next(self._pages) == self.fail_at:
+            self.fail_at = None
+            raise requests.ConnectionError("injected failure")
+        return super().fetch_page(*args, **kwargs)
+
+
+@pytest.fixture
+def server():
+    server = start_server(generate(ledgers=2, accounts=40, transactions=400))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def ledger(server):
+    return server.ledgers["main"]
+
+
+@pytest.fixture
+def client(server):
+    client = LedgerClient(server.url)
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def flaky(server):
+    client = FlakyClient(server.url)
+    yield client
+    client.close()
+
+
+def write_transactions(ledger, count: int, prefix: str = "users:new"):
+    # `count` transactions from world to fresh accounts, tagged with metadata
+    return [
+        ledger.create_transaction(
+            [{"source": "world", "destination": f"{prefix}:{i:04d}", "amount": 100 + i, "asset": "USD/2"}],
+            metadata={"batch": prefix},
+            account_metadata={f"{prefix}:{i:04d}": {"tier": "new"}},
+        )
+        for i in range(count)
+    ]
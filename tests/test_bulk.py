@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+from ledger_bulk import idempotency_keys, read_upload, submit, validate
+from ledger_frames import minor_units
+
+
+@pytest.mark.parametrize("amount, asset, expected", [
+    ("12.34", "USD/2", 1234),
+    ("12.3", "USD/2", 1230),
+    (" 7 ", "JPY/0", 7),
+    ("1", "ETH/18", 10 ** 18),
+    ("0.000000000000000001", "ETH/18", 1),
+    ("5", "COIN", 5),
+])
+def test_minor_units(amount, asset, expected):
+    assert minor_units(amount, asset) == expected
+
+
+@pytest.mark.parametrize("amount", ["1.234", "abc", "", "NaN", "inf"])
+def test_minor_units_rejects(amount):
+    with pytest.raises(ValueError):
+        minor_units(amount, "USD/2")
+
+
+def test_read_upload_csv_and_json_agree():
+    rows = [
+        {"source": "world", "destination": "users:1", "amount": "10.50", "asset": "USD/2",
+         "reference": "r1", "metadata": '{"k": "v"}'},
+        {"source": "users:1", "destination": "users:2", "amount": "1", "asset": "EUR/2"},
+    ]
+    csv = ("source,destination,amount,asset,reference,metadata\n"
+           "world,users:1,10.50,USD/2,r1,\"{\"\"k\"\": \"\"v\"\"}\"\n"
+           "users:1,users:2,1,EUR/2,,\n").encode()
+    from_csv = validate(read_upload(csv, "upload.csv"))
+    from_json = validate(read_upload(json.dumps(rows).encode(), "upload.json"))
+    assert from_csv == from_json
+    payloads, errors = from_csv
+    assert errors == {}
+    assert payloads[0] == {
+        "postings": [{"source": "world", "destination": "users:1", "amount": 1050, "asset": "USD/2"}],
+        "metadata": {"k": "v"},
+        "reference": "r1",
+    }
+    assert "reference" not in payloads[1]
+
+
+def test_validate_reports_each_bad_row():
+    csv = ("source,destination,amount,asset,reference,metadata\n"
+           "world,users:1,1.00,USD/2,,\n"
+           ",users:1,1.00,USD/2,,\n"
+           "world,bad address,1.00,USD/2,,\n"
+           "world,users:1,1.00,usd,,\n"
+           "world,users:1,1.001,USD/2,,\n"
+           "world,users:1,0,USD/2,,\n"
+           "world,users:1,1,XAU/2,,\n"
+           "world,users:1,1,USD/2,,[1]\n").encode()
+    payloads, errors = validate(read_upload(csv, "upload.csv"), known_assets={"USD/2"})
+    assert list(payloads) == [0]
+    assert sorted(errors) == [1, 2, 3, 4, 5, 6, 7]
+    assert "source account is empty" in errors[1]
+    assert "invalid destination" in errors[2]
+    assert "invalid asset" in errors[3]
+    assert "decimals" in errors[4]
+    assert "positive" in errors[5]
+    assert "unknown asset" in errors[6]
+    assert "JSON object" in errors[7]
+
+
+def test_resubmitting_a_corrected_file_posts_each_row_once(client, ledger):
+    def upload(source):
+        csv = ("source,destination,amount,asset,reference,metadata\n"
+               "world,bulk:a,1.00,USD/2,,\n"
+               f"{source},bulk:b,1.00,USD/2,,\n"
+               "world,bulk:a,1.00,USD/2,,\n").encode()
+        payloads, errors = validate(read_upload(csv, "upload.csv"))
+        assert errors == {}
+        return submit(client, "main", payloads, batch_size=2)[0]
+
+    before = len(ledger.transactions)
+    results = upload("bulk:empty")
+    assert [results[row]['status'] for row in range(3)] == ["created", "error", "created"]
+    assert len(ledger.transactions) == before + 2
+
+    # Only the corrected row is new; the identical rows 0 and 2 keep distinct keys
+    results = upload("world")
+    assert all(result['status'] == "created" for result in results.values())
+    assert len(ledger.transactions) == before + 3
+
+
+def test_idempotency_keys_follow_the_row_content():
+    row = {"postings": [{"source": "world", "destination": "a", "amount": 1, "asset": "USD/2"}], "metadata": {}}
+    other = dict(row, metadata={"k": "v"})
+    keys = idempotency_keys("main", {0: row, 1: other, 2: row})
+    assert len(set(keys.values())) == 3
+    assert idempotency_keys("main", {5: row})[5] == keys[0]
+    assert idempotency_keys("other", {0: row})[0] != keys[0]
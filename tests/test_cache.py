@@ -0,0 +1,71 @@
+import types
+
+import pytest
+
+import ledger_cache
+from ledger_cache import CachePolicy, LedgerCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ledger_cache, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def cache(clock):
+    return LedgerCache({"pages": CachePolicy(10, 3, True), "server_info": CachePolicy(10, 1, False)})
+
+
+def test_entries_expire_after_their_ttl(cache, clock):
+    cache.set("pages", ("main", 1), "page")
+    clock[0] += 9
+    assert cache.get("pages", ("main", 1)) == "page"
+    clock[0] += 2
+    assert cache.get("pages", ("main", 1)) is None
+    stats = cache.stats()["pages"]
+    assert (stats["hits"], stats["misses"], stats["expirations"], stats["size"]) == (1, 1, 1, 0)
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    for n in range(3):
+        cache.set("pages", ("main", n), n)
+    cache.get("pages", ("main", 0))
+    cache.set("pages", ("main", 3), 3)
+    assert cache.get("pages", ("main", 1)) is None
+    assert [cache.get("pages", ("main", n)) for n in (0, 2, 3)] == [0, 2, 3]
+    assert cache.stats()["pages"]["evictions"] == 1
+
+
+def test_get_or_load_does_not_cache_none_or_errors(cache):
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return None
+
+    cache.get_or_load("pages", ("main", 1), loader)
+    cache.get_or_load("pages", ("main", 1), loader)
+    assert len(calls) == 2
+
+    def failing():
+        raise RuntimeError("down")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_load("pages", ("main", 2), failing)
+    assert cache.get_or_load("pages", ("main", 2), lambda: "page") == "page"
+    assert cache.get_or_load("pages", ("main", 2), failing) == "page"
+
+
+def test_invalidate_drops_the_ledger_and_cross_ledger_entries(cache):
+    cache.set("pages", ("main", 1), "main")
+    cache.set("pages", ("other", 1), "other")
+    cache.set("pages", (None, 1), "all")
+    cache.set("server_info", ("main",), "info")
+    cache.invalidate("main")
+    assert cache.get("pages", ("main", 1)) is None
+    assert cache.get("pages", (None, 1)) is None
+    assert cache.get("pages", ("other", 1)) == "other"
+    # Endpoints not keyed by ledger are kept
+    assert cache.get("server_info", ("main",)) == "info"
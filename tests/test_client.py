@@ -0,0 +1,81 @@
+import threading
+
+import requests
+
+from ledger_client import fan_out_pages, iter_newer, take
+
+
+def test_cursor_pages_cover_every_transaction_once(client, ledger):
+    pages = list(client.transaction_pages("main", page_size=7))
+    ids = [tx['id'] for page in pages for tx in page]
+    assert all(len(page) == 7 for page in pages[:-1])
+    assert ids == sorted(range(len(ledger.transactions)), reverse=True)
+    assert all(tx['ledger'] == "main" for page in pages for tx in page)
+
+
+def test_fetch_page_follows_the_cursor(client):
+    first = client.fetch_page("/main/accounts", "accounts", page_size=10)
+    second = client.fetch_page("/main/accounts", "accounts", cursor=first['next'])
+    assert len(first['data']) == len(second['data']) == 10
+    assert not {a['address'] for a in first['data']} & {a['address'] for a in second['data']}
+
+
+def test_last_page_has_no_next(client, ledger):
+    page = client.fetch_page("/main/transactions", "transactions", page_size=len(ledger.transactions))
+    assert page['next'] is None
+
+
+def test_take_stops_at_the_limit(client):
+    assert len(list(take(client.account_pages("main", page_size=3), 10))) == 10
+
+
+def test_iter_newer_stops_at_the_last_seen_id(client, ledger):
+    last_id = len(ledger.transactions) - 12
+    fetched = []
+
+    def pages():
+        for page in client.transaction_pages("main", page_size=5):
+            fetched.append(page)
+            yield page
+
+    fresh = [tx['id'] for page in iter_newer(pages(), last_id) for tx in page]
+    assert fresh == list(range(len(ledger.transactions) - 1, last_id, -1))
+    # The page holding last_id is the last one read
+    assert len(fetched) == 3
+
+
+def test_newest_log_id(client, ledger):
+    assert client.newest_log_id("main") == ledger.logs[-1]['id']
+
+
+def test_fan_out_reports_failed_ledgers_and_keeps_the_others(client, ledger):
+    errors = {}
+    pages = list(fan_out_pages(lambda name: client.transaction_pages(name, page_size=50),
+                               ["main", "missing", "ledger-1"], errors=errors))
+    assert set(errors) == {"missing"}
+    assert "404" in errors["missing"]
+    main = [tx['id'] for name, page in pages if name == "main" for tx in page]
+    assert sorted(main) == list(range(len(ledger.transactions)))
+    assert any(name == "ledger-1" for name, _ in pages)
+
+
+def test_fan_out_reports_ledgers_past_the_deadline(client):
+    release = threading.Event()
+
+    def pages_for(name):
+        if name == "slow":
+            release.wait(5)
+        yield from client.account_pages(name, page_size=50)
+
+    errors = {}
+    try:
+        pages = list(fan_out_pages(pages_for, ["main", "slow"], errors=errors, deadline=1))
+    finally:
+        release.set()
+    assert errors == {"slow": "timed out after 1s"}
+    assert pages and all(name == "main" for name, _ in pages)
+
+
+def test_mock_root_is_not_found(server):
+    assert requests.get(f"{server.url}/").status_code == 404
+    assert requests.get(f"{server.url}/v2/").status_code == 200
@@ -0,0 +1,75 @@
+import gc
+import io
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from conftest import write_transactions
+from ledger_export import ExportFile, export
+
+
+@pytest.fixture
+def batch(ledger):
+    write_transactions(ledger, 5, prefix="users:export")
+    return [tx for tx in ledger.transactions if tx['metadata'].get('batch') == "users:export"]
+
+
+def exported(client, resource: str, fmt: str, **kwargs):
+    out = io.BytesIO()
+    rows = export(client, "main", resource, fmt, out, **kwargs)
+    out.seek(0)
+    return rows, out
+
+
+def test_csv_has_one_row_per_posting_and_json_metadata(client, batch):
+    rows, out = exported(client, "transactions", "csv", limit=len(batch))
+    frame = pd.read_csv(out)
+    assert rows == len(frame) == len(batch)
+    assert list(frame.columns) == ["txid", "ledger", "timestamp", "source", "destination", "asset", "amount",
+                                   "metadata"]
+    assert sorted(frame['txid']) == sorted(tx['id'] for tx in batch)
+    assert all(json.loads(text) == {"batch": "users:export"} for text in frame['metadata'])
+
+
+def test_ndjson_keeps_metadata_as_objects(client, batch):
+    rows, out = exported(client, "transactions", "ndjson", limit=len(batch))
+    records = [json.loads(line) for line in out.read().splitlines()]
+    assert len(records) == rows == len(batch)
+    assert all(record['metadata'] == {"batch": "users:export"} for record in records)
+    assert {record['destination'] for record in records} == {f"users:export:{i:04d}" for i in range(5)}
+
+
+def test_parquet_keeps_full_precision_amounts(client, ledger):
+    pytest.importorskip("pyarrow")
+    big = 10 ** 30
+    ledger.create_transaction([{"source": "world", "destination": "users:whale", "amount": big, "asset": "ETH/18"}],
+                              {"note": "big"})
+    rows, out = exported(client, "transactions", "parquet", limit=1)
+    frame = pd.read_parquet(out)
+    assert rows == 1
+    assert frame['amount'][0] == str(big)
+    assert json.loads(frame['metadata'][0]) == {"note": "big"}
+
+
+def test_accounts_export(client, ledger):
+    rows, out = exported(client, "accounts", "csv")
+    frame = pd.read_csv(out)
+    assert rows == len(ledger.accounts)
+    assert set(frame['address']) == set(ledger.accounts)
+
+
+def test_export_file_is_removed_with_the_object():
+    prepared = ExportFile("csv")
+    with prepared.open() as out:
+        out.write(b"a,b\n")
+    path = prepared.path
+    assert prepared.read() == b"a,b\n"
+    del prepared
+    gc.collect()
+    assert not os.path.exists(path)
+
+    prepared = ExportFile("csv")
+    prepared.remove()
+    assert not os.path.exists(prepared.path)
@@ -0,0 +1,43 @@
+from ledger_client import LedgerClient
+from ledger_graph import explore_account_flows
+
+
+class CountingClient(LedgerClient):
+    def __init__(self, base_url: str):
+        super().__init__(base_url)
+        self.pages = 0
+
+    def fetch_page(self, *args, **kwargs):
+        self.pages += 1
+        return super().fetch_page(*args, **kwargs)
+
+
+def busiest_account(ledger):
+    counts = {}
+    for tx in ledger.transactions:
+        for posting in tx['postings']:
+            for address in (posting['source'], posting['destination']):
+                if address != "world":
+                    counts[address] = counts.get(address, 0) + 1
+    return max(counts, key=counts.get)
+
+
+def test_flows_touch_the_root(client, ledger):
+    account = busiest_account(ledger)
+    flows = explore_account_flows(client, "main", account, hops=1)
+    assert flows.edges
+    assert all(account in (src, dst) for src, dst, _ in flows.edges)
+    assert not flows.truncated
+
+
+def test_flows_stop_once_both_budgets_are_spent(server, ledger):
+    account = busiest_account(ledger)
+    unbounded = CountingClient(server.url)
+    explore_account_flows(unbounded, "main", account, hops=3, page_size=5)
+
+    bounded = CountingClient(server.url)
+    flows = explore_account_flows(bounded, "main", account, hops=3, max_nodes=3, max_edges=2, page_size=5)
+    assert flows.truncated
+    assert len(flows.columns) == 3
+    assert len(flows.edges) == 2
+    assert bounded.pages < unbounded.pages
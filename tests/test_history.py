@@ -0,0 +1,70 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+from conftest import FlakyClient, write_transactions
+from ledger_history import BalanceCheckpoints, end_of_day, supports_pit
+from ledger_mock import MockLedger
+
+
+def tomorrow():
+    return (datetime.now(timezone.utc) + timedelta(days=1)).date()
+
+
+class PausedClient(FlakyClient):
+    """Blocks its page fetches while `paused` is clear."""
+
+    def __init__(self, base_url: str):
+        super().__init__(base_url)
+        self.paused = threading.Event()
+        self.paused.set()
+        self.waiting = threading.Event()
+
+    def fetch_page(self, *args, **kwargs):
+        if not self.paused.is_set():
+            self.waiting.set()
+            self.paused.wait()
+        return super().fetch_page(*args, **kwargs)
+
+
+def test_balances_by_day(ledger, client):
+    checkpoints = BalanceCheckpoints("main")
+    checkpoints.sync(client, page_size=50)
+    first_day = datetime.fromisoformat(ledger.transactions[0]['timestamp'].replace("Z", "+00:00")).date()
+    assert set(checkpoints.account_balances("world", first_day - timedelta(days=1)).values()) == {0}
+    assert dict(checkpoints.balances(first_day - timedelta(days=1))) == {}
+    latest = dict(checkpoints.balances(tomorrow()))
+    assert latest["world"] == {a: i - o for a, (i, o) in ledger.volumes["world"].items()}
+    assert sum(sum(b.values()) for b in latest.values()) == sum(
+        i - o for volumes in ledger.volumes.values() for i, o in volumes.values()
+    )
+
+
+def test_readers_see_the_last_complete_sync(server, ledger):
+    client = PausedClient(server.url)
+    checkpoints = BalanceCheckpoints("main")
+    checkpoints.sync(client, page_size=20)
+    before = dict(checkpoints.balances(tomorrow()))
+
+    write_transactions(ledger, 50)
+    client.paused.clear()
+    sync = threading.Thread(target=checkpoints.sync, args=(client,), kwargs={'page_size': 20})
+    sync.start()
+    assert client.waiting.wait(5)
+    # The sync holds its lock and is mid-walk; readers neither wait nor see it
+    assert dict(checkpoints.balances(tomorrow())) == before
+    assert checkpoints.account_balances("users:new:0001", tomorrow()) == {}
+    client.paused.set()
+    sync.join(5)
+    assert checkpoints.account_balances("users:new:0001", tomorrow()) == {"USD/2": 101}
+
+
+def test_supports_pit(server, client):
+    server.ledgers["empty"] = MockLedger("empty")
+    assert supports_pit(client, "main") is True
+    del server.ledgers["empty"].accounts["world"]
+    # An empty ledger cannot tell, so it is reported as unknown
+    assert supports_pit(client, "empty") is None
+
+
+def test_end_of_day():
+    assert end_of_day(datetime(2024, 2, 29).date()) == "2024-02-29T23:59:59.999999Z"
@@ -0,0 +1,53 @@
+from ledger_integrity import check_ledger, posting_problem, time_shards
+from ledger_integrity import _parse_time
+
+
+def backdate_once(ledger):
+    # progress callback committing one transaction back-dated to the start of
+    # the ledger, the first time a shard completes
+    calls = []
+
+    def progress(done, total):
+        if not calls:
+            ledger.create_transaction(
+                [{"source": "world", "destination": "late:wallet", "amount": 7, "asset": "USD/2"}],
+                timestamp=ledger.transactions[0]['timestamp'],
+            )
+        calls.append(done)
+    return progress, calls
+
+
+def test_clean_ledger(server, ledger):
+    report = check_ledger(server.url, "main", workers=2)
+    assert report.counts == {}
+    assert report.transactions == len(ledger.transactions)
+    assert report.accounts == len(ledger.accounts)
+
+
+def test_backdated_write_during_the_run_is_retried(server, ledger):
+    progress, calls = backdate_once(ledger)
+    report = check_ledger(server.url, "main", workers=1, shards=2, progress=progress)
+    assert report.counts == {}
+    assert len(calls) > 2
+    assert report.transactions == len(ledger.transactions)
+
+
+def test_backdated_write_is_flagged_without_retries(server, ledger):
+    progress, _ = backdate_once(ledger)
+    report = check_ledger(server.url, "main", workers=1, shards=2, progress=progress, retries=0)
+    assert report.counts.get("concurrent") == 1
+    assert [issue.target for issue in report.issues if issue.check == "concurrent"] == [ledger.transactions[-1]['id']]
+
+
+def test_time_shards_cover_the_range():
+    start, end = _parse_time("2024-01-01T00:00:00Z"), _parse_time("2024-01-02T00:00:00Z")
+    shards = time_shards(start, end, 4)
+    assert len(shards) == 4
+    assert "$gte" not in str(shards[0]) and "$lte" in str(shards[-1])
+
+
+def test_posting_problem():
+    assert posting_problem("world", "users:1", "USD/2", 5) is None
+    assert posting_problem("world", "bad address", "USD/2", 5) == "invalid destination address"
+    assert posting_problem("world", "users:1", "usd", 5) == "invalid asset"
+    assert posting_problem("world", "users:1", "USD/2", -1) == "amount must be a non-negative integer"
@@ -0,0 +1,55 @@
+import pytest
+
+from conftest import FlakyClient
+from ledger_search import AddressIndex
+
+ADDRESSES = ["world", "users:1", "users:1:wallet", "users:2:wallet", "users:2:savings", "merchants:1",
+             "merchants:1:wallet", "usersx:1"]
+
+
+@pytest.fixture(params=[0, 1000], ids=["main", "delta"])
+def index(request):
+    # Every address in the main arrays, or every address in the delta
+    index = AddressIndex(delta_limit=request.param)
+    index.add("main", ADDRESSES)
+    return index
+
+
+def addresses(results):
+    return [address for _, address in results]
+
+
+def test_prefix(index):
+    assert addresses(index.search("users")) == ["users:1", "users:1:wallet", "users:2:savings", "users:2:wallet",
+                                                "usersx:1"]
+
+
+def test_trailing_colon_is_a_prefix(index):
+    assert addresses(index.search("users:")) == ["users:1", "users:1:wallet", "users:2:savings", "users:2:wallet"]
+    assert addresses(index.search("users:1:")) == ["users:1:wallet"]
+
+
+def test_interior_empty_segment_matches_one_segment(index):
+    assert addresses(index.search("users::wallet")) == ["users:1:wallet", "users:2:wallet"]
+    assert addresses(index.search(":1:wallet")) == ["merchants:1:wallet", "users:1:wallet"]
+    assert addresses(index.search("users::")) == ["users:1:wallet", "users:2:savings", "users:2:wallet"]
+
+
+def test_blank_patterns_match_nothing(index):
+    assert index.search("") == []
+    assert index.search("   ") == []
+
+
+def test_limit(index):
+    assert len(index.search("users", limit=2)) == 2
+
+
+def test_refresh_walks_then_follows_the_logs(server, ledger):
+    client = FlakyClient(server.url)
+    index = AddressIndex()
+    index.refresh(client, "main")
+    ledger.create_transaction([{"source": "world", "destination": "zz:new:wallet", "amount": 1, "asset": "USD/2"}])
+    ledger.set_metadata("ACCOUNT", "zz:meta", {"k": "v"})
+    index.refresh(client, "main")
+    assert addresses(index.search("zz:")) == ["zz:meta", "zz:new:wallet"]
+    assert len(index) == len(ledger.accounts)
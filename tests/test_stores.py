@@ -0,0 +1,130 @@
+"""Incremental stores: a sync after new writes matches the ledger, and a
+sync that fails partway leaves the store as it was, so the retry neither
+misses nor double counts anything."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import requests
+
+from conftest import write_transactions
+from ledger_history import BalanceCheckpoints
+from ledger_metadata import MetadataIndex, parse_filters
+from ledger_search import AddressIndex
+from ledger_store import SnapshotStore
+from ledger_volumes import VolumeStore
+
+PAGE_SIZE = 20
+
+
+def tomorrow():
+    return (datetime.now(timezone.utc) + timedelta(days=1)).date()
+
+
+def ledger_balances(ledger, address: str):
+    return {asset: incoming - outgoing for asset, (incoming, outgoing) in ledger.volumes.get(address, {}).items()}
+
+
+def failing_sync(flaky, sync, pages: int = 1):
+    # Run `sync` with its page fetch number `pages + 1` failing
+    flaky.fail_after(pages)
+    with pytest.raises(requests.ConnectionError):
+        sync()
+
+
+def world_volumes(store, client):
+    frame = store.get(client, "main", "world", page_size=PAGE_SIZE, force=True)
+    totals = frame.groupby('asset')[['incoming', 'outgoing']].sum()
+    return {asset: (int(row.incoming), int(row.outgoing)) for asset, row in totals.iterrows()}
+
+
+def test_volume_store_retry_after_partial_failure(ledger, flaky):
+    store = VolumeStore()
+    world_volumes(store, flaky)
+    write_transactions(ledger, 3 * PAGE_SIZE)
+    failing_sync(flaky, lambda: world_volumes(store, flaky), pages=2)
+
+    expected = {asset: tuple(volume) for asset, volume in ledger.volumes["world"].items()}
+    assert world_volumes(store, flaky) == expected
+
+
+def test_balance_checkpoints_retry_after_partial_failure(ledger, flaky):
+    checkpoints = BalanceCheckpoints("main")
+    checkpoints.sync(flaky, page_size=PAGE_SIZE)
+    write_transactions(ledger, 3 * PAGE_SIZE)
+    failing_sync(flaky, lambda: checkpoints.sync(flaky, page_size=PAGE_SIZE), pages=2)
+
+    checkpoints.sync(flaky, page_size=PAGE_SIZE)
+    assert checkpoints.last_id == ledger.transactions[-1]['id']
+    for address in ("world", "users:new:0003"):
+        assert checkpoints.account_balances(address, tomorrow()) == ledger_balances(ledger, address)
+
+
+def test_balance_checkpoints_first_sync_fails_partway(ledger, flaky):
+    checkpoints = BalanceCheckpoints("main")
+    failing_sync(flaky, lambda: checkpoints.sync(flaky, page_size=PAGE_SIZE), pages=3)
+    checkpoints.sync(flaky, page_size=PAGE_SIZE)
+    assert checkpoints.account_balances("world", tomorrow()) == ledger_balances(ledger, "world")
+
+
+def test_address_index_follows_the_logs(ledger, flaky):
+    index = AddressIndex()
+    index.refresh(flaky, "main", page_size=PAGE_SIZE)
+    assert len(index) == len(ledger.accounts)
+
+    write_transactions(ledger, 3 * PAGE_SIZE)
+    failing_sync(flaky, lambda: index.refresh(flaky, "main", page_size=PAGE_SIZE), pages=1)
+    index.refresh(flaky, "main", page_size=PAGE_SIZE)
+    assert len(index) == len(ledger.accounts)
+    assert index.search("users:new:", limit=1000) == [
+        ("main", f"users:new:{i:04d}") for i in range(3 * PAGE_SIZE)
+    ]
+    assert index.last_log_ids["main"] == ledger.logs[-1]['id']
+
+
+def test_metadata_index_follows_the_logs(ledger, flaky):
+    index = MetadataIndex()
+    index.refresh(flaky, "main", page_size=PAGE_SIZE)
+    write_transactions(ledger, 3 * PAGE_SIZE)
+    ledger.set_metadata("ACCOUNT", "users:new:0001", {"tier": "gold"})
+    ledger.delete_metadata("ACCOUNT", "users:new:0002", "tier")
+    failing_sync(flaky, lambda: index.refresh(flaky, "main", page_size=PAGE_SIZE), pages=1)
+    index.refresh(flaky, "main", page_size=PAGE_SIZE)
+
+    def expected(key, value):
+        return {a for a, account in ledger.accounts.items() if account['metadata'].get(key) == value}
+
+    assert index.ids("main", "ACCOUNT", parse_filters("tier=new")) == expected("tier", "new")
+    assert index.ids("main", "ACCOUNT", parse_filters("tier=gold")) == expected("tier", "gold")
+    assert index.ids("main", "TRANSACTION", parse_filters("batch=users:new")) == {
+        tx['id'] for tx in ledger.transactions if tx['metadata'].get('batch') == "users:new"
+    }
+
+
+def test_snapshot_store_retry_after_partial_failure(ledger, flaky, tmp_path):
+    store = SnapshotStore(str(tmp_path), sync_interval=0)
+    snapshot = store.synced(flaky, "main")
+    write_transactions(ledger, 3 * PAGE_SIZE)
+    failing_sync(flaky, lambda: snapshot.sync(flaky, page_size=PAGE_SIZE), pages=2)
+    assert snapshot.sync_state()[0] != ledger.logs[-1]['id']
+
+    snapshot.sync(flaky, page_size=PAGE_SIZE)
+    assert snapshot.sync_state()[0] == ledger.logs[-1]['id']
+    assert snapshot.count_transactions() == len(ledger.transactions)
+    assert snapshot.count_accounts() == len(ledger.accounts)
+    balances = {}
+    for address, asset, balance in snapshot.balances():
+        balances.setdefault(address, {})[asset] = balance
+    for address in ("world", "users:new:0003"):
+        assert balances[address] == ledger_balances(ledger, address)
+
+
+def test_snapshot_metadata_filters(ledger, client, tmp_path):
+    write_transactions(ledger, 5)
+    snapshot = SnapshotStore(str(tmp_path)).synced(client, "main")
+    accounts = snapshot.accounts(filters=parse_filters("tier=new"))
+    assert [a['address'] for a in accounts] == [f"users:new:{i:04d}" for i in range(5)]
+    assert len(snapshot.accounts(filters=parse_filters("tier"))) == len(
+        [a for a in ledger.accounts.values() if 'tier' in a['metadata']]
+    )
+    transactions = snapshot.transactions(filters=parse_filters("batch=users:new"))
+    assert [tx['id'] for tx in transactions] == [tx['id'] for tx in reversed(ledger.transactions[-5:])]